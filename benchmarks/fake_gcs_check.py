@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Fake GCS Check
+
+Serve a synthetic gzipped proteome from a local fake GCS server and check
+the streaming input path against it: ranged reads of the gzipped and the
+plain object must reproduce the FASTA text exactly, a stream must fail once
+its object is replaced, and tplrr_finder --stream must write the same output
+as --local on the same file.
+
+The server implements the few JSON API requests the storage client makes
+for streaming: object metadata and media downloads with a Range header and
+generation preconditions. The storage client and the finder reach it
+through STORAGE_EMULATOR_HOST.
+
+Usage:
+    python fake_gcs_check.py
+    python fake_gcs_check.py --sequences 20000 --range-size 65536
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from generate_proteome import DEFAULT_DENSITY
+from run_benchmarks import SOURCE_DIR, prepare_dataset, run_finder
+
+sys.path.append(str(SOURCE_DIR))
+from gcs_io import open_blob_stream
+
+logger = logging.getLogger(__name__)
+
+# Bucket served by the fake server
+BUCKET_NAME = "lrr-check"
+
+# Default number of sequences in the proteome
+DEFAULT_SEQUENCES = 20000
+
+# Default size of each ranged read, small enough to split the object into many ranges
+DEFAULT_CHECK_RANGE_SIZE = 64 * 1024
+
+# Default number of ranged reads kept in flight
+DEFAULT_CHECK_PREFETCH = 4
+
+# Paths of the JSON API: bucket metadata, object metadata and media downloads
+BUCKET_PATH = re.compile(r"^/storage/v1/b/([^/]+)$")
+METADATA_PATH = re.compile(r"^/storage/v1/b/([^/]+)/o/(.+)$")
+MEDIA_PATH = re.compile(r"^/download/storage/v1/b/([^/]+)/o/(.+)$")
+
+class FakeGCSServer(ThreadingHTTPServer):
+    """
+    In-memory GCS server holding one version of each object
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0)):
+        super().__init__(address, FakeGCSHandler)
+        self.objects = {}
+        self.range_requests = 0
+        self._generations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def put(self, bucket_name, name, data):
+        """
+        Store an object, replacing any earlier version with a new generation
+        """
+        with self._lock:
+            self.objects[bucket_name, name] = (data, next(self._generations))
+
+    def get(self, bucket_name, name):
+        with self._lock:
+            return self.objects.get((bucket_name, name))
+
+    def has_bucket(self, bucket_name):
+        with self._lock:
+            return any(bucket == bucket_name for bucket, _ in self.objects)
+
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    """
+    Answer object metadata and media requests from a FakeGCSServer
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        bucket = BUCKET_PATH.match(url.path)
+        if bucket and self.server.has_bucket(bucket.group(1)):
+            return self._send_json(200, {"kind": "storage#bucket", "name": bucket.group(1)})
+        match = MEDIA_PATH.match(url.path) or METADATA_PATH.match(url.path)
+        stored = match and self.server.get(match.group(1), unquote(match.group(2)))
+        if stored is None:
+            return self._send_json(404, {"error": {"code": 404, "message": "No such object"}})
+
+        data, generation = stored
+        # Only the latest generation is kept, as in a bucket without versioning
+        if "generation" in query and int(query["generation"][0]) != generation:
+            return self._send_json(404, {"error": {"code": 404, "message": "No such object"}})
+        if "ifGenerationMatch" in query and int(query["ifGenerationMatch"][0]) != generation:
+            return self._send_json(412, {"error": {"code": 412, "message": "Precondition failed"}})
+
+        if match.re is METADATA_PATH:
+            return self._send_json(200, self._metadata(match.group(1), unquote(match.group(2)), data, generation))
+
+        status, start, end = 200, 0, len(data)
+        requested = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if requested:
+            status, start = 206, int(requested.group(1))
+            end = min(int(requested.group(2)) + 1, len(data)) if requested.group(2) else len(data)
+            self.server.range_requests += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("x-goog-generation", str(generation))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        self.end_headers()
+        self.wfile.write(data[start:end])
+
+    def _metadata(self, bucket_name, name, data, generation):
+        import google_crc32c
+        return {
+            "kind": "storage#object",
+            "bucket": bucket_name,
+            "name": name,
+            "generation": str(generation),
+            "metageneration": "1",
+            "size": str(len(data)),
+            "md5Hash": base64.b64encode(hashlib.md5(data).digest()).decode(),
+            "crc32c": base64.b64encode(google_crc32c.Checksum(data).digest()).decode()
+        }
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+def check_stream_contents(server, name, expected, range_size, prefetch):
+    """
+    Check that streaming an object yields the FASTA text exactly
+
+    Returns:
+        bool: True if the streamed bytes match
+    """
+    requests_before = server.range_requests
+    with open_blob_stream(BUCKET_NAME, name, range_size, prefetch) as stream:
+        streamed = stream.read()
+    ranges = server.range_requests - requests_before
+    passed = streamed == expected
+    logger.info(f"Stream of {name}: {len(streamed)} bytes in {ranges} ranged reads, "
+                f"{'identical to' if passed else 'DIFFERENT from'} the FASTA text")
+    return passed
+
+def check_generation_pinning(server, name, range_size):
+    """
+    Check that a stream fails once its object is replaced mid-stream
+
+    Returns:
+        bool: True if reading past the replacement raised an error
+    """
+    data, _ = server.get(BUCKET_NAME, name)
+    # With one range in flight, only the range after the first can be requested before the replacement
+    stream = open_blob_stream(BUCKET_NAME, name, range_size, prefetch=1)
+    try:
+        stream.read(1)
+        server.put(BUCKET_NAME, name, data)
+        stream.read()
+    except Exception as e:
+        logger.info(f"Stream of {name} replaced mid-stream failed as expected: {type(e).__name__}")
+        return True
+    finally:
+        stream.close()
+    logger.error(f"Stream of {name} kept reading after the object was replaced")
+    return False
+
+def check_finder_output(fasta_file, name, run_dir):
+    """
+    Check that tplrr_finder writes the same output with --stream as with --local
+
+    Returns:
+        bool: True if the outputs are byte-identical
+    """
+    outputs = {}
+    modes = {"stream": [BUCKET_NAME, name, "--stream"], "local": [BUCKET_NAME, fasta_file, "--local"]}
+    for mode, input_args in modes.items():
+        mode_dir = os.path.join(run_dir, mode)
+        os.makedirs(mode_dir, exist_ok=True)
+        outputs[mode] = os.path.join(mode_dir, "lrr.txt")
+        command = [
+            sys.executable, str(SOURCE_DIR / "tplrr_finder.py"), *input_args, "--pattern", "all", "--combined",
+            "--output", outputs[mode], "--no-upload", "--no-cache", "--checkpoint-interval", "0"
+        ]
+        seconds = run_finder(command, mode_dir)["seconds"]
+        logger.info(f"tplrr_finder --{mode} took {seconds:.2f}s")
+
+    with open(outputs["stream"], 'rb') as streamed, open(outputs["local"], 'rb') as local:
+        passed = streamed.read() == local.read()
+    logger.info(f"tplrr_finder --stream output is {'identical to' if passed else 'DIFFERENT from'} --local")
+    return passed
+
+def run_checks(n_sequences, range_size, prefetch, density=DEFAULT_DENSITY, seed=0, work_dir=None):
+    """
+    Serve a synthetic proteome from a fake GCS server and run every check against it
+
+    Args:
+        n_sequences (int): Number of sequences in the proteome
+        range_size (int): Size of each ranged read in the stream checks
+        prefetch (int): Number of ranged reads kept in flight in the stream checks
+        density (float): Fraction of sequences carrying repeats of each LRR class
+        seed (int): Random seed for the proteome
+        work_dir (str, optional): Directory for the dataset and outputs
+
+    Returns:
+        dict: Whether each check passed, by check name
+    """
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lrr_fake_gcs_")
+    fasta_file, _, _ = prepare_dataset(work_dir, n_sequences, density, seed)
+    with open(fasta_file, 'rb') as f:
+        compressed = f.read()
+    fasta_text = gzip.decompress(compressed)
+
+    server = FakeGCSServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # Read by the storage client here and by the finder subprocesses
+    os.environ["STORAGE_EMULATOR_HOST"] = server.url
+    logger.info(f"Serving gs://{BUCKET_NAME} from a fake GCS server at {server.url}")
+
+    try:
+        server.put(BUCKET_NAME, "proteome.fasta.gz", compressed)
+        server.put(BUCKET_NAME, "proteome.fasta", fasta_text)
+        return {
+            "gzipped_stream": check_stream_contents(server, "proteome.fasta.gz", fasta_text, range_size, prefetch),
+            "plain_stream": check_stream_contents(server, "proteome.fasta", fasta_text, range_size, prefetch),
+            "generation_pinning": check_generation_pinning(server, "proteome.fasta.gz", range_size),
+            "finder_output": check_finder_output(fasta_file, "proteome.fasta.gz", os.path.join(work_dir, "runs"))
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check GCS streaming against a local fake GCS server")
+    parser.add_argument("--sequences", type=int, default=DEFAULT_SEQUENCES,
+                        help="Number of sequences in the synthetic proteome")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_CHECK_RANGE_SIZE,
+                        help="Size of each ranged read in bytes in the stream checks")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_CHECK_PREFETCH,
+                        help="Number of ranged reads kept in flight in the stream checks")
+    parser.add_argument("--work-dir", help="Directory for the dataset and outputs")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        results = run_checks(args.sequences, args.range_size, args.prefetch, work_dir=args.work_dir)
+        failed = [name for name, passed in results.items() if not passed]
+        if failed:
+            logger.error(f"Failed checks: {', '.join(failed)}")
+            sys.exit(1)
+        logger.info(f"All {len(results)} checks passed")
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
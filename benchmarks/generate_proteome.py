@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Synthetic Proteome Generator
+
+Generate FASTA files that resemble UniRef50 for benchmarking: sequence
+lengths follow a log-normal distribution with a UniRef50-like median,
+residues are drawn from background amino-acid frequencies, and a controlled
+fraction of sequences carry tandem repeats of each LRR class.
+
+Usage:
+    python generate_proteome.py synthetic.fasta.gz --sequences 100000
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Import from the source directory
+current_dir = Path(__file__).parent.absolute()
+sys.path.append(str(current_dir.parent / "src"))
+from lrr_patterns import BACKGROUND_FREQUENCIES, LRR_PATTERNS, parse_pattern
+
+logger = logging.getLogger(__name__)
+
+# Median and log-normal shape of UniRef50 cluster representative lengths
+MEDIAN_LENGTH = 260
+LENGTH_SIGMA = 0.65
+
+# Bounds on generated sequence lengths
+MIN_LENGTH = 30
+MAX_LENGTH = 5000
+
+# Default fraction of sequences carrying repeats of each LRR class
+DEFAULT_DENSITY = 0.005
+
+# Largest number of tandem repeats planted in one sequence
+MAX_REPEATS = 10
+
+# Residues per FASTA line, as in UniProt downloads
+LINE_WIDTH = 60
+
+# Number of sequences generated per batch
+GENERATE_BATCH_SIZE = 10000
+
+AMINO_ACIDS = np.frombuffer("".join(BACKGROUND_FREQUENCIES).encode(), dtype=np.uint8)
+AMINO_ACID_PROBABILITIES = np.array(list(BACKGROUND_FREQUENCIES.values())) / sum(BACKGROUND_FREQUENCIES.values())
+
+def repeat_instance(positions, rng):
+    """
+    Draw one sequence matching a fixed-length LRR pattern
+
+    Args:
+        positions (list): Per-position residue classes from parse_pattern
+        rng (numpy.random.Generator): Random number generator
+
+    Returns:
+        numpy.ndarray: uint8 array of residues
+    """
+    residues = rng.choice(AMINO_ACIDS, size=len(positions), p=AMINO_ACID_PROBABILITIES)
+    for offset, allowed in enumerate(positions):
+        if allowed is not None:
+            residues[offset] = ord(rng.choice(sorted(allowed)))
+    return residues
+
+def generate_records(n_sequences, density=DEFAULT_DENSITY, seed=0):
+    """
+    Generate synthetic protein records
+
+    Args:
+        n_sequences (int): Number of sequences
+        density (float): Fraction of sequences carrying repeats of each LRR class
+        seed (int): Random seed
+
+    Yields:
+        tuple: (sequence ID, sequence bytes, list of planted LRR class names)
+    """
+    rng = np.random.default_rng(seed)
+    patterns = {name: parse_pattern(info["pattern"]) for name, info in LRR_PATTERNS.items()}
+
+    for batch_start in range(0, n_sequences, GENERATE_BATCH_SIZE):
+        batch_size = min(GENERATE_BATCH_SIZE, n_sequences - batch_start)
+        lengths = np.clip(
+            rng.lognormal(np.log(MEDIAN_LENGTH), LENGTH_SIGMA, batch_size).astype(np.int64), MIN_LENGTH, MAX_LENGTH
+        )
+        residues = rng.choice(AMINO_ACIDS, size=int(lengths.sum()), p=AMINO_ACID_PROBABILITIES)
+        ends = np.cumsum(lengths)
+        carriers = rng.random((batch_size, len(patterns))) < density
+
+        for i in range(batch_size):
+            sequence = residues[ends[i] - lengths[i]:ends[i]]
+            planted = []
+            for (name, positions), carrier in zip(patterns.items(), carriers[i]):
+                if not carrier:
+                    continue
+                repeats = np.concatenate([
+                    repeat_instance(positions, rng) for _ in range(rng.integers(1, MAX_REPEATS + 1))
+                ])
+                # Grow the sequence if the repeat block does not fit
+                if len(repeats) > len(sequence):
+                    sequence = np.concatenate([sequence, repeats])
+                start = rng.integers(0, len(sequence) - len(repeats) + 1)
+                sequence[start:start + len(repeats)] = repeats
+                planted.append(name)
+
+            yield f"UniRef50_SYN{batch_start + i:09d}", sequence.tobytes(), planted
+
+def write_proteome(output_file, n_sequences, density=DEFAULT_DENSITY, seed=0):
+    """
+    Write a synthetic proteome to a FASTA file, gzipped if the name ends in .gz
+
+    Args:
+        output_file (str): Path to the output file
+        n_sequences (int): Number of sequences
+        density (float): Fraction of sequences carrying repeats of each LRR class
+        seed (int): Random seed
+
+    Returns:
+        dict: Summary with the number of sequences, residues and FASTA bytes,
+              and the number of sequences carrying each LRR class
+    """
+    summary = {
+        "sequences": 0,
+        "residues": 0,
+        "fasta_bytes": 0,
+        "planted": dict.fromkeys(LRR_PATTERNS, 0)
+    }
+    opener = gzip.open if output_file.endswith(".gz") else open
+
+    with opener(output_file, 'wb') as f:
+        for record_id, sequence, planted in generate_records(n_sequences, density, seed):
+            lines = [sequence[i:i + LINE_WIDTH] for i in range(0, len(sequence), LINE_WIDTH)]
+            text = b">" + f"{record_id} Synthetic protein n=1 Tax=synthetic TaxID=0".encode() + b"\n"
+            text += b"\n".join(lines) + b"\n"
+            f.write(text)
+
+            summary["sequences"] += 1
+            summary["residues"] += len(sequence)
+            summary["fasta_bytes"] += len(text)
+            for name in planted:
+                summary["planted"][name] += 1
+
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic UniRef50-like proteome with planted LRRs")
+    parser.add_argument("output_file", help="Path to the output FASTA file (gzipped if it ends in .gz)")
+    parser.add_argument("--sequences", type=int, default=100000, help="Number of sequences to generate")
+    parser.add_argument("--density", type=float, default=DEFAULT_DENSITY,
+                        help="Fraction of sequences carrying repeats of each LRR class")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        summary = write_proteome(args.output_file, args.sequences, args.density, args.seed)
+        logger.info(f"Wrote {args.output_file}: {json.dumps(summary)}")
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner
+
+Time each LRR finder on synthetic proteomes of several sizes and write the
+results to a JSON file, so that runs on different commits can be compared.
+Each finder is run as a separate process, as it would be in production, and
+its wall time and peak resident memory are recorded.
+
+Usage:
+    python run_benchmarks.py --sizes 10000,100000
+    python run_benchmarks.py --compare benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from generate_proteome import DEFAULT_DENSITY, write_proteome
+
+logger = logging.getLogger(__name__)
+
+# Directory of this script and of the finders
+BENCHMARK_DIR = Path(__file__).parent.absolute()
+SOURCE_DIR = BENCHMARK_DIR.parent / "src"
+
+# Default directory for result files
+DEFAULT_RESULTS_DIR = BENCHMARK_DIR / "results"
+
+# Default numbers of sequences in the synthetic proteomes
+DEFAULT_SIZES = (10000, 100000)
+
+# Slowdown relative to a baseline run that counts as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Command line of each finder; {fasta} is the input file, {folder} a folder
+# holding it as an NCBI RefSeq protein file, and {output} an output path
+FINDERS = {
+    "tplrr_finder": [
+        "tplrr_finder.py", "benchmark", "{fasta}", "--local", "--no-upload", "--no-cache",
+        "--pattern", "all", "--output", "{output}"
+    ],
+    "ncbi_lrr_finder": [
+        "ncbi_lrr_finder.py", "{folder}", "--pattern", "RI-like", "--output-dir", "{output}", "--no-cache"
+    ],
+    "bspa_lrr_analyzer": [
+        "bspa_lrr_analyzer.py", "benchmark", "{fasta}", "--local", "--no-upload", "--output", "{output}"
+    ],
+    "revised_tplrr_finder": [
+        "revised_tplrr_finder.py", "{fasta}", "--output", "{output}"
+    ]
+}
+
+def prepare_dataset(work_dir, n_sequences, density, seed):
+    """
+    Generate a synthetic proteome, reusing one generated by an earlier run
+
+    Returns:
+        tuple: (path to the FASTA file, folder holding it as an NCBI RefSeq
+                protein file, generator summary)
+    """
+    folder = os.path.join(work_dir, f"proteome_{n_sequences}_{density}_{seed}")
+    fasta_file = os.path.join(folder, "synthetic.protein.faa.gz")
+    summary_file = os.path.join(folder, "summary.json")
+
+    if os.path.isfile(summary_file):
+        with open(summary_file) as f:
+            return fasta_file, folder, json.load(f)
+
+    os.makedirs(folder, exist_ok=True)
+    logger.info(f"Generating synthetic proteome with {n_sequences} sequences...")
+    summary = write_proteome(fasta_file, n_sequences, density, seed)
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f)
+    return fasta_file, folder, summary
+
+def run_finder(command, run_dir):
+    """
+    Run one finder process and measure it
+
+    Args:
+        command (list): Command line
+        run_dir (str): Working directory, which receives the finder's log files
+
+    Returns:
+        dict: Wall time in seconds and peak resident memory in MB
+    """
+    with open(os.path.join(run_dir, "stderr.log"), 'w') as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=run_dir, stdout=subprocess.DEVNULL, stderr=stderr)
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with status {process.returncode}; see {run_dir}/stderr.log")
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    return {"seconds": seconds, "peak_rss_mb": peak_rss}
+
+def run_benchmarks(sizes, finders, repeat=3, density=DEFAULT_DENSITY, seed=0, work_dir=None, finder_args=None):
+    """
+    Run every finder on a synthetic proteome of each size
+
+    Each case is run repeat times; the fastest run is reported, since slower
+    ones mostly measure interference from other work on the machine.
+
+    Args:
+        sizes (list): Numbers of sequences in the synthetic proteomes
+        finders (list): Names of the finders to run, keys of FINDERS
+        repeat (int): Number of runs per case
+        density (float): Fraction of sequences carrying repeats of each LRR class
+        seed (int): Random seed for the synthetic proteomes
+        work_dir (str, optional): Directory for datasets and outputs, reused
+                                  between runs. Defaults to a temporary directory.
+        finder_args (dict, optional): Extra command-line arguments by finder name
+
+    Returns:
+        list: One result dictionary per (finder, size) case
+    """
+    finder_args = finder_args or {}
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lrr_benchmarks_")
+    results = []
+
+    try:
+        for n_sequences in sizes:
+            fasta_file, folder, summary = prepare_dataset(work_dir, n_sequences, density, seed)
+
+            for finder in finders:
+                run_dir = os.path.join(work_dir, "runs", f"{finder}_{n_sequences}")
+                os.makedirs(run_dir, exist_ok=True)
+                output = os.path.join(run_dir, "output")
+                command = [sys.executable, str(SOURCE_DIR / FINDERS[finder][0])] + [
+                    argument.format(fasta=fasta_file, folder=folder, output=output)
+                    for argument in FINDERS[finder][1:]
+                ] + finder_args.get(finder, [])
+
+                runs = [run_finder(command, run_dir) for _ in range(repeat)]
+                seconds = min(run["seconds"] for run in runs)
+                result = {
+                    "finder": finder,
+                    "sequences": n_sequences,
+                    "arguments": finder_args.get(finder, []),
+                    "seconds": seconds,
+                    "all_seconds": [run["seconds"] for run in runs],
+                    "sequences_per_sec": summary["sequences"] / seconds,
+                    "mb_per_sec": summary["fasta_bytes"] / seconds / 1e6,
+                    "peak_rss_mb": max(run["peak_rss_mb"] for run in runs)
+                }
+                results.append(result)
+                logger.info(
+                    f"{finder} on {n_sequences} sequences: {seconds:.2f}s, "
+                    f"{result['sequences_per_sec']:.0f} seq/s, {result['mb_per_sec']:.1f} MB/s, "
+                    f"{result['peak_rss_mb']:.0f} MB peak RSS"
+                )
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def environment_info():
+    """
+    Describe the code version and machine a benchmark ran on
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+def compare_results(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compare two benchmark runs case by case
+
+    Args:
+        baseline (dict): Earlier benchmark report
+        current (dict): New benchmark report
+        threshold (float): Relative slowdown that counts as a regression
+
+    Returns:
+        list: (finder, sequences, baseline seconds, current seconds, ratio,
+               whether it regressed) tuples for cases present in both runs
+    """
+    baseline_cases = {
+        (result["finder"], result["sequences"], tuple(result["arguments"])): result["seconds"]
+        for result in baseline["results"]
+    }
+    comparison = []
+    for result in current["results"]:
+        key = (result["finder"], result["sequences"], tuple(result["arguments"]))
+        if key in baseline_cases:
+            ratio = result["seconds"] / baseline_cases[key]
+            comparison.append((key[0], key[1], baseline_cases[key], result["seconds"], ratio, ratio > 1 + threshold))
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LRR finders on synthetic proteomes")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated numbers of sequences in the synthetic proteomes")
+    parser.add_argument("--finders", default=",".join(FINDERS),
+                        help="Comma-separated finders to run")
+    parser.add_argument("--finder-args", action="append", default=[], metavar="FINDER=ARGS",
+                        help="Extra arguments for a finder, e.g. 'tplrr_finder=--engine numpy'")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per case; the fastest is reported")
+    parser.add_argument("--density", type=float, default=DEFAULT_DENSITY,
+                        help="Fraction of sequences carrying repeats of each LRR class")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic proteomes")
+    parser.add_argument("--work-dir", help="Directory for datasets and outputs, reused between runs")
+    parser.add_argument("--output", help="Path of the JSON result file")
+    parser.add_argument("--compare", help="JSON result file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Relative slowdown reported as a regression by --compare")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    finders = args.finders.split(",")
+    for finder in finders:
+        if finder not in FINDERS:
+            parser.error(f"Unknown finder: {finder}")
+    finder_args = {}
+    for option in args.finder_args:
+        finder, _, arguments = option.partition("=")
+        finder_args[finder] = arguments.split()
+
+    try:
+        report = environment_info()
+        report["settings"] = {"density": args.density, "seed": args.seed, "repeat": args.repeat}
+        report["results"] = run_benchmarks(
+            [int(size) for size in args.sizes.split(",")], finders, args.repeat,
+            args.density, args.seed, args.work_dir, finder_args
+        )
+
+        output_file = args.output
+        if output_file is None:
+            DEFAULT_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = str(DEFAULT_RESULTS_DIR / f"{timestamp}_{(report['commit'] or 'unknown')[:10]}.json")
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Benchmark results saved to {output_file}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            comparison = compare_results(baseline, report, args.threshold)
+            for finder, n_sequences, before, after, ratio, regressed in comparison:
+                flag = "  REGRESSION" if regressed else ""
+                logger.info(f"{finder} on {n_sequences} sequences: {before:.2f}s -> {after:.2f}s ({ratio:.2f}x){flag}")
+            if any(regressed for *_, regressed in comparison):
+                sys.exit(1)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
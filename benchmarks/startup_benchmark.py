@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+
+Check that each LRR finder starts quickly: time `--help` and a scan of a
+small local proteome, subtract the startup time of a bare interpreter, and
+compare the rest against a budget. Also report which heavy dependencies each
+run imported; none of them should be loaded unless the run needs them.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --budget 0.2 --output startup.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from generate_proteome import DEFAULT_DENSITY
+from run_benchmarks import FINDERS, SOURCE_DIR, environment_info, prepare_dataset, run_finder
+
+logger = logging.getLogger(__name__)
+
+# Modules that take tens to hundreds of milliseconds to import; --help and
+# small local scans must not load any of them
+HEAVY_MODULES = ("google.cloud.storage", "numpy", "Bio", "pyarrow")
+
+# Default number of seconds a finder may take to start beyond a bare interpreter
+DEFAULT_STARTUP_BUDGET = 0.3
+
+# Number of sequences in the small proteome
+SMALL_SCAN_SEQUENCES = 200
+
+def imported_modules(command, run_dir):
+    """
+    List the modules a command imports, using the interpreter's -X importtime report
+
+    Args:
+        command (list): Command line starting with the Python executable
+        run_dir (str): Working directory
+
+    Returns:
+        list: Names of the imported modules
+    """
+    result = subprocess.run(
+        [command[0], "-X", "importtime"] + command[1:], cwd=run_dir,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    return [
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "[us]" not in line
+    ]
+
+def heavy_imports(modules):
+    """
+    Pick the heavy modules, or their submodules, out of a list of imported modules
+    """
+    return sorted({
+        heavy for heavy in HEAVY_MODULES for module in modules
+        if module == heavy or module.startswith(f"{heavy}.")
+    })
+
+def run_startup_benchmarks(finders, repeat=5, budget=DEFAULT_STARTUP_BUDGET, work_dir=None):
+    """
+    Time the startup of every finder
+
+    Args:
+        finders (list): Names of the finders to run, keys of FINDERS
+        repeat (int): Number of runs per case; the fastest is reported
+        budget (float): Seconds a case may take beyond a bare interpreter
+        work_dir (str, optional): Directory for the dataset and outputs.
+                                  Defaults to a temporary directory.
+
+    Returns:
+        tuple: (startup time of a bare interpreter in seconds, list of one
+                result dictionary per (finder, case))
+    """
+    cleanup = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="lrr_startup_")
+    results = []
+
+    try:
+        fasta_file, folder, _ = prepare_dataset(work_dir, SMALL_SCAN_SEQUENCES, DEFAULT_DENSITY, 0)
+        run_dir = os.path.join(work_dir, "runs", "startup")
+        os.makedirs(run_dir, exist_ok=True)
+
+        interpreter = min(
+            run_finder([sys.executable, "-c", "pass"], run_dir)["seconds"] for _ in range(repeat)
+        )
+        logger.info(f"Bare interpreter: {interpreter:.3f}s")
+
+        for finder in finders:
+            script = str(SOURCE_DIR / FINDERS[finder][0])
+            output = os.path.join(run_dir, f"{finder}_output")
+            cases = {
+                "help": [sys.executable, script, "--help"],
+                "small_scan": [sys.executable, script] + [
+                    argument.format(fasta=fasta_file, folder=folder, output=output)
+                    for argument in FINDERS[finder][1:]
+                ]
+            }
+
+            for case, command in cases.items():
+                seconds = min(run_finder(command, run_dir)["seconds"] for _ in range(repeat))
+                heavy = heavy_imports(imported_modules(command, run_dir))
+                overhead = seconds - interpreter
+                result = {
+                    "finder": finder,
+                    "case": case,
+                    "seconds": seconds,
+                    "overhead_seconds": overhead,
+                    "heavy_imports": heavy,
+                    "within_budget": overhead <= budget and not heavy
+                }
+                results.append(result)
+                flag = "" if result["within_budget"] else "  OVER BUDGET"
+                imports = f", imports {', '.join(heavy)}" if heavy else ""
+                logger.info(f"{finder} {case}: {seconds:.3f}s (+{overhead:.3f}s){imports}{flag}")
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return interpreter, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup time of the LRR finders against a budget")
+    parser.add_argument("--finders", default=",".join(FINDERS),
+                        help="Comma-separated finders to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per case; the fastest is reported")
+    parser.add_argument("--budget", type=float, default=DEFAULT_STARTUP_BUDGET,
+                        help="Seconds a finder may take beyond a bare interpreter")
+    parser.add_argument("--work-dir", help="Directory for the dataset and outputs")
+    parser.add_argument("--output", help="Path of a JSON result file")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    finders = args.finders.split(",")
+    for finder in finders:
+        if finder not in FINDERS:
+            parser.error(f"Unknown finder: {finder}")
+
+    try:
+        interpreter, results = run_startup_benchmarks(finders, args.repeat, args.budget, args.work_dir)
+
+        if args.output:
+            report = environment_info()
+            report["settings"] = {"budget": args.budget, "repeat": args.repeat}
+            report["interpreter_seconds"] = interpreter
+            report["results"] = results
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Startup results saved to {args.output}")
+
+        if not all(result["within_budget"] for result in results):
+            sys.exit(1)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
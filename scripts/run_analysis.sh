@@ -11,6 +11,7 @@ FILE_NAME="uniref50.fasta.gz"
 MAX_SEQUENCES=""
 LOCAL_FLAG=""
 UPLOAD_FLAG=""
+PATTERNS="all"
 
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
@@ -39,6 +40,11 @@ while [[ $# -gt 0 ]]; do
       UPLOAD_FLAG="--no-upload"
       shift
       ;;
+    --patterns)
+      PATTERNS="$2"
+      shift
+      shift
+      ;;
     *)
       echo "Unknown option: $1"
       exit 1
@@ -55,31 +61,16 @@ if command -v conda &> /dev/null; then
     fi
 fi
 
-# Define patterns to analyze
-PATTERNS=("TpLRR" "RI-like" "SDS22-like" "Cysteine-containing" "Bacterial" "Typical" "Plant-specific")
+# All patterns are matched in a single pass over the input, so the database
+# is only decompressed and parsed once
+session_name="lrr_analysis"
 
-# Function to run a single pattern analysis
-run_pattern_analysis() {
-    pattern=$1
-    session_name="${pattern}_analysis"
-    
-    # Create tmux session
-    echo "Creating session for $pattern pattern analysis..."
-    ./scripts/tmux_management.sh create "$session_name"
-    
-    # Run analysis in the session
-    tmux send-keys -t "$session_name" "python src/tplrr_finder.py $BUCKET_NAME $FILE_NAME --pattern \"$pattern\" $MAX_SEQUENCES $LOCAL_FLAG $UPLOAD_FLAG" C-m
-    
-    echo "Started analysis for $pattern pattern in session: $session_name"
-    echo "Use './scripts/tmux_management.sh attach $session_name' to check progress"
-    echo
-}
+# Create tmux session
+echo "Creating session for LRR pattern analysis ($PATTERNS)..."
+./scripts/tmux_management.sh create "$session_name"
 
-# Run analyses for all patterns
-for pattern in "${PATTERNS[@]}"; do
-    run_pattern_analysis "$pattern"
-    # Sleep briefly to avoid rate limiting
-    sleep 2
-done
+# Run analysis in the session
+tmux send-keys -t "$session_name" "python src/tplrr_finder.py $BUCKET_NAME $FILE_NAME --pattern \"$PATTERNS\" $MAX_SEQUENCES $LOCAL_FLAG $UPLOAD_FLAG" C-m
 
-echo "All analyses started. Use './scripts/tmux_management.sh list' to see all sessions."
+echo "Started analysis in session: $session_name"
+echo "Use './scripts/tmux_management.sh attach $session_name' to check progress"
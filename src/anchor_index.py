@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Anchor Index
+
+This module indexes a sequence database by the positions of short anchor
+k-mers, such as AF, LP, IP and ITD, so that a changed or new fixed-length
+pattern can be counted in seconds instead of rescanning every residue. The
+index is built once per database and holds, for each anchor, the sorted
+offsets of all its occurrences in the database's residue blob; the
+database's own offsets array serves as the sequence offset table.
+
+A query looks for the anchors a pattern requires: a run of conserved
+positions whose allowed k-mers are all indexed. Every window the pattern
+matches starts at an occurrence of such an anchor minus its offset in the
+pattern, so only those candidate windows are tested, and intersecting the
+candidates of several anchors leaves fewer still. Non-overlapping matches
+are then selected per sequence as in a full scan, so the hits are identical
+to those of tplrr_finder.py on the same database.
+
+Usage:
+    python anchor_index.py uniref50.lrrdb --build
+    python anchor_index.py uniref50.lrrdb --pattern TpLRR,Typical --output hits.txt
+    python anchor_index.py uniref50.lrrdb --regex "C.{2}L.{2}I.{1}L.{3}L.{2}I.{3}AF"
+"""
+
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import time
+from contextlib import ExitStack
+from itertools import product
+
+from logging_setup import setup_logging
+from lrr_patterns import LRR_PATTERNS, TPLRR_VARIANTS, load_patterns_from_file, parse_pattern
+from lrr_scanner import build_lrr_entry
+from result_writer import TSVResultWriter
+from sequence_db import DB_SUFFIX, SequenceDB
+
+logger = logging.getLogger(__name__)
+
+# First bytes of every anchor index file
+INDEX_MAGIC = b"LRRANCHR"
+
+# Bump when the layout changes
+INDEX_FORMAT_VERSION = 1
+
+# Extension of anchor index files
+INDEX_SUFFIX = ".lrridx"
+
+# Bytes reserved at the start of the file for the magic and the JSON header
+INDEX_HEADER_SIZE = 65536
+
+# Shortest anchor indexed; single residues occur too often to narrow a search
+MIN_ANCHOR_LENGTH = 2
+
+# Number of residues scanned for anchors at a time while building
+BUILD_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Largest number of k-mers a run of residue classes may expand to and
+# still be looked up as one anchor
+MAX_ANCHOR_ALTERNATIVES = 16
+
+# Intersect with a further anchor only while it has at most this many
+# occurrences per remaining candidate; merging sorted arrays is far cheaper
+# per element than testing a window
+MAX_INTERSECT_RATIO = 32
+
+# Name of the pattern given with --regex
+QUERY_PATTERN_NAME = "query"
+
+def default_anchors():
+    """
+    Derive the default anchors from the literal runs of the known LRR patterns
+
+    Every k-mer of at least MIN_ANCHOR_LENGTH residues inside a run of
+    literal positions is an anchor, e.g. ITD gives IT, TD and ITD, so
+    patterns changed around the run can still use part of it.
+
+    Returns:
+        list: Sorted anchor k-mers
+    """
+    anchors = set()
+    for pattern_info in list(LRR_PATTERNS.values()) + list(TPLRR_VARIANTS.values()):
+        run = ""
+        for residues in parse_pattern(pattern_info["pattern"]) + [None]:
+            if residues is not None and len(residues) == 1:
+                run += next(iter(residues))
+                continue
+            for k in range(MIN_ANCHOR_LENGTH, len(run) + 1):
+                anchors.update(run[i:i + k] for i in range(len(run) - k + 1))
+            run = ""
+    return sorted(anchors)
+
+def default_index_path(db_path):
+    """
+    Name the anchor index of a sequence database, e.g. uniref50.lrrdb -> uniref50.lrridx
+    """
+    root = db_path[:-len(DB_SUFFIX)] if db_path.endswith(DB_SUFFIX) else db_path
+    return f"{root}{INDEX_SUFFIX}"
+
+def _database_info(db):
+    """
+    Describe a sequence database, so an index is only used with the one it was built from
+    """
+    return {
+        "source": db.header["source"],
+        "sequences": len(db),
+        "residues": len(db.residues)
+    }
+
+def build_anchor_index(db_path, anchors=None, index_path=None):
+    """
+    Index the occurrences of anchor k-mers in a sequence database
+
+    The residue blob is scanned in chunks, overlapping by one anchor length
+    so that no occurrence is split, and the positions of each anchor are
+    streamed into a temporary side file that is appended at the end. The
+    index is written under a temporary name and renamed once complete.
+
+    Args:
+        db_path (str): Path to the sequence database
+        anchors (list, optional): Anchor k-mers to index. Defaults to the
+                                  literal runs of the known LRR patterns.
+        index_path (str, optional): Path of the index. Defaults to the
+                                    database path with a .lrridx extension.
+
+    Returns:
+        str: Path to the index
+    """
+    import numpy as np
+
+    anchors = sorted(set(anchors or default_anchors()))
+    for anchor in anchors:
+        if len(anchor) < MIN_ANCHOR_LENGTH or not re.fullmatch(r"[A-Z]+", anchor):
+            raise ValueError(f"Anchors must be at least {MIN_ANCHOR_LENGTH} upper-case residues: {anchor}")
+
+    index_path = index_path or default_index_path(db_path)
+    partial_file = f"{index_path}.partial"
+    side_files = {anchor: f"{partial_file}.{anchor}" for anchor in anchors}
+    counts = dict.fromkeys(anchors, 0)
+    overlap = max(len(anchor) for anchor in anchors) - 1
+    logger.info(f"Building anchor index {index_path} for {len(anchors)} anchors...")
+
+    try:
+        with SequenceDB(db_path) as db:
+            database = _database_info(db)
+            residues = db.residues
+            total = len(residues)
+            # Offsets into the residue blob, in the narrowest type that holds them
+            dtype = np.uint32 if total < 2 ** 32 else np.uint64
+
+            with ExitStack() as stack:
+                handles = {anchor: stack.enter_context(open(side_file, 'wb'))
+                           for anchor, side_file in side_files.items()}
+                for chunk_start in range(0, total, BUILD_CHUNK_SIZE):
+                    n_starts = min(BUILD_CHUNK_SIZE, total - chunk_start)
+                    chunk = np.frombuffer(residues[chunk_start:chunk_start + n_starts + overlap], dtype=np.uint8)
+                    # One comparison per residue, shared by all anchors containing it
+                    equal = {}
+                    for anchor in anchors:
+                        n_windows = min(n_starts, len(chunk) - len(anchor) + 1)
+                        if n_windows <= 0:
+                            continue
+                        found = np.ones(n_windows, dtype=bool)
+                        for offset, residue in enumerate(anchor.encode()):
+                            if residue not in equal:
+                                equal[residue] = chunk == residue
+                            found &= equal[residue][offset:offset + n_windows]
+                        starts = np.flatnonzero(found).astype(dtype) + dtype(chunk_start)
+                        starts.tofile(handles[anchor])
+                        counts[anchor] += len(starts)
+                    del chunk
+
+        # Sections after the header, each aligned for memory mapping
+        sections = {}
+        with open(partial_file, 'wb') as f:
+            f.write(b"\0" * INDEX_HEADER_SIZE)
+            for anchor, side_file in side_files.items():
+                f.write(b"\0" * (-f.tell() % 8))
+                sections[anchor] = [f.tell(), counts[anchor]]
+                with open(side_file, 'rb') as src:
+                    shutil.copyfileobj(src, f)
+
+            header = json.dumps({
+                "format_version": INDEX_FORMAT_VERSION,
+                "database": database,
+                "dtype": np.dtype(dtype).name,
+                "anchors": sections
+            }).encode()
+            if len(INDEX_MAGIC) + 4 + len(header) > INDEX_HEADER_SIZE:
+                raise ValueError("Anchor index header too large; index fewer anchors")
+            f.seek(0)
+            f.write(INDEX_MAGIC + struct.pack("<I", len(header)) + header)
+
+        os.replace(partial_file, index_path)
+    except Exception:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
+    finally:
+        for side_file in side_files.values():
+            if os.path.exists(side_file):
+                os.remove(side_file)
+
+    logger.info(f"Indexed {sum(counts.values())} anchor occurrences in {total} residues to {index_path}")
+    return index_path
+
+class AnchorIndex:
+    """
+    Read-only, memory-mapped anchor index of a sequence database
+
+    Args:
+        index_path (str): Path to the index
+        db (SequenceDB): Open sequence database the index was built from
+    """
+
+    def __init__(self, index_path, db):
+        import numpy as np
+
+        self.path = index_path
+        self.db = db
+        with open(index_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if self._mmap[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError(f"Not an anchor index: {index_path}")
+            header_start = len(INDEX_MAGIC) + 4
+            (header_length,) = struct.unpack("<I", self._mmap[len(INDEX_MAGIC):header_start])
+            self.header = json.loads(self._mmap[header_start:header_start + header_length])
+            if self.header["format_version"] != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported anchor index version {self.header['format_version']}: {index_path}")
+            if self.header["database"] != _database_info(db):
+                raise ValueError(f"Anchor index {index_path} was built from a different database; rebuild it")
+        except Exception:
+            self._mmap.close()
+            raise
+
+        self._dtype = np.dtype(self.header["dtype"])
+        # Number of occurrences of each anchor
+        self.anchors = {anchor: count for anchor, (_, count) in self.header["anchors"].items()}
+        self.anchor_lengths = sorted({len(anchor) for anchor in self.anchors})
+
+    def occurrences(self, anchor):
+        """
+        Get the sorted residue blob offsets of every occurrence of an anchor
+
+        Args:
+            anchor (str): Indexed anchor k-mer
+
+        Returns:
+            numpy.ndarray: View over the mapped index; nothing is copied
+        """
+        import numpy as np
+
+        start, count = self.header["anchors"][anchor]
+        return np.frombuffer(self._mmap, dtype=self._dtype, count=count, offset=start)
+
+    def anchor_terms(self, positions):
+        """
+        Find the indexed anchors a pattern requires
+
+        Args:
+            positions (list): Per-position residue classes, from parse_pattern
+
+        Returns:
+            list: (occurrences, offset, k-mers) tuples, fewest occurrences
+                  first; every match of the pattern starts at an occurrence
+                  of one of the k-mers minus the offset
+        """
+        terms = []
+        for k in self.anchor_lengths:
+            for offset in range(len(positions) - k + 1):
+                window = positions[offset:offset + k]
+                if any(residues is None for residues in window):
+                    continue
+                if math.prod(len(residues) for residues in window) > MAX_ANCHOR_ALTERNATIVES:
+                    continue
+                kmers = ["".join(kmer) for kmer in product(*(sorted(residues) for residues in window))]
+                if all(kmer in self.anchors for kmer in kmers):
+                    terms.append((sum(self.anchors[kmer] for kmer in kmers), offset, kmers))
+        terms.sort()
+        return terms
+
+    def candidate_starts(self, pattern_str):
+        """
+        Find the windows a pattern can only match at, from its anchors
+
+        Args:
+            pattern_str (str or bytes): Fixed-length pattern in the subset
+                                        understood by parse_pattern
+
+        Returns:
+            numpy.ndarray: Sorted residue blob offsets of the candidate
+                           windows, or None if the pattern requires no
+                           indexed anchor
+        """
+        import numpy as np
+
+        terms = self.anchor_terms(parse_pattern(pattern_str))
+        if not terms:
+            return None
+
+        candidates = None
+        for _, offset, kmers in terms:
+            if candidates is not None and sum(self.anchors[kmer] for kmer in kmers) > MAX_INTERSECT_RATIO * len(candidates):
+                break
+            starts = np.concatenate([self.occurrences(kmer) for kmer in kmers]).astype(np.int64) - offset
+            if len(kmers) > 1:
+                starts.sort()
+            starts = starts[starts >= 0]
+            candidates = starts if candidates is None else np.intersect1d(candidates, starts, assume_unique=True)
+        return candidates
+
+    def findall_indexed(self, pattern_str):
+        """
+        Find all non-overlapping matches of a pattern in the database
+
+        Args:
+            pattern_str (str or bytes): Fixed-length pattern in the subset
+                                        understood by parse_pattern
+
+        Returns:
+            tuple: (dictionary of lists of matched byte strings by sequence
+                    index, sequences without matches left out; number of
+                    windows tested)
+        """
+        import numpy as np
+
+        if isinstance(pattern_str, str):
+            pattern_str = pattern_str.encode()
+        pattern = re.compile(pattern_str)
+        length = len(parse_pattern(pattern_str))
+        residues = self.db.residues
+
+        candidates = self.candidate_starts(pattern_str)
+        if candidates is None:
+            # No window can be ruled out, so every matching window is found
+            # with one overlapping scan of the whole blob; no match crosses
+            # the separator between sequences
+            logger.warning(f"No indexed anchor in {pattern_str.decode()}; scanning all {len(residues)} residues")
+            overlapping = re.compile(b"(?=" + pattern_str + b")")
+            starts = [match.start() for match in overlapping.finditer(residues)]
+            n_tested = len(residues)
+        else:
+            match = pattern.match
+            starts = [start for start in candidates.tolist() if match(residues, start)]
+            n_tested = len(candidates)
+
+        results = {}
+        sequence_indices = (np.searchsorted(self.db.offsets, np.array(starts, dtype=np.uint64), side='right') - 1).tolist()
+        next_free = 0
+        for start, index in zip(starts, sequence_indices):
+            if start < next_free:
+                continue
+            results.setdefault(index, []).append(bytes(residues[start:start + length]))
+            next_free = start + length
+        return results, n_tested
+
+    def query(self, pattern_name, pattern_str):
+        """
+        Find all non-overlapping matches of a pattern and log how many there are
+
+        Args:
+            pattern_name (str): Name of the pattern, for logging
+            pattern_str (str): Fixed-length pattern
+
+        Returns:
+            dict: Lists of matched byte strings by sequence index
+        """
+        query_start = time.perf_counter()
+        results, n_tested = self.findall_indexed(pattern_str)
+        n_matches = sum(len(matches) for matches in results.values())
+        logger.info(
+            f"{pattern_name}: {n_matches} matches in {len(results)} sequences "
+            f"({n_tested} windows tested, {time.perf_counter() - query_start:.2f}s)"
+        )
+        return results
+
+    def hits(self, results, pattern_length, positions=False):
+        """
+        Turn query results into the hits a scan of the database would yield
+
+        Args:
+            results (dict): Lists of matched byte strings by sequence index, from query
+            pattern_length (int): Length of the LRR pattern
+            positions (bool): Also record the offset of each match under 'starts'
+
+        Yields:
+            tuple: (sequence ID, LRR data), in database order
+        """
+        for index in sorted(results):
+            record_id, sequence = self.db.record(index)
+            yield record_id, build_lrr_entry(sequence, results[index], pattern_length, positions)
+
+    def close(self):
+        """
+        Release the memory map
+        """
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def select_patterns(pattern_names=None, patterns_file=None, regex=None):
+    """
+    Pick the patterns to query from a pattern file and the command line
+
+    Args:
+        pattern_names (str, optional): Comma-separated names of patterns in
+                                       the file, or "all"
+        patterns_file (str, optional): JSON pattern definitions. Defaults to
+                                       data/patterns.json
+        regex (str, optional): Ad-hoc pattern, queried as QUERY_PATTERN_NAME
+
+    Returns:
+        dict: Pattern information with pattern and length by pattern name
+    """
+    selected = {}
+    if pattern_names:
+        definitions = load_patterns_from_file(patterns_file)
+        names = [name.strip() for name in pattern_names.split(",") if name.strip()]
+        if "all" in names:
+            names = list(definitions)
+        for name in names:
+            if name not in definitions:
+                raise ValueError(f"Unknown pattern: {name}")
+            selected[name] = definitions[name]
+    if regex:
+        selected[QUERY_PATTERN_NAME] = {"pattern": regex, "length": len(parse_pattern(regex))}
+    return selected
+
+def main():
+    parser = argparse.ArgumentParser(description="Query fixed-length LRR patterns against an anchor k-mer index")
+    parser.add_argument("db_path", help="Sequence database (.lrrdb) built by sequence_db.py")
+    parser.add_argument("--index", help="Path of the anchor index; defaults to the database name with .lrridx")
+    parser.add_argument("--build", action="store_true", help="Build the anchor index before querying")
+    parser.add_argument("--anchors",
+                        help="Comma-separated anchor k-mers to index; defaults to the literal runs of the known patterns")
+    parser.add_argument("--pattern", help="Comma-separated pattern names from the pattern file, or 'all'")
+    parser.add_argument("--patterns-file", help="JSON pattern definitions; defaults to data/patterns.json")
+    parser.add_argument("--regex", help=f"Ad-hoc fixed-length pattern, reported as '{QUERY_PATTERN_NAME}'")
+    parser.add_argument("--output",
+                        help="TSV file for the hits; with several patterns the pattern name is inserted before the extension")
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if not args.build and not args.pattern and not args.regex:
+        parser.error("Nothing to do: give --build, --pattern or --regex")
+
+    index_path = args.index or default_index_path(args.db_path)
+    try:
+        if args.build:
+            anchors = [anchor.strip() for anchor in args.anchors.split(",")] if args.anchors else None
+            build_anchor_index(args.db_path, anchors, index_path)
+
+        patterns = select_patterns(args.pattern, args.patterns_file, args.regex)
+        if not patterns:
+            return
+
+        with SequenceDB(args.db_path) as db, AnchorIndex(index_path, db) as index:
+            for pattern_name, pattern_info in patterns.items():
+                results = index.query(pattern_name, pattern_info["pattern"])
+                if not args.output:
+                    continue
+
+                output_file = args.output
+                if len(patterns) > 1:
+                    root, ext = os.path.splitext(args.output)
+                    output_file = f"{root}_{pattern_name}{ext}"
+                with TSVResultWriter(output_file, pattern_name) as writer:
+                    for record_id, data in index.hits(results, pattern_info["length"]):
+                        writer.write(record_id, data)
+                logger.info(f"Results saved to {output_file}")
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
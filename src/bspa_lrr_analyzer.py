@@ -11,26 +11,34 @@ import sys
 import re
 import argparse
 import logging
-from Bio import SeqIO
-from google.cloud import storage
+from contextlib import nullcontext
+from pathlib import Path
+
+# Import from parent directory
+current_dir = Path(__file__).parent.absolute()
+sys.path.append(str(current_dir))
+from fasta_reader import READERS, iter_sequences
+from logging_setup import setup_logging
+from lrr_patterns import ENGINES, TPLRR_VARIANTS, compile_pattern
+from lrr_scanner import scan_sequences
+from result_writer import TSVResultWriter
+from stage_timer import StageTimer, timing_file
+from storage_backends import get_backend
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bspa_lrr_analyzer.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Log file written by main; workers log through the main process, see logging_setup
+LOG_FILE = "bspa_lrr_analyzer.log"
+
 def download_file(bucket_name, file_name, local_path=None):
     """
-    Download a file from Google Cloud Storage
+    Download a file from Google Cloud Storage or a local storage directory
+    
+    A local copy whose checksum matches the object is reused, and an
+    interrupted download is resumed.
     
     Args:
-        bucket_name (str): Name of the GCS bucket
+        bucket_name (str): Name of the GCS bucket, or a storage location accepted by get_backend
         file_name (str): Name of the file to download
         local_path (str, optional): Local path to save the file
         
@@ -43,10 +51,7 @@ def download_file(bucket_name, file_name, local_path=None):
     logger.info(f"Downloading {file_name} from bucket {bucket_name}")
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(bucket_name)
-        blob = bucket.blob(file_name)
-        blob.download_to_filename(local_path)
+        get_backend(bucket_name).download(file_name, local_path)
         logger.info(f"Downloaded {file_name} to {local_path}")
         return local_path
     
@@ -54,55 +59,85 @@ def download_file(bucket_name, file_name, local_path=None):
         logger.error(f"Error downloading file: {e}")
         raise
 
-def find_lrr_patterns(file_name, pattern_str=None):
+# Default TpLRR pattern
+DEFAULT_PATTERN = TPLRR_VARIANTS["TpLRR-BspA"]["pattern"]
+
+def scan_lrr_hits(file_name, pattern_str=None, reader="bytes", engine="re", batch_size=None, timer=None):
     """
-    Find LRR patterns in the specified FASTA file
+    Find LRR patterns in the specified FASTA file, yielding results as they are found
+    
+    Every sequence is yielded, including those without matches.
     
     Args:
-        file_name (str): Path to the input FASTA file
+        file_name (str or file): Path to the input FASTA file, or a binary
+                                 stream such as one from open_blob_stream
         pattern_str (str, optional): Custom regex pattern to use
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        timer (StageTimer, optional): Timer for the stages of the scan
         
-    Returns:
-        dict: Dictionary of LRR data by sequence ID
+    Yields:
+        tuple: (sequence ID, LRR data)
     """
-    # Default TpLRR pattern
     if pattern_str is None:
-        pattern_str = r"C.{2}L.{2}I.{1}L.{3}L.{2}I.{3}AF"
+        pattern_str = DEFAULT_PATTERN
     
-    lrr_pattern = re.compile(pattern_str)
-    lrr_data = {}
+    lrr_pattern = compile_pattern(pattern_str, engine)
     pattern_length = 21  # Length of TpLRR pattern
+    patterns = [("TpLRR", lrr_pattern, pattern_length)]
     
-    logger.info(f"Analyzing file {file_name} for pattern: {pattern_str}")
+    source_name = getattr(file_name, "name", file_name)
+    logger.info(f"Analyzing file {source_name} for pattern: {pattern_str}")
     
+    source = timer.open_input(file_name) if timer else file_name
     try:
-        with open(file_name, 'r') as f:
-            for record in SeqIO.parse(f, 'fasta'):
-                sequence = str(record.seq)
-                pattern_matches = lrr_pattern.findall(sequence)
-                
-                lrr_data[record.id] = {
-                    'count': len(pattern_matches),
-                    'total_lrr_length': len(pattern_matches) * pattern_length,
-                    'total_length': len(sequence),
-                    'patterns': " ".join(pattern_matches)
-                }
+        records = iter_sequences(source, reader)
+        if timer is not None:
+            records, patterns = timer.instrument(records, patterns)
+        hits = scan_sequences(records, patterns, include_empty=True, batch_size=batch_size)
+        if timer is not None:
+            hits = timer.iterate(hits, "scan")
         
         # Count sequences with at least one pattern match
-        matches = sum(1 for data in lrr_data.values() if data['count'] > 0)
+        matches = 0
+        for _, record_id, data in hits:
+            if data['count'] > 0:
+                matches += 1
+            yield record_id, data
+        
         logger.info(f"Analysis complete. Found {matches} sequences with matching patterns")
-        return lrr_data
     
     except Exception as e:
         logger.error(f"Error analyzing file: {e}")
         raise
+    
+    finally:
+        if source is not file_name:
+            source.close()
 
-def save_results(lrr_data, output_file="TpLRR_data.txt"):
+def find_lrr_patterns(file_name, pattern_str=None, reader="bytes", engine="re", batch_size=None):
     """
-    Save LRR pattern analysis results to a file
+    Find LRR patterns in the specified FASTA file
     
     Args:
-        lrr_data (dict): Dictionary of LRR data by sequence ID
+        file_name (str): Path to the input FASTA file
+        pattern_str (str, optional): Custom regex pattern to use
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        
+    Returns:
+        dict: Dictionary of LRR data by sequence ID
+    """
+    return dict(scan_lrr_hits(file_name, pattern_str, reader, engine, batch_size))
+
+def write_results(hits, output_file="TpLRR_data.txt"):
+    """
+    Stream LRR pattern analysis results to a file as they are produced
+    
+    Args:
+        hits (iterable): Iterable of (sequence ID, LRR data) tuples
         output_file (str): Path to the output file
         
     Returns:
@@ -111,10 +146,9 @@ def save_results(lrr_data, output_file="TpLRR_data.txt"):
     logger.info(f"Saving results to {output_file}")
     
     try:
-        with open(output_file, 'w') as f:
-            f.write("Name\tCount\tTotal TpLRR Length\tTotal Sequence Length\tPatterns\n")
-            for name, data in lrr_data.items():
-                f.write(f"{name}\t{data['count']}\t{data['total_lrr_length']}\t{data['total_length']}\t{data['patterns']}\n")
+        with TSVResultWriter(output_file, "TpLRR") as writer:
+            for name, data in hits:
+                writer.write(name, data)
         
         logger.info(f"Results saved to {output_file}")
         return output_file
@@ -123,21 +157,31 @@ def save_results(lrr_data, output_file="TpLRR_data.txt"):
         logger.error(f"Error saving results: {e}")
         raise
 
+def save_results(lrr_data, output_file="TpLRR_data.txt"):
+    """
+    Save LRR pattern analysis results to a file
+    
+    Args:
+        lrr_data (dict): Dictionary of LRR data by sequence ID
+        output_file (str): Path to the output file
+        
+    Returns:
+        str: Path to the output file
+    """
+    return write_results(lrr_data.items(), output_file)
+
 def upload_to_bucket(bucket_name, file_name):
     """
-    Upload a file to Google Cloud Storage
+    Upload a file to Google Cloud Storage or a local storage directory
     
     Args:
-        bucket_name (str): Name of the GCS bucket
+        bucket_name (str): Name of the GCS bucket, or a storage location accepted by get_backend
         file_name (str): Name of the file to upload
     """
     logger.info(f"Uploading {file_name} to bucket {bucket_name}")
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(bucket_name)
-        blob = bucket.blob(file_name)
-        blob.upload_from_filename(file_name)
+        get_backend(bucket_name).upload(file_name)
         logger.info(f"Uploaded {file_name} to bucket {bucket_name}")
     
     except Exception as e:
@@ -146,28 +190,56 @@ def upload_to_bucket(bucket_name, file_name):
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze BspA proteins for TpLRR patterns")
-    parser.add_argument("bucket_name", help="Name of the Google Cloud Storage bucket")
+    parser.add_argument("bucket_name",
+                        help="Name of the Google Cloud Storage bucket, or file:///path for a local directory")
     parser.add_argument("file_name", help="Name of the FASTA file to analyze")
     parser.add_argument("--output", default="TpLRR_data.txt", help="Name of the output file")
     parser.add_argument("--pattern", help="Custom regex pattern to search for")
     parser.add_argument("--local", action="store_true", help="Use local file instead of downloading from bucket")
     parser.add_argument("--no-upload", action="store_true", help="Don't upload results to bucket")
+    parser.add_argument("--download-dir",
+                        help="Directory for downloaded input, reused by later runs (default: current directory)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Analyze the file while streaming it from the bucket instead of downloading it first")
+    parser.add_argument("--reader", default="bytes", choices=READERS,
+                        help="FASTA reader to use for parsing the input")
+    parser.add_argument("--engine", default="re", choices=ENGINES,
+                        help="Pattern matching engine")
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of records matched per regex call over a joined buffer")
+    parser.add_argument("--timing", action="store_true",
+                        help="Time the stages of the scan and write a breakdown next to the output")
     
     args = parser.parse_args()
     
+    setup_logging(LOG_FILE)
+    
     try:
         # Get the FASTA file
-        if not args.local:
-            fasta_file = download_file(args.bucket_name, args.file_name)
-        else:
+        stream = None
+        if args.local:
             fasta_file = args.file_name
             logger.info(f"Using local file: {fasta_file}")
+        elif args.stream:
+            fasta_file = stream = get_backend(args.bucket_name).open_stream(args.file_name)
+        else:
+            local_path = os.path.join(args.download_dir, args.file_name) if args.download_dir else None
+            fasta_file = download_file(args.bucket_name, args.file_name, local_path)
         
-        # Find LRR patterns
-        lrr_data = find_lrr_patterns(fasta_file, args.pattern)
+        # Find LRR patterns and stream the results to the output file
+        timer = StageTimer() if args.timing else None
+        try:
+            hits = scan_lrr_hits(fasta_file, args.pattern, args.reader, args.engine, args.batch_size, timer)
+            with timer.stage("output") if timer else nullcontext():
+                output_file = write_results(hits, args.output)
+        finally:
+            if stream is not None:
+                stream.close()
         
-        # Save results
-        output_file = save_results(lrr_data, args.output)
+        if timer:
+            summary_file = timing_file(output_file)
+            summary = timer.write_summary(summary_file, input=args.file_name, engine=args.engine)
+            logger.info(f"Stage timing ({summary_file}): {timer.format_summary(summary)}")
         
         # Upload results if requested
         if not args.no_upload:
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Scan Checkpoints
+
+This module lets a long scan be resumed after the process dies, e.g. when a
+preemptible VM is reclaimed. The scan is cut into segments of a few minutes;
+after each segment the output files are flushed to disk and a small JSON
+checkpoint records how many input records have been fully processed and how
+large each output file was at that point. A resumed run truncates the output
+files back to those sizes, appends to them, and skips the records already
+processed instead of scanning them again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bump when the checkpoint contents change
+CHECKPOINT_VERSION = 1
+
+# Default number of seconds between checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 300.0
+
+def default_checkpoint_file(file_name, run_info):
+    """
+    Name the checkpoint of a scan of an input file, e.g. uniref50.fasta.gz -> uniref50.fasta.gz.1a2b3c4d.checkpoint.json
+
+    The checkpoint is kept in the current directory, next to the default
+    output files. The name includes a short hash of the scan description, so
+    scans of the same input with different options never share a checkpoint.
+
+    Args:
+        file_name (str): Name of the input file
+        run_info (dict): Description of the scan, as passed to ScanCheckpoint
+
+    Returns:
+        str: Path of the checkpoint file
+    """
+    run_hash = hashlib.sha256(json.dumps(run_info, sort_keys=True).encode()).hexdigest()[:8]
+    return f"{os.path.basename(str(file_name))}.{run_hash}.checkpoint.json"
+
+class ScanCheckpoint:
+    """
+    Progress of a scan that streams hits to output files
+
+    Args:
+        path (str): Path to the checkpoint file
+        run_info (dict): Description of the scan (input fingerprint, patterns,
+                         options); a checkpoint is only resumed by a run with
+                         the same description
+        output_paths (dict): Dictionary mapping pattern name to output file path
+        interval (float): Number of seconds between checkpoints
+    """
+
+    def __init__(self, path, run_info, output_paths, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.run_info = run_info
+        self.output_paths = dict(output_paths)
+        self.interval = interval
+        self.records = 0
+        self.found = dict.fromkeys(output_paths, 0)
+        self.output_sizes = {}
+        self.resumed = False
+        self._writers = []
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, path, run_info, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Load the checkpoint of an interrupted scan
+
+        Args:
+            path (str): Path to the checkpoint file
+            run_info (dict): Description of the scan being resumed
+            interval (float): Number of seconds between checkpoints
+
+        Returns:
+            ScanCheckpoint: Checkpoint to resume from, or None if there is none
+
+        Raises:
+            ValueError: If the checkpoint belongs to a different scan or its
+                        output files are missing or shorter than recorded
+        """
+        if not os.path.isfile(path):
+            return None
+
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION or state["run"] != run_info:
+            raise ValueError(f"Checkpoint {path} belongs to a different scan; remove it or drop --resume")
+
+        checkpoint = cls(path, run_info, state["output_paths"], interval)
+        checkpoint.records = state["records"]
+        checkpoint.found = state["found"]
+        checkpoint.output_sizes = state["output_sizes"]
+        checkpoint.resumed = True
+
+        for output_file, size in checkpoint.output_sizes.items():
+            if not os.path.isfile(output_file) or os.path.getsize(output_file) < size:
+                raise ValueError(f"Output file {output_file} is missing or shorter than recorded in {path}")
+        return checkpoint
+
+    def restore_outputs(self):
+        """
+        Truncate the output files to their sizes at the checkpoint, dropping
+        rows written after it
+        """
+        for output_file, size in self.output_sizes.items():
+            with open(output_file, 'r+b') as f:
+                f.truncate(size)
+
+    def track(self, writers):
+        """
+        Register the writers whose files are flushed at each checkpoint
+
+        Args:
+            writers (iterable): Open result writers with flush and output_file
+        """
+        self._writers = list(dict.fromkeys(writers))
+
+    def due(self):
+        """
+        Check whether the checkpoint interval has elapsed since the last save
+        """
+        return time.monotonic() - self._last_save >= self.interval
+
+    def segment(self, records):
+        """
+        Pass records through until the checkpoint interval has elapsed
+
+        The scan of a segment is finished, and all of its hits written, before
+        the checkpoint is saved and the next segment is started from the same
+        iterator.
+
+        Args:
+            records (iterator): Iterator of (sequence ID, sequence bytes) tuples
+
+        Yields:
+            tuple: (sequence ID, sequence bytes)
+        """
+        for record in records:
+            yield record
+            if self.due():
+                return
+
+    def save(self, records):
+        """
+        Flush the output files to disk and record the progress
+
+        Args:
+            records (int): Number of input records whose hits have all been written
+        """
+        for writer in self._writers:
+            writer.flush()
+            self.output_sizes[writer.output_file] = os.path.getsize(writer.output_file)
+        self.records = records
+
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "run": self.run_info,
+            "output_paths": self.output_paths,
+            "records": records,
+            "found": self.found,
+            "output_sizes": self.output_sizes
+        }
+        # Replace the previous checkpoint atomically so a crash never leaves a truncated one
+        partial_file = f"{self.path}.partial"
+        with open(partial_file, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial_file, self.path)
+
+        self._last_save = time.monotonic()
+        logger.info(f"Checkpoint saved to {self.path} after {records} sequences")
+
+    def stored_run(self):
+        """
+        Get the description of the scan whose checkpoint is saved at this path
+
+        Returns:
+            dict: The saved description, or None if there is no readable checkpoint
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("run")
+        except (OSError, ValueError):
+            return None
+
+    def remove(self):
+        """
+        Delete the checkpoint once the scan has completed, or before a new scan
+
+        A checkpoint saved by a different scan is left alone.
+        """
+        if not os.path.exists(self.path):
+            return
+        stored_run = self.stored_run()
+        if stored_run is not None and stored_run != self.run_info:
+            logger.warning(f"Not removing checkpoint {self.path}: it belongs to a different scan")
+            return
+        os.remove(self.path)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+FASTA Reader
+
+This module provides a minimal streaming FASTA reader that yields
+(id, sequence) pairs straight from large binary blocks, without building
+SeqRecord or Seq objects for every record.
+"""
+
+import gzip
+import io
+import os
+from itertools import chain, islice
+
+# Magic bytes at the start of every gzip stream
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Size of the binary blocks read from the input
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Available FASTA readers
+READERS = ("bytes", "biopython")
+
+# Extensions stripped from FASTA file names to name files derived from them
+FASTA_EXTENSIONS = (".fasta", ".faa", ".fa")
+
+# Suffix of decompressed copies, so a staged copy never shares the input's name
+STAGED_SUFFIX = ".staged.fasta"
+
+def open_fasta(file_name):
+    """
+    Open a FASTA file for binary reading, decompressing it if it is gzipped
+
+    Args:
+        file_name (str): Path to the FASTA file (plain or gzipped)
+
+    Returns:
+        file: Binary file object positioned at the start of the FASTA text
+    """
+    handle = open(file_name, 'rb')
+    if handle.read(2) == GZIP_MAGIC:
+        handle.close()
+        return gzip.open(file_name, 'rb')
+
+    handle.seek(0)
+    return handle
+
+def _parse_record(chunk):
+    """
+    Split the text of one FASTA record (without the leading '>') into its parts
+
+    Args:
+        chunk (bytes): Header line followed by the sequence lines
+
+    Returns:
+        tuple: (sequence ID, sequence bytes)
+    """
+    header, _, sequence = chunk.partition(b"\n")
+    fields = header.split(None, 1)
+    record_id = fields[0].decode() if fields else ""
+    return record_id, sequence.translate(None, b" \r\n")
+
+def skip_records(handle, n_records, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Read past the first records of a FASTA stream without parsing them
+
+    Only header starts are counted, so skipping costs little more than
+    reading (and decompressing) the skipped text.
+
+    Args:
+        handle (file): Binary file object positioned at the start of the FASTA text
+        n_records (int): Number of records to skip
+        block_size (int): Number of bytes to read at a time
+
+    Returns:
+        tuple: (text already read from the next record on, starting with its
+                '>', offset of that '>' in the stream), or (b"", None) if the
+                stream holds no more than n_records records
+    """
+    # A leading newline lets the first header be found as b"\n>" too; data
+    # starts at stream offset data_start
+    data = b"\n"
+    data_start = -1
+    seen = 0
+    while True:
+        block = handle.read(block_size)
+        if not block:
+            return b"", None
+        data = data[-1:] + block
+        count = data.count(b"\n>")
+        if seen + count > n_records:
+            pos = -1
+            for _ in range(n_records + 1 - seen):
+                pos = data.index(b"\n>", pos + 1)
+            return data[pos + 1:], data_start + pos + 1
+        seen += count
+        # Keep the last byte in case "\n>" straddles two blocks
+        data_start += len(data) - 1
+
+def read_fasta(source, block_size=DEFAULT_BLOCK_SIZE, skip=0):
+    """
+    Stream (id, sequence) pairs from a FASTA file
+
+    The ID is the first word of the header line, as in Bio.SeqIO, and the
+    sequence is returned as bytes with line breaks removed.
+
+    Args:
+        source (str or file): Path to a FASTA file (plain or gzipped), or a
+                              binary file object
+        block_size (int): Number of bytes to read at a time
+        skip (int): Number of records to skip, e.g. when resuming a scan
+
+    Yields:
+        tuple: (sequence ID, sequence bytes)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        handle = open_fasta(source)
+        close_handle = True
+    else:
+        handle = source
+        close_handle = False
+
+    try:
+        # A leading newline lets every record, including the first, be split on b"\n>"
+        buffer = b"\n"
+        in_record = False
+        blocks = iter(lambda: handle.read(block_size), b"")
+        if skip:
+            text, offset = skip_records(handle, skip, block_size)
+            if offset is None:
+                return
+            blocks = chain([text], blocks)
+
+        for block in blocks:
+            chunks = (buffer + block).split(b"\n>")
+            buffer = chunks.pop()
+
+            for chunk in chunks:
+                # Skip anything before the first header line
+                if in_record:
+                    yield _parse_record(chunk)
+                in_record = True
+
+        if in_record and buffer:
+            yield _parse_record(buffer)
+
+    finally:
+        if close_handle:
+            handle.close()
+
+def read_fasta_biopython(source):
+    """
+    Stream (id, sequence) pairs from a FASTA file using Bio.SeqIO
+
+    Args:
+        source (str or file): Path to a FASTA file (plain or gzipped), or a
+                              binary file object
+
+    Yields:
+        tuple: (sequence ID, sequence bytes)
+    """
+    from Bio import SeqIO
+
+    is_path = isinstance(source, (str, os.PathLike))
+    f = io.TextIOWrapper(open_fasta(source) if is_path else source)
+    try:
+        for record in SeqIO.parse(f, 'fasta'):
+            yield record.id, str(record.seq).encode()
+    finally:
+        # Leave a caller's file object open
+        if is_path:
+            f.close()
+        else:
+            f.detach()
+
+def iter_sequences(file_name, reader="bytes", skip=0):
+    """
+    Stream (id, sequence) pairs from a FASTA file with the selected reader
+
+    Sequence databases built by sequence_db are read directly, whatever
+    the reader.
+
+    Args:
+        file_name (str or file): Path to a FASTA file (plain or gzipped) or a
+                                 sequence database, or a binary file object
+        reader (str): Either "bytes" for the block reader or "biopython"
+        skip (int): Number of records to skip, e.g. when resuming a scan
+
+    Returns:
+        iterator: Iterator of (sequence ID, sequence bytes) tuples
+    """
+    from sequence_db import is_sequence_db, read_sequence_db
+    if is_sequence_db(file_name):
+        return read_sequence_db(file_name, skip)
+    if reader == "bytes":
+        return read_fasta(file_name, skip=skip)
+    if reader == "biopython":
+        return islice(read_fasta_biopython(file_name), skip, None)
+    raise ValueError(f"Unknown FASTA reader: {reader}")
+
+class _RangeReader:
+    """
+    Binary file wrapper that stops reading at a fixed end offset
+    """
+    
+    def __init__(self, handle, end):
+        self.handle = handle
+        self.remaining = end - handle.tell()
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+def stage_uncompressed(file_name, staging_dir=None):
+    """
+    Decompress a gzipped FASTA file once so it can be split into byte ranges
+    
+    Plain files are returned unchanged; gzipped files are recognised by their
+    magic bytes, whatever their name. The copy is named after the input with
+    the .gz and FASTA extensions replaced by .staged.fasta, and an existing
+    staged copy that is newer than the input is reused.
+    
+    Args:
+        file_name (str): Path to the FASTA file (plain or gzipped)
+        staging_dir (str, optional): Directory for the decompressed copy.
+                                     Defaults to the input file's directory.
+                                     
+    Returns:
+        str: Path to an uncompressed FASTA file
+        
+    Raises:
+        ValueError: If the staged copy would overwrite the input
+    """
+    with open(file_name, 'rb') as f:
+        if f.read(2) != GZIP_MAGIC:
+            return file_name
+    
+    base_name = os.path.basename(file_name)
+    if base_name.endswith(".gz"):
+        base_name = base_name[:-3]
+    root, ext = os.path.splitext(base_name)
+    if ext in FASTA_EXTENSIONS:
+        base_name = root
+    staging_dir = staging_dir or os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(staging_dir, exist_ok=True)
+    staged_file = os.path.join(staging_dir, f"{base_name}{STAGED_SUFFIX}")
+    if os.path.realpath(staged_file) == os.path.realpath(file_name):
+        raise ValueError(f"Staged copy of {file_name} would overwrite the input")
+    
+    if os.path.isfile(staged_file) and os.path.getmtime(staged_file) >= os.path.getmtime(file_name):
+        return staged_file
+    
+    # Write to a temporary name so an interrupted run never leaves a truncated copy
+    partial_file = f"{staged_file}.partial"
+    with gzip.open(file_name, 'rb') as src, open(partial_file, 'wb') as dst:
+        while True:
+            block = src.read(DEFAULT_BLOCK_SIZE)
+            if not block:
+                break
+            dst.write(block)
+    os.replace(partial_file, staged_file)
+    
+    return staged_file
+
+def find_record_chunks(file_name, n_chunks, start=0):
+    """
+    Split an uncompressed FASTA file into byte ranges aligned to record starts
+    
+    Args:
+        file_name (str): Path to an uncompressed FASTA file
+        n_chunks (int): Desired number of chunks
+        start (int): Offset at which the first range begins
+        
+    Returns:
+        list: List of (start, end) byte offsets; every range except possibly
+              the first begins with a '>' header line
+    """
+    file_size = os.path.getsize(file_name)
+    boundaries = [start]
+    
+    with open(file_name, 'rb') as f:
+        for i in range(1, n_chunks):
+            target = max(start + (file_size - start) * i // n_chunks, boundaries[-1])
+            f.seek(target)
+            # Look for the next header line at or after the target offset
+            offset = target
+            window = b""
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    offset = file_size
+                    break
+                window += block
+                pos = window.find(b"\n>")
+                if pos != -1:
+                    offset += pos + 1
+                    break
+                # Keep the last byte in case "\n>" straddles two blocks
+                offset += len(window) - 1
+                window = window[-1:]
+            if offset > boundaries[-1] and offset < file_size:
+                boundaries.append(offset)
+    
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def read_fasta_range(file_name, start, end, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Stream (id, sequence) pairs from a byte range of an uncompressed FASTA file
+    
+    Args:
+        file_name (str): Path to an uncompressed FASTA file
+        start (int): Offset of the first byte of the range (a record start)
+        end (int): Offset one past the last byte of the range
+        block_size (int): Number of bytes to read at a time
+        
+    Yields:
+        tuple: (sequence ID, sequence bytes)
+    """
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        yield from read_fasta(_RangeReader(f, end), block_size)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+GCS I/O
+
+This module streams objects from Google Cloud Storage with parallel ranged
+reads, so that decompression and FASTA parsing start while the rest of the
+object is still arriving and no local copy of the input is needed. It also
+downloads objects to local files that are validated against the stored
+checksums and reused across runs.
+
+The storage client honours the STORAGE_EMULATOR_HOST environment variable,
+so streams can be exercised against a local fake GCS server;
+benchmarks/fake_gcs_check.py does so.
+"""
+
+import base64
+import fcntl
+import glob
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from fasta_reader import DEFAULT_BLOCK_SIZE, GZIP_MAGIC
+
+logger = logging.getLogger(__name__)
+
+# Size of each ranged read
+DEFAULT_RANGE_SIZE = 16 * 1024 * 1024
+
+# Number of ranged reads kept in flight ahead of the consumer
+DEFAULT_PREFETCH = 4
+
+# Size of the blocks read when checksumming local copies
+CHECKSUM_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Suffix of the file recording which object version a local copy holds
+METADATA_SUFFIX = ".gcs.json"
+
+# Files at least this large are uploaded as parallel parts composed in GCS
+COMPOSITE_UPLOAD_THRESHOLD = 150 * 1024 * 1024
+
+# Smallest part of a composite upload
+MIN_PART_SIZE = 32 * 1024 * 1024
+
+# Most source objects GCS accepts in one compose request
+MAX_COMPOSE_PARTS = 32
+
+class BlobRangeReader(io.RawIOBase):
+    """
+    Read-only stream over a GCS object, fetched as parallel ranged reads
+
+    Up to prefetch ranges are downloaded ahead of the reader on a thread
+    pool. Ranges are requested for the object generation seen when the
+    stream was opened, so an object replaced mid-stream fails loudly instead
+    of yielding a mix of old and new bytes.
+
+    Args:
+        blob (google.cloud.storage.Blob): Object to read
+        range_size (int): Size of each ranged read in bytes
+        prefetch (int): Number of ranged reads kept in flight
+    """
+
+    def __init__(self, blob, range_size=DEFAULT_RANGE_SIZE, prefetch=DEFAULT_PREFETCH):
+        super().__init__()
+        if blob.size is None or blob.generation is None:
+            blob.reload()
+        self.blob = blob
+        self.name = f"gs://{blob.bucket.name}/{blob.name}"
+        self.size = blob.size
+        self.range_size = range_size
+        self.prefetch = prefetch
+        self._executor = ThreadPoolExecutor(max_workers=prefetch)
+        self._pending = deque()
+        self._next_start = 0
+        self._buffer = memoryview(b"")
+        self._schedule()
+
+    def _schedule(self):
+        """
+        Submit ranged reads until prefetch of them are in flight
+        """
+        while len(self._pending) < self.prefetch and self._next_start < self.size:
+            start = self._next_start
+            end = min(start + self.range_size, self.size)
+            self._pending.append(self._executor.submit(self._download_range, start, end))
+            self._next_start = end
+
+    def _download_range(self, start, end):
+        """
+        Download the bytes from start up to, but not including, end
+        """
+        # raw_download returns the stored bytes even for objects with a
+        # Content-Encoding, so ranges line up with the object size
+        return self.blob.download_as_bytes(
+            start=start, end=end - 1, raw_download=True, if_generation_match=self.blob.generation
+        )
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            if not self._pending:
+                return 0
+            self._buffer = memoryview(self._pending.popleft().result())
+            self._schedule()
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown(wait=False)
+        super().close()
+
+def default_client():
+    """
+    Create a storage client
+
+    google.cloud.storage takes a few hundred milliseconds to import, so it is
+    only imported once a bucket is actually accessed.
+
+    Returns:
+        google.cloud.storage.Client: New client
+    """
+    from google.cloud import storage
+    return storage.Client()
+
+def open_blob_stream(bucket_name, file_name, range_size=DEFAULT_RANGE_SIZE,
+                     prefetch=DEFAULT_PREFETCH, client=None):
+    """
+    Open a GCS object for streaming, decompressing it if it is gzipped
+
+    Args:
+        bucket_name (str): Name of the bucket
+        file_name (str): Name of the object in the bucket
+        range_size (int): Size of each ranged read in bytes
+        prefetch (int): Number of ranged reads kept in flight
+        client (google.cloud.storage.Client, optional): Storage client to use
+
+    Returns:
+        file: Binary file object positioned at the start of the FASTA text,
+              with a name attribute of the form gs://bucket/object
+    """
+    client = client or default_client()
+    blob = client.bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        raise FileNotFoundError(f"Object not found: gs://{bucket_name}/{file_name}")
+
+    logger.info(f"Streaming gs://{bucket_name}/{file_name} ({blob.size} bytes)...")
+    handle = io.BufferedReader(BlobRangeReader(blob, range_size, prefetch), buffer_size=DEFAULT_BLOCK_SIZE)
+
+    if handle.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC):
+        stream = gzip.GzipFile(fileobj=handle, mode='rb')
+        # Closing the decompressor should also stop the downloads
+        stream.myfileobj = handle
+        return stream
+    return handle
+
+def blob_fingerprint(bucket_name, file_name, client=None):
+    """
+    Identify the contents of a GCS object without downloading it
+
+    Args:
+        bucket_name (str): Name of the bucket
+        file_name (str): Name of the object in the bucket
+        client (google.cloud.storage.Client, optional): Storage client to use
+
+    Returns:
+        str: Fingerprint string built from the object generation, size and CRC32C
+    """
+    client = client or default_client()
+    blob = client.bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        raise FileNotFoundError(f"Object not found: gs://{bucket_name}/{file_name}")
+    return f"gcs:{bucket_name}/{file_name}:{blob.generation}:{blob.size}:{blob.crc32c}"
+
+def _blob_checksum(blob):
+    """
+    Get the checksum GCS stores for an object
+
+    Composite objects have no MD5, so CRC32C is used for them.
+
+    Returns:
+        tuple: (checksum type, base64-encoded checksum)
+    """
+    if blob.md5_hash:
+        return "md5", blob.md5_hash
+    return "crc32c", blob.crc32c
+
+def _file_checksum(file_name, checksum_type):
+    """
+    Compute the checksum of a local file in the form GCS reports it
+
+    Args:
+        file_name (str): Path to the file
+        checksum_type (str): "md5" or "crc32c"
+
+    Returns:
+        str: Base64-encoded checksum
+    """
+    if checksum_type == "md5":
+        digest = hashlib.md5()
+    else:
+        # Installed alongside google-cloud-storage
+        import google_crc32c
+        digest = google_crc32c.Checksum()
+
+    with open(file_name, 'rb') as f:
+        while True:
+            block = f.read(CHECKSUM_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return base64.b64encode(digest.digest()).decode()
+
+def _write_copy_metadata(local_path, version):
+    """
+    Record which object version a local copy holds, and when it was verified
+    """
+    metadata = dict(version, mtime_ns=os.stat(local_path).st_mtime_ns)
+    with open(f"{local_path}{METADATA_SUFFIX}", 'w') as f:
+        json.dump(metadata, f)
+
+def _is_valid_copy(local_path, version):
+    """
+    Check whether a local file holds a given object version
+
+    The file is only checksummed when it is not described by a metadata
+    file from an earlier download, or was modified since.
+    """
+    if not os.path.isfile(local_path) or os.path.getsize(local_path) != version["size"]:
+        return False
+
+    try:
+        with open(f"{local_path}{METADATA_SUFFIX}") as f:
+            if json.load(f) == dict(version, mtime_ns=os.stat(local_path).st_mtime_ns):
+                return True
+    except (FileNotFoundError, ValueError):
+        pass
+
+    logger.info(f"Verifying checksum of existing {local_path}...")
+    if _file_checksum(local_path, version["checksum_type"]) != version["checksum"]:
+        return False
+
+    _write_copy_metadata(local_path, version)
+    return True
+
+def download_blob_cached(bucket_name, file_name, local_path=None, client=None):
+    """
+    Download a GCS object, reusing a local copy with a matching checksum
+
+    Downloads go to a partial file named after the object generation, so an
+    interrupted transfer resumes with a ranged read on the next attempt. The
+    finished file is checked against the MD5 or CRC32C stored in GCS before
+    it replaces the local copy. A lock file makes concurrent runs on the same
+    object wait for a single transfer instead of each starting their own.
+
+    Args:
+        bucket_name (str): Name of the bucket
+        file_name (str): Name of the object in the bucket
+        local_path (str, optional): Local path of the copy. Defaults to file_name.
+        client (google.cloud.storage.Client, optional): Storage client to use
+
+    Returns:
+        str: Path to the local copy
+    """
+    local_path = local_path or file_name
+    client = client or default_client()
+    blob = client.bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        raise FileNotFoundError(f"Object not found: gs://{bucket_name}/{file_name}")
+
+    # Taken before downloading, which may reset the blob's properties
+    checksum_type, checksum = _blob_checksum(blob)
+    version = {
+        "generation": blob.generation,
+        "size": blob.size,
+        "checksum_type": checksum_type,
+        "checksum": checksum
+    }
+
+    local_dir = os.path.dirname(local_path)
+    if local_dir:
+        os.makedirs(local_dir, exist_ok=True)
+
+    with open(f"{local_path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        if _is_valid_copy(local_path, version):
+            logger.info(f"Local copy {local_path} matches gs://{bucket_name}/{file_name}; skipping download")
+            return local_path
+
+        partial_file = f"{local_path}.{version['generation']}.part"
+        # Partial files of other generations can never be resumed
+        for stale_file in glob.glob(f"{glob.escape(local_path)}.*.part"):
+            if stale_file != partial_file:
+                os.remove(stale_file)
+
+        start = os.path.getsize(partial_file) if os.path.exists(partial_file) else 0
+        if start > version["size"]:
+            start = 0
+        if start:
+            logger.info(f"Resuming download of gs://{bucket_name}/{file_name} at byte {start}")
+
+        if start < version["size"]:
+            with open(partial_file, 'ab' if start else 'wb') as f:
+                blob.download_to_file(
+                    f, start=start, raw_download=True, if_generation_match=version["generation"], checksum=None
+                )
+
+        if _file_checksum(partial_file, checksum_type) != checksum:
+            os.remove(partial_file)
+            raise ValueError(f"{checksum_type} mismatch downloading gs://{bucket_name}/{file_name}")
+
+        os.replace(partial_file, local_path)
+        _write_copy_metadata(local_path, version)
+
+    return local_path
+
+def _upload_part(bucket, part_name, file_name, start, size):
+    """
+    Upload size bytes of a local file, starting at start, as a new object
+    """
+    blob = bucket.blob(part_name)
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        blob.upload_from_file(f, size=size)
+    return blob
+
+def upload_composite(bucket_name, file_name, object_name=None, client=None,
+                     part_size=MIN_PART_SIZE, max_workers=MAX_COMPOSE_PARTS):
+    """
+    Upload a large file as parts sent in parallel and composed in GCS
+
+    A single upload is limited to one TCP stream; splitting the file into up
+    to MAX_COMPOSE_PARTS parts lets them travel concurrently. The parts are
+    temporary objects next to the destination and are deleted once they have
+    been composed, or if the upload fails. Composite objects carry a CRC32C
+    but no MD5, which download_blob_cached verifies against.
+
+    Args:
+        bucket_name (str): Name of the bucket
+        file_name (str): Path to the local file
+        object_name (str, optional): Name of the object. Defaults to file_name.
+        client (google.cloud.storage.Client, optional): Storage client to use
+        part_size (int): Smallest part size in bytes; raised as needed to keep
+                         the number of parts within MAX_COMPOSE_PARTS
+        max_workers (int): Number of parts uploaded concurrently
+
+    Returns:
+        google.cloud.storage.Blob: The composed object
+    """
+    object_name = object_name or file_name
+    client = client or default_client()
+    bucket = client.bucket(bucket_name)
+
+    size = os.path.getsize(file_name)
+    n_parts = max(1, min(MAX_COMPOSE_PARTS, math.ceil(size / part_size)))
+    part_size = math.ceil(size / n_parts)
+    # Unique per upload, so concurrent uploads of the same object never share parts
+    part_prefix = f"{object_name}.{uuid.uuid4().hex}.part"
+
+    logger.info(f"Uploading {file_name} to gs://{bucket_name}/{object_name} in {n_parts} parallel parts...")
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, n_parts)) as executor:
+            futures = [
+                executor.submit(
+                    _upload_part, bucket, f"{part_prefix}{index:02d}", file_name,
+                    index * part_size, min(part_size, size - index * part_size)
+                )
+                for index in range(n_parts)
+            ]
+            # Every part must have finished before any is composed or cleaned up
+            wait(futures)
+
+        parts = [future.result() for future in futures]
+        blob = bucket.blob(object_name)
+        blob.compose(parts)
+        return blob
+    finally:
+        # Delete every part that was uploaded, even if another part failed
+        for future in futures:
+            if not future.done() or future.cancelled() or future.exception() is not None:
+                continue
+            part = future.result()
+            try:
+                part.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete temporary part gs://{bucket_name}/{part.name}: {e}")
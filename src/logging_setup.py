@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Logging Setup
+
+This module sets up logging for the command-line scripts so that the main
+process and its worker processes can all log safely. Every process puts its
+log records on one multiprocessing queue, and a single listener thread in
+the main process writes them to the log file and the console. No process
+ever writes to the log file directly, so lines from different workers never
+interleave, and logging in a hot loop only costs a queue put.
+"""
+
+import atexit
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+
+# Format of every log line
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Queue shared with worker processes, set by setup_logging
+_log_queue = None
+
+def setup_logging(log_file=None, level=logging.INFO):
+    """
+    Route the log records of this process and its workers through a single listener
+
+    Args:
+        log_file (str, optional): Path to a log file written in addition to the console
+        level (int): Lowest level logged
+
+    Returns:
+        QueueListener: The running listener, stopped automatically at exit
+    """
+    global _log_queue
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _log_queue = multiprocessing.Queue()
+    listener = QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Runs before the queue's own cleanup, so records still queued at exit are written
+    atexit.register(listener.stop)
+
+    _init_worker_logging(_log_queue, level)
+    return listener
+
+def _init_worker_logging(queue, level):
+    """
+    Send all log records of the current process to the listener's queue
+    """
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(level)
+
+def worker_pool_options():
+    """
+    Get the ProcessPoolExecutor arguments that make workers log through the listener
+
+    Returns:
+        dict: initializer and initargs keyword arguments, or an empty dict
+              if setup_logging has not been called
+    """
+    if _log_queue is None:
+        return {}
+    return {"initializer": _init_worker_logging, "initargs": (_log_queue, logging.getLogger().level)}
@@ -7,6 +7,7 @@ Leucine-Rich Repeat (LRR) proteins.
 """
 
 import json
+import math
 import os
 import re
 from pathlib import Path
@@ -50,21 +51,372 @@ LRR_PATTERNS = {
     }
 }
 
-def get_compiled_pattern(pattern_name):
+# Variants of the TpLRR pattern used by the other scripts. They can be
+# selected by name like the LRR classes but are not part of "all". Every
+# BspA match is a strict TpLRR match, and every strict TpLRR match is a
+# revised one, so the three share a single scan (see pattern_lattice).
+TPLRR_VARIANTS = {
+    "TpLRR-revised": {
+        "pattern": r"[CN].{2}[LVI].{2}[LVI].{1}[LVI].{3}[LVI].{2}[LVI].{3}AF",
+        "length": 21,
+        "description": "TpLRR pattern allowing L/V/I substitutions at conserved positions (21 AA)"
+    },
+    "TpLRR-BspA": {
+        "pattern": r"C.{2}L.{2}I.{1}L.{3}L.{2}I.{3}AF",
+        "length": 21,
+        "description": "Cysteine-only TpLRR pattern used for BspA proteins (21 AA)"
+    }
+}
+
+# Available matching engines
+ENGINES = ("re", "numpy", "shift-add")
+
+# Background amino acid frequencies (UniProtKB/Swiss-Prot composition)
+BACKGROUND_FREQUENCIES = {
+    "A": 0.0825, "R": 0.0553, "N": 0.0406, "D": 0.0545, "C": 0.0137,
+    "Q": 0.0393, "E": 0.0675, "G": 0.0707, "H": 0.0227, "I": 0.0596,
+    "L": 0.0966, "K": 0.0584, "M": 0.0242, "F": 0.0386, "P": 0.0470,
+    "S": 0.0656, "T": 0.0534, "W": 0.0108, "Y": 0.0292, "V": 0.0687
+}
+
+# Prefilter tests are only applied to sequences short enough that, given the
+# background frequencies, they are expected to fail at least this often
+PREFILTER_MIN_REJECT_PROBABILITY = 0.5
+
+# Tests that only reject sequences shorter than this many pattern lengths
+# are dropped, since the per-sequence overhead outweighs the regex work saved
+PREFILTER_MIN_USEFUL_LENGTH_FACTOR = 4
+
+# Longest sequence length considered when deriving prefilter tests
+PREFILTER_MAX_LENGTH = 100000
+
+# Regex tokens for one position of a fixed-length LRR pattern
+_POSITION_TOKEN = re.compile(
+    r"(?P<any>\.)|(?P<literal>[A-Z])|\[(?P<cls>[A-Z]+)\]|\(\?:(?P<alt>[A-Z](?:\|[A-Z])*)\)"
+)
+_QUANTIFIER = re.compile(r"\{(\d+)\}")
+
+def parse_pattern(pattern_str):
+    """
+    Parse a fixed-length LRR pattern into its per-position residue classes
+    
+    Supported syntax is the subset used by the LRR patterns: literal residues,
+    '.', bracket classes such as [GAIVLMFPWC], single-residue alternatives such
+    as (?:C|N), and fixed repeat counts such as .{3}.
+    
+    Args:
+        pattern_str (str or bytes): Regex pattern string
+        
+    Returns:
+        list: One entry per position, either a frozenset of allowed residues
+              or None for a wildcard
+    """
+    if isinstance(pattern_str, bytes):
+        pattern_str = pattern_str.decode()
+    
+    positions = []
+    pos = 0
+    while pos < len(pattern_str):
+        token = _POSITION_TOKEN.match(pattern_str, pos)
+        if token is None:
+            raise ValueError(f"Unsupported pattern syntax at position {pos}: {pattern_str}")
+        pos = token.end()
+        
+        if token.group("any"):
+            residues = None
+        elif token.group("literal"):
+            residues = frozenset(token.group("literal"))
+        elif token.group("cls"):
+            residues = frozenset(token.group("cls"))
+        else:
+            residues = frozenset(token.group("alt").split("|"))
+        
+        repeat = 1
+        quantifier = _QUANTIFIER.match(pattern_str, pos)
+        if quantifier:
+            repeat = int(quantifier.group(1))
+            pos = quantifier.end()
+        
+        positions.extend([residues] * repeat)
+    
+    return positions
+
+class PatternPrefilter:
+    """
+    Cheap literal tests that every sequence matching a pattern must pass
+    
+    Each test only applies to sequences up to a maximum length; longer
+    sequences almost always pass it, so testing them would cost more than
+    the regex work it saves.
+    
+    Args:
+        min_length (int): Minimum sequence length
+        substrings (list): List of (byte string, max_length) tuples for
+                           substrings that must occur in the sequence
+        min_counts (list): List of (residue byte string, minimum count, max_length)
+                           tuples for residues that must occur often enough
+    """
+    
+    def __init__(self, min_length, substrings=(), min_counts=()):
+        self.min_length = min_length
+        self.substrings = list(substrings)
+        self.min_counts = list(min_counts)
+    
+    def may_match(self, sequence):
+        """
+        Check whether a sequence can possibly match the pattern
+        
+        Args:
+            sequence (bytes): Sequence residues
+            
+        Returns:
+            bool: False if the sequence cannot match
+        """
+        length = len(sequence)
+        if length < self.min_length:
+            return False
+        for substring, max_length in self.substrings:
+            if length <= max_length and substring not in sequence:
+                return False
+        for residue, min_count, max_length in self.min_counts:
+            if length <= max_length and sequence.count(residue) < min_count:
+                return False
+        return True
+    
+    @property
+    def has_literal_tests(self):
+        """
+        bool: True if the prefilter tests more than the sequence length
+        """
+        return bool(self.substrings or self.min_counts)
+    
+    def __repr__(self):
+        return (f"PatternPrefilter(min_length={self.min_length}, "
+                f"substrings={self.substrings}, min_counts={self.min_counts})")
+
+def _poisson_tail(expected, min_count):
+    """
+    Probability that a Poisson variable with the given mean is at least min_count
+    """
+    term = math.exp(-expected)
+    below = 0.0
+    for k in range(min_count):
+        below += term
+        term *= expected / (k + 1)
+    return max(0.0, 1.0 - below)
+
+def _max_useful_length(pass_probability, pattern_length, max_pass_probability):
+    """
+    Find the longest sequence length at which a test still rejects often enough
+    
+    Args:
+        pass_probability (callable): Function giving the pass probability for a length
+        pattern_length (int): Length of the pattern
+        max_pass_probability (float): Highest acceptable pass probability
+        
+    Returns:
+        int: Longest useful length, or 0 if the test is not useful for sequences
+             of at least PREFILTER_MIN_USEFUL_LENGTH_FACTOR pattern lengths
+    """
+    if pass_probability(pattern_length * PREFILTER_MIN_USEFUL_LENGTH_FACTOR) > max_pass_probability:
+        return 0
+    
+    # Pass probabilities grow with length, so binary search for the cutoff
+    low, high = pattern_length, PREFILTER_MAX_LENGTH
+    while low < high:
+        mid = (low + high + 1) // 2
+        if pass_probability(mid) <= max_pass_probability:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def build_prefilter(pattern_str, min_reject_probability=PREFILTER_MIN_REJECT_PROBABILITY):
+    """
+    Derive a literal prefilter for a fixed-length LRR pattern
+    
+    Runs of two or more fixed residues become required substrings, and fixed
+    residues become minimum residue counts. Using background amino acid
+    frequencies, each test is limited to the sequence lengths at which it is
+    expected to reject at least min_reject_probability of sequences, tests
+    that stop rejecting that often below PREFILTER_MIN_USEFUL_LENGTH_FACTOR
+    pattern lengths are dropped, and the rest are ordered most selective first.
+    
+    Patterns that start with a fixed residue get only the minimum length: the
+    regex engine already skips ahead to occurrences of a literal first
+    residue, and testing their runs first (ITD for Cysteine-containing, LP for
+    Bacterial and Typical, IP and LG for Plant-specific) measured 10-60%
+    slower on synthetic data. Of the built-in patterns only TpLRR and
+    TpLRR-revised therefore get a literal test, AF; the fixed residues of
+    RI-like are too common to reject often enough.
+    
+    Args:
+        pattern_str (str or bytes): Regex pattern string
+        min_reject_probability (float): Minimum expected rejection rate for a test
+        
+    Returns:
+        PatternPrefilter: Prefilter for the pattern, or None if the pattern
+                          is not a fixed-length position-specific pattern
+    """
+    try:
+        positions = parse_pattern(pattern_str)
+    except ValueError:
+        return None
+    
+    pattern_length = len(positions)
+    if positions and positions[0] is not None and len(positions[0]) == 1:
+        return PatternPrefilter(pattern_length)
+    
+    max_pass_probability = 1.0 - min_reject_probability
+    substrings = []
+    min_counts = []
+    
+    # Required substrings from runs of fixed residues; single residues are
+    # covered by the residue counts below
+    run = ""
+    for residues in positions + [None]:
+        if residues is not None and len(residues) == 1:
+            run += next(iter(residues))
+            continue
+        if len(run) > 1:
+            probability = math.prod(BACKGROUND_FREQUENCIES.get(r, 0.05) for r in run)
+            max_length = _max_useful_length(
+                lambda n, p=probability, k=len(run): 1.0 - (1.0 - p) ** max(n - k + 1, 1),
+                pattern_length, max_pass_probability
+            )
+            if max_length:
+                substrings.append((run.encode(), max_length))
+        run = ""
+    
+    # Minimum residue counts from fixed positions
+    counts = {}
+    for residues in positions:
+        if residues is not None and len(residues) == 1:
+            residue = next(iter(residues))
+            counts[residue] = counts.get(residue, 0) + 1
+    for residue, min_count in counts.items():
+        frequency = BACKGROUND_FREQUENCIES.get(residue, 0.05)
+        max_length = _max_useful_length(
+            lambda n, f=frequency, k=min_count: _poisson_tail(n * f, k),
+            pattern_length, max_pass_probability
+        )
+        if max_length:
+            min_counts.append((residue.encode(), min_count, max_length))
+    
+    # Tests that stay useful for longer sequences are the more selective ones
+    substrings.sort(key=lambda test: -test[1])
+    min_counts.sort(key=lambda test: -test[2])
+    
+    return PatternPrefilter(pattern_length, substrings, min_counts)
+
+def get_pattern_info(pattern_name):
+    """
+    Look up an LRR class or TpLRR variant by name
+    
+    Args:
+        pattern_name (str): Name of the LRR pattern
+        
+    Returns:
+        dict: Pattern information with pattern, length and description
+    """
+    if pattern_name in LRR_PATTERNS:
+        return LRR_PATTERNS[pattern_name]
+    if pattern_name in TPLRR_VARIANTS:
+        return TPLRR_VARIANTS[pattern_name]
+    raise ValueError(f"Unknown pattern: {pattern_name}")
+
+def get_pattern_prefilter(pattern_name):
+    """
+    Get the literal prefilter for the specified LRR class
+    
+    Args:
+        pattern_name (str): Name of the LRR pattern
+        
+    Returns:
+        PatternPrefilter: Prefilter for the pattern
+    """
+    return build_prefilter(get_pattern_info(pattern_name)["pattern"])
+
+def compile_pattern(pattern_str, engine="re", max_mismatches=0):
+    """
+    Compile a pattern string for matching byte sequences
+    
+    Args:
+        pattern_str (str): Regex pattern string
+        engine (str): Matching engine, "re" for a compiled regex, "numpy"
+                      for the vectorized fixed-length matcher, or "shift-add"
+                      for the fixed-length matcher that allows mismatches
+        max_mismatches (int): Number of conserved positions allowed to
+                              mismatch; only the shift-add engine allows any
+        
+    Returns:
+        object: Compiled pattern with a findall method
+    """
+    if max_mismatches and engine != "shift-add":
+        raise ValueError(f"The {engine} engine only finds exact matches; use the shift-add engine for mismatches")
+    if engine == "re":
+        return re.compile(pattern_str.encode())
+    if engine == "numpy":
+        from numpy_matcher import NumpyPattern
+        return NumpyPattern(pattern_str)
+    if engine == "shift-add":
+        from shift_add_matcher import ShiftAddPattern
+        return ShiftAddPattern(pattern_str, max_mismatches)
+    raise ValueError(f"Unknown matching engine: {engine}")
+
+def get_compiled_pattern(pattern_name, binary=False, engine=None, max_mismatches=0):
     """
     Get a compiled regex pattern for the specified LRR class
     
     Args:
         pattern_name (str): Name of the LRR pattern
+        binary (bool): Compile the pattern for matching bytes instead of str
+        engine (str, optional): Matching engine for bytes ("re", "numpy" or
+                                "shift-add"); implies binary
+        max_mismatches (int): Number of conserved positions allowed to
+                              mismatch, for the shift-add engine
         
     Returns:
         tuple: (compiled_pattern, pattern_length)
     """
-    if pattern_name not in LRR_PATTERNS:
-        raise ValueError(f"Unknown pattern: {pattern_name}")
+    pattern_info = get_pattern_info(pattern_name)
+    pattern_str = pattern_info["pattern"]
+    if engine is not None:
+        return (compile_pattern(pattern_str, engine, max_mismatches), pattern_info["length"])
+    if binary:
+        pattern_str = pattern_str.encode()
+    return (re.compile(pattern_str), pattern_info["length"])
+
+def resolve_pattern_names(pattern_names):
+    """
+    Resolve a pattern selection into a list of LRR class names
+    
+    Args:
+        pattern_names (str or list): A single pattern name, a comma-separated
+                                     string of names, a list of names, or "all"
+                                     for every LRR class; TpLRR variants are
+                                     only included by name
+    
+    Returns:
+        list: List of unique pattern names, in the order given
+    """
+    if isinstance(pattern_names, str):
+        pattern_names = [name.strip() for name in pattern_names.split(",") if name.strip()]
+    
+    if any(name.lower() == "all" for name in pattern_names):
+        return list(LRR_PATTERNS.keys())
+    
+    resolved = []
+    for name in pattern_names:
+        if name not in LRR_PATTERNS and name not in TPLRR_VARIANTS:
+            raise ValueError(f"Unknown pattern: {name}")
+        if name not in resolved:
+            resolved.append(name)
+    
+    if not resolved:
+        raise ValueError("No patterns selected")
     
-    pattern_info = LRR_PATTERNS[pattern_name]
-    return (re.compile(pattern_info["pattern"]), pattern_info["length"])
+    return resolved
 
 def save_patterns_to_file(file_path=None):
     """
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+LRR Scanner
+
+This module matches compiled LRR patterns against streams of sequences and
+yields hits as they are found, so that results can be written out without
+being accumulated in memory.
+"""
+
+import time
+from bisect import bisect_right
+from itertools import accumulate, islice
+
+from lrr_patterns import build_prefilter, parse_pattern
+
+# Number of records matched together by batch-capable engines
+DEFAULT_BATCH_SIZE = 4096
+
+# Default number of seconds between progress messages
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+# Byte placed between sequences in a concatenated batch; no LRR pattern
+# position matches it, since '.' excludes newlines
+SEPARATOR = b"\n"
+
+def match_starts(sequence, pattern_matches):
+    """
+    Recover the offsets of non-overlapping, leftmost-first matches
+
+    Each match is looked up from the end of the previous one. A pattern
+    without anchors or lookarounds that matches a string at some offset also
+    matches it at any earlier occurrence, so leftmost-first matching cannot
+    have skipped one, and the first occurrence found is the match itself.
+
+    Args:
+        sequence (bytes or str): Sequence residues
+        pattern_matches (list): Matched strings, in order
+
+    Returns:
+        list: 0-based offset of each match in the sequence
+    """
+    starts = []
+    position = 0
+    for match in pattern_matches:
+        start = sequence.find(match, position)
+        starts.append(start)
+        position = start + len(match)
+    return starts
+
+def build_lrr_entry(sequence, pattern_matches, pattern_length, positions=False, count_mismatches=None):
+    """
+    Build the result entry for one sequence and pattern
+
+    Args:
+        sequence (bytes): Sequence residues
+        pattern_matches (list): List of matched byte strings
+        pattern_length (int): Length of the LRR pattern
+        positions (bool): Also record the offset of each match under 'starts'
+        count_mismatches (callable, optional): Function counting the mismatching
+                                               positions of a match, for patterns
+                                               matched approximately; the counts
+                                               are recorded under 'mismatches'
+
+    Returns:
+        dict: LRR data with count, total_lrr_length, total_length and patterns
+    """
+    entry = {
+        'count': len(pattern_matches),
+        'total_lrr_length': len(pattern_matches) * pattern_length,
+        'total_length': len(sequence),
+        'patterns': b" ".join(pattern_matches).decode()
+    }
+    if positions:
+        entry['starts'] = match_starts(sequence, pattern_matches)
+    if count_mismatches is not None:
+        entry['mismatches'] = [count_mismatches(match) for match in pattern_matches]
+    return entry
+
+def mismatch_counter(pattern):
+    """
+    Get the function counting the mismatches of a pattern's matches
+
+    Args:
+        pattern (object): Compiled pattern
+
+    Returns:
+        callable: The pattern's count_mismatches, or None if it only finds exact matches
+    """
+    return pattern.count_mismatches if getattr(pattern, "max_mismatches", 0) else None
+
+def _prepare_patterns(patterns, prefilter):
+    """
+    Attach a literal prefilter to each regex pattern that benefits from one
+
+    Args:
+        patterns (list): List of (pattern_name, compiled_pattern, pattern_length) tuples
+        prefilter (bool): Whether to build prefilters at all
+
+    Returns:
+        list: List of (pattern_name, compiled_pattern, pattern_length, prefilter,
+              mismatch counter) tuples
+    """
+    prepared = []
+    for pattern_name, pattern, pattern_length in patterns:
+        pattern_prefilter = None
+        # Vectorized engines scan whole batches, so a per-sequence test cannot help them
+        if prefilter and not hasattr(pattern, "findall_indexed"):
+            pattern_prefilter = build_prefilter(pattern.pattern)
+            if pattern_prefilter is not None and not pattern_prefilter.has_literal_tests:
+                pattern_prefilter = None
+        prepared.append((pattern_name, pattern, pattern_length, pattern_prefilter, mismatch_counter(pattern)))
+    return prepared
+
+def _findall(pattern, pattern_prefilter, sequence):
+    """
+    Find all matches of a pattern in one sequence, honouring its prefilter
+    """
+    if pattern_prefilter is None or pattern_prefilter.may_match(sequence):
+        return pattern.findall(sequence)
+    return []
+
+def _can_concatenate(pattern):
+    """
+    Check whether a regex can be run over separator-joined sequences
+
+    Only fixed-length position-specific patterns without capturing groups
+    qualify: their matches can never contain the separator, so one finditer
+    over the joined buffer gives the same matches as findall per sequence.
+    """
+    if pattern.groups:
+        return False
+    try:
+        parse_pattern(pattern.pattern)
+    except ValueError:
+        return False
+    return True
+
+def _findall_concatenated(pattern, pattern_prefilter, sequences):
+    """
+    Find all matches of a regex in a batch of sequences with a single finditer
+
+    Sequences that pass the prefilter are joined with a separator byte, and
+    match offsets are mapped back to sequences with bisect.
+    """
+    results = {}
+    if pattern_prefilter is None:
+        indices = range(len(sequences))
+    else:
+        indices = [index for index, sequence in enumerate(sequences) if pattern_prefilter.may_match(sequence)]
+    if not indices:
+        return results
+
+    candidates = [sequences[index] for index in indices]
+    buffer = SEPARATOR.join(candidates)
+    # Offset of each candidate sequence in the joined buffer
+    offsets = [0]
+    offsets.extend(accumulate(len(sequence) + 1 for sequence in candidates[:-1]))
+
+    for match in pattern.finditer(buffer):
+        index = indices[bisect_right(offsets, match.start()) - 1]
+        if index in results:
+            results[index].append(match.group())
+        else:
+            results[index] = [match.group()]
+
+    return results
+
+def _findall_batch(pattern, pattern_prefilter, sequences, concatenate=False):
+    """
+    Find all matches of a pattern in a batch of sequences
+
+    Returns:
+        dict: Lists of matched byte strings by index of the sequence in the
+              batch; sequences without matches may be left out
+    """
+    if hasattr(pattern, "findall_indexed"):
+        return pattern.findall_indexed(sequences)
+    if concatenate:
+        return _findall_concatenated(pattern, pattern_prefilter, sequences)
+    return dict(enumerate(_findall(pattern, pattern_prefilter, sequence) for sequence in sequences))
+
+def scan_sequences(records, patterns, include_empty=False, prefilter=True, batch_size=None, positions=False):
+    """
+    Match every pattern against each sequence and yield the hits
+
+    Unless disabled, each pattern gets a literal prefilter derived from its
+    fixed residues, and sequences that fail it are never passed to the regex.
+    Patterns from a vectorized engine (with a findall_indexed method) are matched
+    against batches of sequences at once. With a batch_size, regex patterns
+    are run once per batch over the separator-joined sequences instead of once
+    per sequence. Entries of approximate patterns (with a nonzero max_mismatches)
+    also carry the mismatch count of each match under 'mismatches'. Hits are
+    always yielded in record order.
+
+    Args:
+        records (iterable): Iterable of (sequence ID, sequence bytes) tuples
+        patterns (list): List of (pattern_name, compiled_pattern, pattern_length) tuples
+        include_empty (bool): Also yield entries for sequences without matches
+        prefilter (bool): Skip the regex for sequences that fail the literal prefilter
+        batch_size (int, optional): Number of records matched together.
+                                    Defaults to DEFAULT_BATCH_SIZE when any
+                                    pattern supports batches, otherwise 1
+                                    (one regex call per sequence).
+        positions (bool): Also record the offset of each match under 'starts'
+
+    Yields:
+        tuple: (pattern_name, sequence ID, LRR data)
+    """
+    patterns = _prepare_patterns(patterns, prefilter)
+
+    if batch_size is None and any(hasattr(pattern[1], "findall_indexed") for pattern in patterns):
+        batch_size = DEFAULT_BATCH_SIZE
+
+    if batch_size and batch_size > 1:
+        concatenable = [
+            not hasattr(pattern, "findall_indexed") and _can_concatenate(pattern)
+            for _, pattern, _, _, _ in patterns
+        ]
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            sequences = [sequence for _, sequence in batch]
+            batch_matches = [
+                _findall_batch(pattern, pattern_prefilter, sequences, concatenate)
+                for (_, pattern, _, pattern_prefilter, _), concatenate in zip(patterns, concatenable)
+            ]
+
+            # Hits are sparse, so only visit the records that have any
+            if include_empty:
+                hit_indices = range(len(batch))
+            else:
+                hit_indices = sorted(set().union(*batch_matches))
+
+            for index in hit_indices:
+                record_id, sequence = batch[index]
+                for (pattern_name, _, pattern_length, _, count_mismatches), matches in zip(patterns, batch_matches):
+                    pattern_matches = matches.get(index, [])
+                    if pattern_matches or include_empty:
+                        yield pattern_name, record_id, build_lrr_entry(
+                            sequence, pattern_matches, pattern_length, positions, count_mismatches
+                        )
+        return
+
+    for record_id, sequence in records:
+        for pattern_name, pattern, pattern_length, pattern_prefilter, count_mismatches in patterns:
+            pattern_matches = _findall(pattern, pattern_prefilter, sequence)
+
+            if pattern_matches or include_empty:
+                yield pattern_name, record_id, build_lrr_entry(
+                    sequence, pattern_matches, pattern_length, positions, count_mismatches
+                )
+
+class RecordCounter:
+    """
+    Iterator wrapper that counts the records passing through it
+
+    Progress is reported by wall time rather than record count, so the
+    number of messages does not grow with the input and fast scans are not
+    slowed down by logging.
+
+    Args:
+        records (iterable): Iterable of records
+        log_interval (float, optional): Call progress_callback at most every
+                                        log_interval seconds. Defaults to
+                                        DEFAULT_PROGRESS_INTERVAL.
+        progress_callback (callable, optional): Function called with the current count
+        max_records (int, optional): Stop after this many records
+    """
+
+    def __init__(self, records, log_interval=None, progress_callback=None, max_records=None):
+        self.records = records
+        self.log_interval = DEFAULT_PROGRESS_INTERVAL if log_interval is None else log_interval
+        self.progress_callback = progress_callback
+        self.max_records = max_records
+        self.count = 0
+
+    def __iter__(self):
+        callback = self.progress_callback
+        next_report = time.monotonic() + self.log_interval
+        for record in self.records:
+            if self.max_records and self.count >= self.max_records:
+                break
+            self.count += 1
+            yield record
+            if callback is not None and time.monotonic() >= next_report:
+                callback(self.count)
+                next_report = time.monotonic() + self.log_interval
@@ -9,26 +9,48 @@ finding different types of LRR patterns in each file.
 import os
 import sys
 import re
-import gzip
+import math
+import heapq
+import shutil
+import tempfile
+import itertools
 import argparse
 import logging
 from datetime import datetime
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor
-from Bio import SeqIO
-from tqdm import tqdm
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+
+# Import from parent directory
+current_dir = Path(__file__).parent.absolute()
+sys.path.append(str(current_dir))
+from fasta_reader import GZIP_MAGIC, READERS, find_record_chunks, iter_sequences, read_fasta_range, stage_uncompressed
+from logging_setup import setup_logging, worker_pool_options
+from lrr_patterns import ENGINES, compile_pattern
+from lrr_scanner import DEFAULT_PROGRESS_INTERVAL, RecordCounter, scan_sequences
+from result_cache import DEFAULT_MAX_CACHE_SIZE, ResultCache
+from result_writer import TSVResultWriter
+from sequence_db import DB_SUFFIX, SequenceDB, is_sequence_db, read_sequence_db
+from sequence_store import CachedSequenceStore, MemorySequenceStore, SequenceStore, scan_sequences_incremental
+from stage_timer import StageTimer, timing_file
+from storage_backends import DEFAULT_TRANSFER_WORKERS, BackgroundUploader, get_backend
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("ncbi_lrr_finder.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Log file written by main; workers log through the main process, see logging_setup
+LOG_FILE = "ncbi_lrr_finder.log"
+
+# Typical ratio of FASTA text to gzipped size for protein files, used to
+# compare the work in gzipped files and sequence databases
+GZIP_EXPANSION = 2
+
+# Smallest estimated FASTA size of a file split into parallel sub-tasks;
+# smaller files are not worth the staging and merging
+MIN_SPLIT_SIZE = 64 * 1024 * 1024
+
+# Name of the temporary store shared by worker processes with --dedup --parallel
+DEDUP_STORE_NAME = "dedup_store.sqlite"
+
 # Define LRR patterns
 LRR_PATTERNS = {
     "TpLRR": {
@@ -72,99 +94,179 @@ def get_faa_gz_files(folder):
     """
     Get a list of all .faa.gz files in the specified folder
     
+    Sequence databases built from the files by sequence_db are used in
+    their place when present.
+    
     Args:
         folder (str): Path to the folder containing .faa.gz files
         
     Returns:
-        list: List of paths to .faa.gz files
+        list: List of paths to .faa.gz files or their sequence databases
     """
     folder_path = Path(folder)
-    return [str(f) for f in folder_path.glob("**/*.protein.faa.gz") if f.is_file()]
+    files = []
+    for f in folder_path.glob("**/*.protein.faa.gz"):
+        db_file = f.with_name(f.name[:-len(".faa.gz")] + DB_SUFFIX)
+        if db_file.is_file():
+            files.append(str(db_file))
+        elif f.is_file():
+            files.append(str(f))
+    # Databases whose FASTA file has been removed
+    files.extend(
+        str(f) for f in folder_path.glob(f"**/*.protein{DB_SUFFIX}")
+        if f.is_file() and not f.with_name(f.name[:-len(DB_SUFFIX)] + ".faa.gz").exists()
+    )
+    return files
+
+# Store of results shared by all files processed in this process
+_dedup_store = None
 
-def find_lrr_patterns(file_name, pattern_name="RI-like", log_interval=1000):
+def get_dedup_store(sequence_store=None):
     """
-    Find LRR patterns in the specified file
+    Get the per-process store used to scan each unique sequence only once
+    
+    Args:
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        shared with other processes
+    
+    Returns:
+        MemorySequenceStore or CachedSequenceStore: Store shared by all files
+                                                    processed in this process,
+                                                    backed by sequence_store
+                                                    if given
+    """
+    global _dedup_store
+    if _dedup_store is None:
+        _dedup_store = CachedSequenceStore(sequence_store) if sequence_store else MemorySequenceStore()
+    return _dedup_store
+
+def scan_lrr_hits(file_name, pattern_name="RI-like", log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes",
+                  engine="re", batch_size=None, store=None, timer=None, records=None):
+    """
+    Find LRR patterns in the specified file, yielding hits as they are found
     
     Args:
         file_name (str): Path to the input file (gzipped FASTA)
         pattern_name (str): Name of the pattern to search for
-        log_interval (int): Interval for logging progress
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        store (SequenceStore or MemorySequenceStore, optional): Store of results
+                                                                for sequences
+                                                                already scanned
+        timer (StageTimer, optional): Timer for the stages of the scan
+        records (iterable, optional): Records to scan instead of reading
+                                      file_name, e.g. one chunk of it
         
-    Returns:
-        dict: Dictionary of LRR data by sequence ID
+    Yields:
+        tuple: (sequence ID, LRR data)
     """
     if pattern_name not in LRR_PATTERNS:
         raise ValueError(f"Unknown pattern name: {pattern_name}")
     
     pattern_info = LRR_PATTERNS[pattern_name]
-    lrr_pattern = re.compile(pattern_info["pattern"])
+    lrr_pattern = compile_pattern(pattern_info["pattern"], engine)
     pattern_length = pattern_info["length"]
     
-    lrr_data = {}
-    processed_count = 0
     match_count = 0
     
+    def log_progress(processed_count):
+        logger.info(f"Processed {processed_count} sequences, found {match_count} with patterns")
+    
     logger.info(f"Searching for {pattern_name} patterns in {file_name}...")
     
+    source = timer.open_input(file_name) if timer and records is None else file_name
     try:
-        with gzip.open(file_name, 'rt') as f:
-            for record in SeqIO.parse(f, 'fasta'):
-                sequence = str(record.seq)
-                pattern_matches = lrr_pattern.findall(sequence)
-                
-                if pattern_matches:
-                    lrr_data[record.id] = {
-                        'count': len(pattern_matches),
-                        'total_lrr_length': len(pattern_matches) * pattern_length,
-                        'total_length': len(sequence),
-                        'patterns': " ".join(pattern_matches)
-                    }
-                    match_count += 1
-                
-                processed_count += 1
-                if processed_count % log_interval == 0:
-                    logger.info(f"Processed {processed_count} sequences, found {match_count} with patterns")
+        if records is None:
+            records = iter_sequences(source, reader)
+        records = RecordCounter(records, log_interval, log_progress)
+        patterns = [(pattern_name, lrr_pattern, pattern_length)]
+        scan_input = records
+        if timer is not None:
+            scan_input, patterns = timer.instrument(records, patterns)
+        if store is None:
+            hits = scan_sequences(scan_input, patterns, batch_size=batch_size)
+        else:
+            hits = scan_sequences_incremental(scan_input, patterns, store, batch_size=batch_size)
+        if timer is not None:
+            hits = timer.iterate(hits, "scan")
+        
+        for _, record_id, data in hits:
+            match_count += 1
+            yield record_id, data
     
     except Exception as e:
         logger.error(f"Error processing file {file_name}: {e}")
         raise
     
-    logger.info(f"Completed search in {file_name}. Processed {processed_count} sequences.")
+    finally:
+        if source is not file_name:
+            source.close()
+    
+    logger.info(f"Completed search in {file_name}. Processed {records.count} sequences.")
     logger.info(f"Found {match_count} sequences with {pattern_name} patterns.")
+
+def find_lrr_patterns(file_name, pattern_name="RI-like", log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes",
+                      engine="re", batch_size=None):
+    """
+    Find LRR patterns in the specified file
     
-    return lrr_data
+    Args:
+        file_name (str): Path to the input file (gzipped FASTA)
+        pattern_name (str): Name of the pattern to search for
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        
+    Returns:
+        dict: Dictionary of LRR data by sequence ID
+    """
+    return dict(scan_lrr_hits(file_name, pattern_name, log_interval, reader, engine, batch_size))
 
-def save_results(lrr_data, file_name, pattern_name, output_dir=None):
+def get_output_file(file_name, pattern_name, output_dir=None):
     """
-    Save LRR pattern results to a file
+    Build the output file path for an input file and pattern
     
     Args:
-        lrr_data (dict): Dictionary of LRR data by sequence ID
-        file_name (str): Name of the input file (used to generate output file name)
+        file_name (str): Name of the input file
         pattern_name (str): Name of the pattern that was searched
         output_dir (str, optional): Directory to save the output file
-                                   
+        
     Returns:
         str: Path to the output file
     """
-    base_name = os.path.basename(file_name).replace('.faa.gz', '')
+    base_name = os.path.basename(file_name).replace('.faa.gz', '').replace(DB_SUFFIX, '')
     base_name = base_name.replace('.protein', '')
     
     if output_dir:
         # Create output directory if it doesn't exist
         Path(output_dir).mkdir(parents=True, exist_ok=True)
-        output_file = os.path.join(output_dir, f"{base_name}_{pattern_name}.txt")
-    else:
-        output_file = f"{base_name}_{pattern_name}.txt"
+        return os.path.join(output_dir, f"{base_name}_{pattern_name}.txt")
     
+    return f"{base_name}_{pattern_name}.txt"
+
+def write_results(hits, output_file, pattern_name, append=False):
+    """
+    Stream LRR pattern hits to a file as they are produced
+    
+    Args:
+        hits (iterable): Iterable of (sequence ID, LRR data) tuples
+        output_file (str): Path to the output file
+        pattern_name (str): Name of the pattern that was searched
+        append (bool): Append rows to the file without writing a header
+        
+    Returns:
+        str: Path to the output file
+    """
     logger.info(f"Saving results to {output_file}...")
     
     try:
-        with open(output_file, 'w') as f:
-            f.write(f"Name\tCount\tTotal {pattern_name} Length\tTotal Sequence Length\tPatterns\n")
-            for name, data in lrr_data.items():
+        with TSVResultWriter(output_file, pattern_name, append=append) as writer:
+            for name, data in hits:
                 if data['patterns']:
-                    f.write(f"{name}\t{data['count']}\t{data['total_lrr_length']}\t{data['total_length']}\t{data['patterns']}\n")
+                    writer.write(name, data)
         
         logger.info(f"Results saved to {output_file}")
         return output_file
@@ -173,42 +275,385 @@ def save_results(lrr_data, file_name, pattern_name, output_dir=None):
         logger.error(f"Error saving results to {output_file}: {e}")
         raise
 
-def process_file(file_name, pattern_name, output_dir=None, log_interval=1000):
+def save_results(lrr_data, file_name, pattern_name, output_dir=None):
+    """
+    Save LRR pattern results to a file
+    
+    Args:
+        lrr_data (dict): Dictionary of LRR data by sequence ID
+        file_name (str): Name of the input file (used to generate output file name)
+        pattern_name (str): Name of the pattern that was searched
+        output_dir (str, optional): Directory to save the output file
+                                   
+    Returns:
+        str: Path to the output file
+    """
+    output_file = get_output_file(file_name, pattern_name, output_dir)
+    return write_results(lrr_data.items(), output_file, pattern_name)
+
+def process_file(file_name, pattern_name, output_dir=None, log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes",
+                 engine="re", batch_size=None, cache=None, dedup=False, sequence_store=None, timing=False):
     """
     Process a single file for LRR patterns
     
+    Hits are written to the output file as they are found. With a cache, the
+    result of an earlier run on the same file and pattern is reused. With
+    dedup or a sequence store, sequences already scanned in another file are
+    not scanned again.
+    
     Args:
         file_name (str): Path to the input file
         pattern_name (str): Name of the pattern to search for
         output_dir (str, optional): Directory to save the output file
-        log_interval (int): Interval for logging progress
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        cache (ResultCache, optional): Cache of results from earlier runs
+        dedup (bool): Reuse results for sequences seen earlier in this process,
+                      also kept in sequence_store if given
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        shared between processes and runs
+        timing (bool): Time the stages of the scan and write a breakdown
+                       next to the output file
         
     Returns:
         str: Path to the output file
     """
     try:
-        lrr_data = find_lrr_patterns(file_name, pattern_name, log_interval)
-        output_file = save_results(lrr_data, file_name, pattern_name, output_dir)
+        output_file = get_output_file(file_name, pattern_name, output_dir)
+        
+        if cache is not None:
+            pattern_info = LRR_PATTERNS[pattern_name]
+            key = cache.key(file_name, [(pattern_name, pattern_info["pattern"], pattern_info["length"])])
+            if cache.fetch(key, output_file):
+                return output_file
+        
+        timer = StageTimer() if timing else None
+        with SequenceStore(sequence_store) if sequence_store and not dedup else nullcontext() as store:
+            if dedup:
+                store = get_dedup_store(sequence_store)
+            hits = scan_lrr_hits(file_name, pattern_name, log_interval, reader, engine, batch_size, store, timer)
+            with timer.stage("output") if timer else nullcontext():
+                write_results(hits, output_file, pattern_name)
+        
+        if timer:
+            summary_file = timing_file(output_file)
+            summary = timer.write_summary(summary_file, input=file_name, patterns=[pattern_name], engine=engine)
+            logger.info(f"Stage timing of {file_name} ({summary_file}): {timer.format_summary(summary)}")
+        
+        if cache is not None:
+            cache.store(key, output_file)
         return output_file
     except Exception as e:
         logger.error(f"Error processing file {file_name}: {e}")
         return None
 
+def estimate_size(file_name):
+    """
+    Estimate the amount of work in an input file as its size as FASTA text
+    
+    Args:
+        file_name (str): Path to a gzipped FASTA file or a sequence database
+        
+    Returns:
+        int: Estimated size in bytes
+    """
+    size = os.path.getsize(file_name)
+    with open(file_name, 'rb') as f:
+        if f.read(2) == GZIP_MAGIC:
+            return size * GZIP_EXPANSION
+    return size
+
+def prepare_split(file_name, pattern_name, output_dir=None, n_chunks=2, staging_dir=None, cache=None):
+    """
+    Prepare a large file to be scanned as several sub-tasks
+    
+    Gzipped files are decompressed once to a staging file, which is split
+    into byte ranges aligned to record boundaries; a sequence database is
+    split into ranges of records.
+    
+    Args:
+        file_name (str): Path to the input file
+        pattern_name (str): Name of the pattern to search for
+        output_dir (str, optional): Directory to save the output file
+        n_chunks (int): Desired number of sub-tasks
+        staging_dir (str, optional): Directory for the decompressed copy of the input
+        cache (ResultCache, optional): Cache of results from earlier runs
+        
+    Returns:
+        tuple: (output file path, path of the file to scan or None on a cache
+                hit, list of (start, end) chunks, cache key or None)
+    """
+    output_file = get_output_file(file_name, pattern_name, output_dir)
+    
+    key = None
+    if cache is not None:
+        pattern_info = LRR_PATTERNS[pattern_name]
+        key = cache.key(file_name, [(pattern_name, pattern_info["pattern"], pattern_info["length"])])
+        if cache.fetch(key, output_file):
+            return output_file, None, [], key
+    
+    if is_sequence_db(file_name):
+        with SequenceDB(file_name) as db:
+            return output_file, file_name, db.chunks(n_chunks) or [(0, 0)], key
+    
+    logger.info(f"Staging {file_name} for splitting into {n_chunks} parts...")
+    staged_file = stage_uncompressed(file_name, staging_dir)
+    return output_file, staged_file, find_record_chunks(staged_file, n_chunks), key
+
+def process_chunk(source, start, end, pattern_name, part_file, log_interval=DEFAULT_PROGRESS_INTERVAL,
+                  engine="re", batch_size=None, dedup=False, sequence_store=None):
+    """
+    Scan one chunk of a split file, writing its hits to a part file without a header
+    
+    Args:
+        source (str): Path to an uncompressed FASTA file or a sequence database
+        start (int): Offset of the first byte of the chunk, or index of the first record
+        end (int): Offset one past the last byte of the chunk, or index one past the last record
+        pattern_name (str): Name of the pattern to search for
+        part_file (str): Path of the part file
+        log_interval (float): Seconds between progress messages
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        dedup (bool): Reuse results for sequences seen earlier in this process,
+                      also kept in sequence_store if given
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        shared between processes and runs
+        
+    Returns:
+        str: Path to the part file
+    """
+    if is_sequence_db(source):
+        records = read_sequence_db(source, start, end)
+    else:
+        records = read_fasta_range(source, start, end)
+    
+    # Rows are appended, so drop a part left by an interrupted run
+    if os.path.exists(part_file):
+        os.remove(part_file)
+    
+    with SequenceStore(sequence_store) if sequence_store and not dedup else nullcontext() as store:
+        if dedup:
+            store = get_dedup_store(sequence_store)
+        hits = scan_lrr_hits(
+            source, pattern_name, log_interval, engine=engine, batch_size=batch_size, store=store, records=records
+        )
+        return write_results(hits, part_file, pattern_name, append=True)
+
+def merge_parts(output_file, part_files, pattern_name):
+    """
+    Join the part files of a split file into its output file, in order
+    
+    Args:
+        output_file (str): Path to the output file
+        part_files (list): Paths to the part files, in file order
+        pattern_name (str): Name of the pattern that was searched
+    """
+    # The header alone, then the rows of every part
+    TSVResultWriter(output_file, pattern_name).close()
+    with open(output_file, 'ab') as dst:
+        for part_file in part_files:
+            with open(part_file, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+    for part_file in part_files:
+        os.remove(part_file)
+
+def process_files_parallel(file_names, pattern_name, output_dir=None, max_workers=None, split_size=None,
+                           staging_dir=None, log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes", engine="re",
+                           batch_size=None, cache=None, dedup=False, sequence_store=None, timing=False):
+    """
+    Process files on a pool of worker processes, largest first
+    
+    Tasks are kept in a queue ordered by estimated size and handed to the
+    pool one at a time as workers become free, so the largest remaining task
+    always starts next. Files larger than split_size are split into chunks
+    that are scanned as separate tasks and joined once all are done, so that
+    no single genome leaves a long single-core tail.
+    
+    Args:
+        file_names (list): Paths to the input files
+        pattern_name (str): Name of the pattern to search for
+        output_dir (str, optional): Directory to save the output files
+        max_workers (int, optional): Number of worker processes
+        split_size (int, optional): Estimated FASTA size in bytes above which a
+                                    file is split; 0 disables splitting. Defaults
+                                    to half the work per worker, but at least
+                                    MIN_SPLIT_SIZE.
+        staging_dir (str, optional): Directory for decompressed copies of split files
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"; gzipped
+                      files are only split with "bytes"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        cache (ResultCache, optional): Cache of results from earlier runs
+        dedup (bool): Reuse results for sequences seen earlier in any worker
+                      process, through sequence_store or else a temporary
+                      store shared by all workers
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        shared between processes and runs
+        timing (bool): Write a stage timing breakdown for each file scanned
+                       as a single task
+        
+    Yields:
+        tuple: (input file path, output file path or None on failure), as each file completes
+    """
+    max_workers = max_workers or os.cpu_count()
+    sizes = {file_name: estimate_size(file_name) for file_name in file_names}
+    if split_size is None:
+        split_size = max(MIN_SPLIT_SIZE, sum(sizes.values()) // (max_workers * 2))
+    
+    # A per-process store would scan a shared sequence once in every worker that sees it,
+    # so dedup goes through a temporary store shared by all workers, removed at the end
+    dedup_dir = None
+    if dedup and not sequence_store:
+        dedup_dir = tempfile.TemporaryDirectory(prefix="lrr_dedup_", dir=staging_dir)
+        sequence_store = os.path.join(dedup_dir.name, DEDUP_STORE_NAME)
+        logger.info(f"Sharing results of scanned sequences between workers through {sequence_store}")
+    
+    # Heap of (-estimated size, queueing order, input file, function, arguments)
+    queue = []
+    order = itertools.count()
+    
+    def push(size, file_name, function, *arguments):
+        heapq.heappush(queue, (-size, next(order), file_name, function, arguments))
+    
+    # Chunks of a FASTA file are byte ranges, which only the byte reader can parse
+    unsplit = []
+    for file_name, size in sizes.items():
+        if split_size and size > split_size and reader != "bytes" and not is_sequence_db(file_name):
+            unsplit.append(file_name)
+            push(size, file_name, process_file, file_name, pattern_name, output_dir, log_interval, reader,
+                 engine, batch_size, cache, dedup, sequence_store, timing)
+        elif split_size and size > split_size:
+            # Staging gates the file's chunks, so it is queued at the file's full size
+            n_chunks = math.ceil(size / split_size)
+            push(size, file_name, prepare_split, file_name, pattern_name, output_dir, n_chunks, staging_dir, cache)
+        else:
+            push(size, file_name, process_file, file_name, pattern_name, output_dir, log_interval, reader,
+                 engine, batch_size, cache, dedup, sequence_store, timing)
+    if unsplit:
+        logger.warning(f"The {reader} reader cannot scan parts of a file; not splitting {len(unsplit)} large files")
+    
+    # Per split file: output file, part files, chunks still running, cache key, scanned file
+    splits = {}
+    
+    def finish_split(file_name):
+        split = splits.pop(file_name)
+        try:
+            if split["failed"]:
+                return None
+            merge_parts(split["output_file"], split["parts"], pattern_name)
+            if cache is not None:
+                cache.store(split["key"], split["output_file"])
+            return split["output_file"]
+        finally:
+            for part_file in split["parts"]:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+            if split["source"] != file_name:
+                os.remove(split["source"])
+    
+    running = {}
+    with dedup_dir or nullcontext(), ProcessPoolExecutor(max_workers=max_workers, **worker_pool_options()) as executor:
+        while queue or running:
+            # Only hand the pool as many tasks as it has workers, so the queue order decides what runs next
+            while queue and len(running) < max_workers:
+                _, _, file_name, function, arguments = heapq.heappop(queue)
+                running[executor.submit(function, *arguments)] = (file_name, function)
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_name, function = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {file_name}: {e}")
+                    result = None
+                
+                if function is process_file:
+                    yield file_name, result
+                
+                elif function is prepare_split:
+                    if result is None:
+                        yield file_name, None
+                        continue
+                    output_file, source, chunks, key = result
+                    if source is None:
+                        yield file_name, output_file
+                        continue
+                    parts = [f"{output_file}.part{i:04d}" for i in range(len(chunks))]
+                    splits[file_name] = {
+                        "output_file": output_file, "parts": parts, "remaining": len(chunks),
+                        "key": key, "source": source, "failed": False
+                    }
+                    logger.info(f"Scanning {file_name} as {len(chunks)} parts")
+                    for (start, end), part_file in zip(chunks, parts):
+                        push(sizes[file_name] / len(chunks), file_name, process_chunk, source, start, end,
+                             pattern_name, part_file, log_interval, engine, batch_size, dedup, sequence_store)
+                
+                else:
+                    split = splits[file_name]
+                    split["remaining"] -= 1
+                    split["failed"] = split["failed"] or result is None
+                    if split["remaining"] == 0:
+                        yield file_name, finish_split(file_name)
+
 def main():
     parser = argparse.ArgumentParser(description="Find LRR patterns in NCBI RefSeq FASTA files")
     parser.add_argument("folder", help="Path to the folder containing NCBI RefSeq FASTA files")
     parser.add_argument("--pattern", default="RI-like", choices=LRR_PATTERNS.keys(),
                         help="Pattern to search for")
     parser.add_argument("--output-dir", help="Directory to save the output files")
-    parser.add_argument("--log-interval", type=int, default=1000, 
-                        help="Interval for logging progress")
+    parser.add_argument("--log-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="Seconds between progress messages")
     parser.add_argument("--parallel", action="store_true", 
                         help="Process files in parallel")
     parser.add_argument("--max-workers", type=int, default=os.cpu_count(), 
                         help="Maximum number of worker processes to use")
+    parser.add_argument("--split-size", type=float,
+                        help="Split files larger than this many MB of FASTA text into parallel parts "
+                             "(default: half the work per worker, at least 64; 0 disables)")
+    parser.add_argument("--staging-dir",
+                        help="Directory for decompressed copies of files split with --parallel")
+    parser.add_argument("--reader", default="bytes", choices=READERS,
+                        help="FASTA reader to use for parsing the input; only the bytes reader splits files "
+                             "with --parallel")
+    parser.add_argument("--engine", default="re", choices=ENGINES,
+                        help="Pattern matching engine")
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of records matched per regex call over a joined buffer")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Scan sequences shared between files only once; with --parallel the workers share "
+                             "a temporary SQLite store. Gains least for patterns starting with a fixed residue, "
+                             "such as Bacterial, which match fastest")
+    parser.add_argument("--sequence-store",
+                        help="SQLite file of per-sequence results shared by all workers and later runs")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always scan the input files instead of reusing cached results")
+    parser.add_argument("--cache-dir", help="Directory for cached results")
+    parser.add_argument("--cache-max-size", type=float, default=DEFAULT_MAX_CACHE_SIZE / 1024 ** 3,
+                        help="Maximum total size of cached results in GB")
+    parser.add_argument("--cache-checksum", action="store_true",
+                        help="Identify input files by checksum instead of size and modification time")
+    parser.add_argument("--upload",
+                        help="Bucket name, or file:///path for a local directory, to publish the output files to")
+    parser.add_argument("--upload-prefix", default="",
+                        help="Prefix of the uploaded object names, e.g. 'results/'")
+    parser.add_argument("--upload-workers", type=int, default=DEFAULT_TRANSFER_WORKERS,
+                        help="Number of concurrent uploads")
+    parser.add_argument("--timing", action="store_true",
+                        help="Time the stages of each scan and write a breakdown next to each output file; "
+                             "files split into parts with --parallel get no breakdown")
     
     args = parser.parse_args()
     
+    setup_logging(LOG_FILE)
+    
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir, int(args.cache_max_size * 1024 ** 3), args.cache_checksum)
+    
     try:
         # Get list of input files
         faa_gz_files = get_faa_gz_files(args.folder)
@@ -219,27 +664,37 @@ def main():
         
         logger.info(f"Found {len(faa_gz_files)} .protein.faa.gz files")
         
+        # Each output file is uploaded as soon as it is written, while later files are scanned
+        uploader = None
+        if args.upload:
+            uploader = BackgroundUploader(get_backend(args.upload), args.upload_prefix, args.upload_workers)
+        
+        from tqdm import tqdm
         if args.parallel:
             logger.info(f"Processing files in parallel with {args.max_workers} workers")
-            with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-                futures = {
-                    executor.submit(
-                        process_file, 
-                        file_name, 
-                        args.pattern,
-                        args.output_dir,
-                        args.log_interval
-                    ): file_name for file_name in faa_gz_files
-                }
-                
-                for future in tqdm(futures, desc="Processing files"):
-                    file_name = futures[future]
-                    try:
-                        output_file = future.result()
-                        if output_file:
-                            logger.info(f"Completed processing {file_name} -> {output_file}")
-                    except Exception as e:
-                        logger.error(f"Error processing {file_name}: {e}")
+            split_size = None if args.split_size is None else int(args.split_size * 1024 ** 2)
+            completed = process_files_parallel(
+                faa_gz_files,
+                args.pattern,
+                args.output_dir,
+                args.max_workers,
+                split_size,
+                args.staging_dir,
+                args.log_interval,
+                args.reader,
+                args.engine,
+                args.batch_size,
+                cache,
+                args.dedup,
+                args.sequence_store,
+                args.timing
+            )
+            
+            for file_name, output_file in tqdm(completed, total=len(faa_gz_files), desc="Processing files"):
+                if output_file:
+                    if uploader is not None:
+                        uploader.submit(output_file)
+                    logger.info(f"Completed processing {file_name} -> {output_file}")
         else:
             logger.info("Processing files sequentially")
             for file_name in tqdm(faa_gz_files, desc="Processing files"):
@@ -247,11 +702,25 @@ def main():
                     file_name, 
                     args.pattern,
                     args.output_dir,
-                    args.log_interval
+                    args.log_interval,
+                    args.reader,
+                    args.engine,
+                    args.batch_size,
+                    cache,
+                    args.dedup,
+                    args.sequence_store,
+                    args.timing
                 )
                 if output_file:
+                    if uploader is not None:
+                        uploader.submit(output_file)
                     logger.info(f"Completed processing {file_name} -> {output_file}")
         
+        if uploader is not None:
+            logger.info(f"Waiting for uploads to {uploader.backend} to finish...")
+            uploaded = uploader.wait()
+            logger.info(f"Uploaded {len(uploaded)} output files to {uploader.backend}")
+        
         logger.info("All files processed successfully")
     
     except Exception as e:
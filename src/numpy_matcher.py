@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+NumPy Matcher
+
+This module provides a vectorized matching engine for the fixed-length,
+position-specific LRR patterns. Batches of sequences are encoded as one uint8
+array, and each pattern position is evaluated for all candidate offsets at
+once with a lookup-table mask.
+"""
+
+import numpy as np
+
+from lrr_patterns import BACKGROUND_FREQUENCIES, parse_pattern
+
+# Byte placed between sequences in a batch
+SEPARATOR = b"\n"
+
+class NumpyPattern:
+    """
+    Vectorized matcher for a fixed-length LRR pattern
+
+    Produces the same non-overlapping, leftmost-first matches as re.findall.
+
+    Args:
+        pattern_str (str or bytes): Regex pattern string in the fixed-length
+                                    subset understood by parse_pattern
+    """
+
+    def __init__(self, pattern_str):
+        if isinstance(pattern_str, str):
+            pattern_str = pattern_str.encode()
+        self.pattern = pattern_str
+        positions = parse_pattern(pattern_str)
+        self.length = len(positions)
+
+        # One lookup table per constrained position, most selective first so
+        # the candidate set shrinks as quickly as possible
+        lookups = []
+        for offset, residues in enumerate(positions):
+            if residues is None:
+                continue
+            table = np.zeros(256, dtype=bool)
+            table[[ord(residue) for residue in residues]] = True
+            selectivity = sum(BACKGROUND_FREQUENCIES.get(residue, 0.05) for residue in residues)
+            lookups.append((selectivity, offset, table))
+        self.lookups = [(offset, table) for _, offset, table in sorted(lookups, key=lambda item: item[0])]
+
+    def _match_starts(self, buffer, starts, ends):
+        """
+        Find every offset at which the pattern matches in an encoded buffer
+
+        Args:
+            buffer (numpy.ndarray): uint8 array of separator-joined sequences
+            starts (numpy.ndarray): Offset of the first residue of each sequence
+            ends (numpy.ndarray): Offset one past the last residue of each sequence
+
+        Returns:
+            tuple: (sorted match start offsets, possibly overlapping;
+                    index of the sequence containing each match)
+        """
+        n_windows = len(buffer) - self.length + 1
+        if n_windows <= 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        # The first position is evaluated for every offset; later positions
+        # only for the offsets that are still candidates
+        if self.lookups:
+            offset, table = self.lookups[0]
+            candidates = np.flatnonzero(table[buffer[offset:offset + n_windows]])
+            for offset, table in self.lookups[1:]:
+                candidates = candidates[table[buffer[candidates + offset]]]
+        else:
+            candidates = np.arange(n_windows)
+
+        # Drop windows that run past the end of their sequence
+        indices = np.searchsorted(starts, candidates, side="right") - 1
+        inside = candidates + self.length <= ends[indices]
+        return candidates[inside], indices[inside]
+
+    def _select_non_overlapping(self, starts):
+        """
+        Pick matches left to right, skipping those overlapping an earlier pick
+
+        Args:
+            starts (iterable): Sorted match start offsets
+
+        Returns:
+            list: Selected start offsets
+        """
+        selected = []
+        next_free = -1
+        for start in starts:
+            if start >= next_free:
+                selected.append(start)
+                next_free = start + self.length
+        return selected
+
+    def findall(self, sequence):
+        """
+        Find all non-overlapping matches in one sequence
+
+        Args:
+            sequence (bytes): Sequence residues
+
+        Returns:
+            list: List of matched byte strings
+        """
+        return self.findall_batch([sequence])[0]
+
+    def findall_batch(self, sequences):
+        """
+        Find all non-overlapping matches in each of a batch of sequences
+
+        Args:
+            sequences (list): List of sequences as bytes
+
+        Returns:
+            list: One list of matched byte strings per sequence
+        """
+        results = [[] for _ in sequences]
+        for index, matches in self.findall_indexed(sequences).items():
+            results[index] = matches
+        return results
+
+    def findall_indexed(self, sequences):
+        """
+        Find all non-overlapping matches in a batch of sequences, keyed by position
+
+        Args:
+            sequences (list): List of sequences as bytes
+
+        Returns:
+            dict: Lists of matched byte strings by index of the sequence in
+                  the batch; sequences without matches are left out
+        """
+        results = {}
+        if not sequences:
+            return results
+
+        joined = SEPARATOR.join(sequences)
+        buffer = np.frombuffer(joined, dtype=np.uint8)
+
+        # Offsets of the first and one past the last residue of each sequence
+        lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+        ends = np.cumsum(lengths + 1) - 1
+        starts = ends - lengths
+
+        match_starts, indices = self._match_starts(buffer, starts, ends)
+
+        # Matches are sparse, so the per-sequence selection runs in Python
+        boundaries = np.flatnonzero(np.diff(indices)) + 1
+        for group, group_indices in zip(np.split(match_starts, boundaries), np.split(indices, boundaries)):
+            if len(group) == 0:
+                continue
+            results[int(group_indices[0])] = [
+                joined[start:start + self.length] for start in self._select_non_overlapping(group.tolist())
+            ]
+
+        return results
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Parquet Writer
+
+This module writes LRR pattern hits to Parquet files with one row per
+match, including where in the sequence each match lies. Rows are written in
+row groups as the scan goes, and the pattern class is dictionary-encoded, so
+a class's hits load into pandas quickly and can be filtered on read, e.g.
+pd.read_parquet(path, filters=[("class", "==", "TpLRR")]).
+
+Requires pyarrow.
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Number of matches buffered before a row group is written
+DEFAULT_ROW_GROUP_SIZE = 1000000
+
+# One row per match; start is 0-based and end is exclusive
+SCHEMA = pa.schema([
+    ("sequence_id", pa.string()),
+    ("class", pa.dictionary(pa.int8(), pa.string())),
+    ("start", pa.int32()),
+    ("end", pa.int32()),
+    ("residues", pa.string()),
+    ("sequence_length", pa.int32())
+])
+
+# Schema of the results of an approximate scan, with the number of
+# mismatching positions of each match
+MISMATCH_SCHEMA = SCHEMA.append(pa.field("mismatches", pa.int8()))
+
+class ParquetResultWriter:
+    """
+    Streaming Parquet writer for LRR pattern hits, with one row per match
+
+    Has the same interface as TSVResultWriter. Hit entries must carry match
+    offsets, i.e. come from a scan run with positions=True.
+
+    Args:
+        output_file (str): Path to the output file
+        row_group_size (int): Number of matches per row group
+        compression (str): Parquet compression codec
+        mismatches (bool): Add a mismatches column; hit entries must then
+                           carry 'mismatches'
+    """
+
+    def __init__(self, output_file, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression="zstd", mismatches=False):
+        self.output_file = output_file
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self.schema = MISMATCH_SCHEMA if mismatches else SCHEMA
+        self._writer = pq.ParquetWriter(output_file, self.schema, compression=compression)
+        self._columns = {name: [] for name in self.schema.names}
+
+    def write(self, name, data, pattern_name=None):
+        """
+        Add the matches of one sequence
+
+        Args:
+            name (str): Sequence ID
+            data (dict): LRR data for the sequence, with 'starts'
+            pattern_name (str, optional): Pattern name for the class column
+        """
+        if not data['count']:
+            return
+        columns = self._columns
+        for start, residues in zip(data['starts'], data['patterns'].split(" ")):
+            columns["sequence_id"].append(name)
+            columns["class"].append(pattern_name)
+            columns["start"].append(start)
+            columns["end"].append(start + len(residues))
+            columns["residues"].append(residues)
+            columns["sequence_length"].append(data['total_length'])
+        if "mismatches" in columns:
+            columns["mismatches"].extend(data['mismatches'])
+        self.rows_written += data['count']
+
+        if len(columns["start"]) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        """
+        Write the buffered matches as one row group
+        """
+        if self._columns["start"]:
+            self._writer.write_table(pa.table(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in self.schema.names}
+
+    def close(self):
+        """
+        Write the remaining matches and the file footer
+        """
+        if self._writer is not None:
+            try:
+                self._write_row_group()
+            finally:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
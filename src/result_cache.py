@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Result Cache
+
+This module keeps finished result files in a content-addressed on-disk cache,
+so that rerunning a search with the same input and patterns copies the
+previous output instead of scanning the input again. The cache is bounded in
+size and evicts the least recently used entries first.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Bump when the output format changes so that old entries are never reused
+CACHE_FORMAT_VERSION = 1
+
+# Default cache location, overridable with the LRR_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.environ.get(
+    "LRR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lrr_results")
+)
+
+# Default upper bound on the total size of cached results in bytes
+DEFAULT_MAX_CACHE_SIZE = 10 * 1024 ** 3
+
+# Size of the blocks read when computing file digests
+DIGEST_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Extension of cached result files
+ENTRY_SUFFIX = ".tsv"
+
+def file_digest(file_name, block_size=DIGEST_BLOCK_SIZE):
+    """
+    Compute the SHA-256 digest of a file's contents
+
+    Args:
+        file_name (str): Path to the file
+        block_size (int): Number of bytes to read at a time
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Size-bounded, least recently used cache of result files
+
+    Entries are keyed by a fingerprint of the input file, the patterns that
+    were searched, and any options that change the output. By default the
+    input is identified by its path, size and modification time, which is
+    instant; with checksum=True its contents are hashed instead, so that
+    renamed or re-downloaded copies of the same file also hit the cache.
+
+    Args:
+        cache_dir (str, optional): Directory holding the cached results
+        max_size (int): Maximum total size of cached results in bytes
+        checksum (bool): Identify input files by a SHA-256 digest of their contents
+    """
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_CACHE_SIZE, checksum=False):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_size = max_size
+        self.checksum = checksum
+        self._fingerprints = {}
+
+    def input_fingerprint(self, file_name):
+        """
+        Identify the contents of an input file
+
+        Args:
+            file_name (str): Path to the input file
+
+        Returns:
+            str: Fingerprint string
+        """
+        stat = os.stat(file_name)
+        if not self.checksum:
+            return f"stat:{os.path.realpath(file_name)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        # Digests of large inputs are slow, so remember them for this process
+        stat_key = (os.path.realpath(file_name), stat.st_size, stat.st_mtime_ns)
+        if stat_key not in self._fingerprints:
+            logger.info(f"Computing checksum of {file_name}...")
+            self._fingerprints[stat_key] = f"sha256:{file_digest(file_name)}"
+        return self._fingerprints[stat_key]
+
+    def key(self, file_name, patterns, **options):
+        """
+        Build the cache key for a search
+
+        Args:
+            file_name (str): Path to the input file
+            patterns (list): List of (pattern_name, pattern_str, pattern_length) tuples
+            **options: Other settings that change the output, e.g. combined=True
+
+        Returns:
+            str: Hex cache key
+        """
+        return self.fingerprint_key(self.input_fingerprint(file_name), patterns, **options)
+
+    def fingerprint_key(self, input_fingerprint, patterns, **options):
+        """
+        Build the cache key for a search of an input identified by fingerprint
+
+        Used for inputs that are not local files, such as streamed GCS objects.
+
+        Args:
+            input_fingerprint (str): Fingerprint of the input
+            patterns (list): List of (pattern_name, pattern_str, pattern_length) tuples
+            **options: Other settings that change the output, e.g. combined=True
+
+        Returns:
+            str: Hex cache key
+        """
+        key_data = {
+            "version": CACHE_FORMAT_VERSION,
+            "input": input_fingerprint,
+            "patterns": [list(pattern) for pattern in patterns],
+            "options": options
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key):
+        """
+        Get the path of the cached result for a key
+        """
+        return os.path.join(self.cache_dir, f"{key}{ENTRY_SUFFIX}")
+
+    def fetch(self, key, output_file):
+        """
+        Copy a cached result to the output file
+
+        Args:
+            key (str): Cache key
+            output_file (str): Path to write the result to
+
+        Returns:
+            bool: True on a cache hit, False if there is no entry for the key
+        """
+        entry = self.entry_path(key)
+        try:
+            shutil.copyfile(entry, output_file)
+            # Mark the entry as recently used
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+
+        logger.info(f"Reused cached result for {output_file}")
+        return True
+
+    def store(self, key, output_file):
+        """
+        Add a finished result file to the cache and evict old entries
+
+        Args:
+            key (str): Cache key
+            output_file (str): Path to the result file
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Copy to a temporary name first so concurrent readers never see a partial entry
+        fd, partial_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".partial")
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(output_file, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(partial_file, self.entry_path(key))
+        except Exception:
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_size
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                logger.info(f"Evicted cached result {os.path.basename(path)}")
+            except FileNotFoundError:
+                # Already removed by another process
+                pass
+            total_size -= size
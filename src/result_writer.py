@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Result Writer
+
+This module writes LRR pattern hits to TSV files as they are found. Output is
+buffered and flushed periodically so that partial results are on disk during
+long runs. Hits can also be written to Parquet, see parquet_writer.
+"""
+
+import os
+import time
+
+# Size of the output buffer in bytes
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Maximum number of seconds between flushes of the output buffer
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+# Available output formats
+OUTPUT_FORMATS = ("tsv", "parquet")
+
+# File extension of each output format
+OUTPUT_EXTENSIONS = {"tsv": ".txt", "parquet": ".parquet"}
+
+class TSVResultWriter:
+    """
+    Buffered, streaming TSV writer for LRR pattern hits
+
+    Args:
+        output_file (str): Path to the output file
+        pattern_name (str): Pattern name used in the length column header
+        class_column (bool): Write a leading Class column with the pattern name
+        buffer_size (int): Size of the output buffer in bytes
+        flush_interval (float): Maximum number of seconds between flushes
+        append (bool): Append rows to an existing file, e.g. when resuming a
+                       scan, instead of starting a new file with a header
+        mismatches (bool): Write a trailing Mismatches column with the number
+                           of mismatching positions of each match
+    """
+
+    def __init__(self, output_file, pattern_name="TpLRR", class_column=False,
+                 buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, append=False,
+                 mismatches=False):
+        self.output_file = output_file
+        self.class_column = class_column
+        self.mismatches = mismatches
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._handle = open(output_file, 'a' if append else 'w', buffering=buffer_size)
+        self._last_flush = time.monotonic()
+
+        # An appended file already has its header
+        if append:
+            return
+        if class_column:
+            header = "Class\tName\tCount\tTotal LRR Length\tTotal Sequence Length\tPatterns"
+        else:
+            header = f"Name\tCount\tTotal {pattern_name} Length\tTotal Sequence Length\tPatterns"
+        if mismatches:
+            header += "\tMismatches"
+        self._handle.write(f"{header}\n")
+
+    def write(self, name, data, pattern_name=None):
+        """
+        Write one result row
+
+        Args:
+            name (str): Sequence ID
+            data (dict): LRR data for the sequence
+            pattern_name (str, optional): Pattern name for the Class column
+        """
+        row = f"{name}\t{data['count']}\t{data['total_lrr_length']}\t{data['total_length']}\t{data['patterns']}"
+        if self.mismatches:
+            row += "\t" + " ".join(map(str, data['mismatches']))
+        row += "\n"
+        if self.class_column:
+            row = f"{pattern_name}\t{row}"
+        self._handle.write(row)
+        self.rows_written += 1
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._handle.flush()
+            self._last_flush = now
+
+    def flush(self):
+        """
+        Write buffered rows through to disk
+        """
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Flush and close the output file
+        """
+        if not self._handle.closed:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def open_result_writer(output_file, pattern_name="TpLRR", class_column=False, output_format="tsv", append=False,
+                       mismatches=False):
+    """
+    Open a result writer for an output format
+
+    Args:
+        output_file (str): Path to the output file
+        pattern_name (str): Pattern name used in the TSV length column header
+        class_column (bool): Write a leading Class column in TSV output;
+                             Parquet output always has a class column
+        output_format (str): "tsv" for one row per sequence, or "parquet" for
+                             one row per match with its coordinates
+        append (bool): Append to an existing TSV file; Parquet files cannot
+                       be appended to
+        mismatches (bool): Also write the mismatch count of each match, from
+                           hits of an approximate scan
+
+    Returns:
+        TSVResultWriter or ParquetResultWriter: Open writer
+    """
+    if output_format == "tsv":
+        return TSVResultWriter(output_file, pattern_name, class_column, append=append, mismatches=mismatches)
+    if output_format == "parquet":
+        if append:
+            raise ValueError("Parquet output cannot be appended to")
+        from parquet_writer import ParquetResultWriter
+        return ParquetResultWriter(output_file, mismatches=mismatches)
+    raise ValueError(f"Unknown output format: {output_format}")
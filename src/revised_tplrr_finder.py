@@ -11,76 +11,117 @@ import sys
 import re
 import argparse
 import logging
+from contextlib import nullcontext
 from datetime import datetime
-from Bio import SeqIO
+from pathlib import Path
+
+# Import from parent directory
+current_dir = Path(__file__).parent.absolute()
+sys.path.append(str(current_dir))
+from fasta_reader import READERS, iter_sequences
+from logging_setup import setup_logging
+from lrr_patterns import ENGINES, TPLRR_VARIANTS, compile_pattern
+from lrr_scanner import DEFAULT_PROGRESS_INTERVAL, RecordCounter, scan_sequences
+from result_writer import TSVResultWriter
+from stage_timer import StageTimer, timing_file
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("revised_tplrr_finder.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def find_lrr_patterns(file_name, log_interval=1000):
+# Log file written by main; workers log through the main process, see logging_setup
+LOG_FILE = "revised_tplrr_finder.log"
+
+# More specific pattern allowing for amino acid substitutions in conserved positions
+REVISED_PATTERN = TPLRR_VARIANTS["TpLRR-revised"]["pattern"]
+
+def scan_lrr_hits(file_name, log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes", include_empty=False,
+                  engine="re", batch_size=None, timer=None, max_mismatches=0):
     """
     Find TpLRR patterns in the specified file using a more specific pattern
-    that accounts for amino acid substitutions
+    that accounts for amino acid substitutions, yielding results as they are found
     
     Args:
         file_name (str): Path to the input FASTA file
-        log_interval (int): Interval for logging progress
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        include_empty (bool): Also yield sequences without matches
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        timer (StageTimer, optional): Timer for the stages of the scan
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+                              beyond the substitutions the pattern already allows
+                              (shift-add engine only)
         
-    Returns:
-        dict: Dictionary of TpLRR data by sequence ID
+    Yields:
+        tuple: (sequence ID, TpLRR data)
     """
-    # More specific pattern allowing for amino acid substitutions in conserved positions
-    lrr_pattern = re.compile("[CN].{2}[LVI].{2}[LVI].{1}[LVI].{3}[LVI].{2}[LVI].{3}AF")
-    lrr_data = {}
-    processed_count = 0
+    lrr_pattern = compile_pattern(REVISED_PATTERN, engine, max_mismatches)
+    patterns = [("TpLRR", lrr_pattern, 21)]  # 21 AA length for TpLRR
+    
+    def log_progress(processed_count):
+        logger.info(f"Processed {processed_count} sequences")
     
     logger.info(f"Searching for revised TpLRR patterns in {file_name}...")
     
+    source = timer.open_input(file_name) if timer else file_name
     try:
-        with open(file_name, 'rt') as f:
-            for record in SeqIO.parse(f, 'fasta'):
-                sequence = str(record.seq)
-                pattern_matches = lrr_pattern.findall(sequence)
-                
-                lrr_data[record.id] = {
-                    'count': len(pattern_matches),
-                    'total_lrr_length': len(pattern_matches) * 21,  # 21 AA length for TpLRR
-                    'total_length': len(sequence),
-                    'patterns': " ".join(pattern_matches)
-                }
-                
-                processed_count += 1
-                if processed_count % log_interval == 0:
-                    logger.info(f"Processed {processed_count} sequences")
+        # Count sequences with at least one pattern match
+        matching_sequences = 0
+        records = RecordCounter(iter_sequences(source, reader), log_interval, log_progress)
+        scan_input = records
+        if timer is not None:
+            scan_input, patterns = timer.instrument(records, patterns)
+        hits = scan_sequences(scan_input, patterns, include_empty, batch_size=batch_size)
+        if timer is not None:
+            hits = timer.iterate(hits, "scan")
+        
+        for _, record_id, data in hits:
+            if data['count'] > 0:
+                matching_sequences += 1
+            yield record_id, data
     
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         raise
     
-    logger.info(f"Completed search. Processed {processed_count} sequences.")
+    finally:
+        if source is not file_name:
+            source.close()
     
-    # Count sequences with at least one pattern match
-    matching_sequences = sum(1 for data in lrr_data.values() if data['count'] > 0)
+    logger.info(f"Completed search. Processed {records.count} sequences.")
     logger.info(f"Found {matching_sequences} sequences with TpLRR patterns.")
+
+def find_lrr_patterns(file_name, log_interval=DEFAULT_PROGRESS_INTERVAL, reader="bytes", engine="re",
+                      batch_size=None, max_mismatches=0):
+    """
+    Find TpLRR patterns in the specified file using a more specific pattern
+    that accounts for amino acid substitutions
     
-    return lrr_data
+    Args:
+        file_name (str): Path to the input FASTA file
+        log_interval (float): Seconds between progress messages
+        reader (str): FASTA reader to use, "bytes" or "biopython"
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Returns:
+        dict: Dictionary of TpLRR data by sequence ID
+    """
+    return dict(scan_lrr_hits(file_name, log_interval, reader, include_empty=True, engine=engine,
+                              batch_size=batch_size, max_mismatches=max_mismatches))
 
-def save_results(lrr_data, output_file=None):
+def write_results(hits, output_file=None, mismatches=False):
     """
-    Save TpLRR pattern results to a file
+    Stream TpLRR pattern results to a file as they are produced
     
     Args:
-        lrr_data (dict): Dictionary of TpLRR data by sequence ID
+        hits (iterable): Iterable of (sequence ID, TpLRR data) tuples
         output_file (str, optional): Path to the output file.
                                     Defaults to "TpLRR_data_{timestamp}.txt".
+        mismatches (bool): Also write the mismatch count of each match
+                                    
+    Returns:
+        str: Path to the output file
     """
     if output_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -89,11 +130,10 @@ def save_results(lrr_data, output_file=None):
     logger.info(f"Saving results to {output_file}...")
     
     try:
-        with open(output_file, 'w') as f:
-            f.write("Name\tCount\tTotal TpLRR Length\tTotal Sequence Length\tPatterns\n")
-            for name, data in lrr_data.items():
+        with TSVResultWriter(output_file, "TpLRR", mismatches=mismatches) as writer:
+            for name, data in hits:
                 if data['patterns']:  # Only include sequences with patterns
-                    f.write(f"{name}\t{data['count']}\t{data['total_lrr_length']}\t{data['total_length']}\t{data['patterns']}\n")
+                    writer.write(name, data)
         
         logger.info(f"Results saved to {output_file}")
         return output_file
@@ -102,21 +142,58 @@ def save_results(lrr_data, output_file=None):
         logger.error(f"Error saving results: {e}")
         raise
 
+def save_results(lrr_data, output_file=None):
+    """
+    Save TpLRR pattern results to a file
+    
+    Args:
+        lrr_data (dict): Dictionary of TpLRR data by sequence ID
+        output_file (str, optional): Path to the output file.
+                                    Defaults to "TpLRR_data_{timestamp}.txt".
+    """
+    return write_results(lrr_data.items(), output_file)
+
 def main():
     parser = argparse.ArgumentParser(description="Find revised TpLRR patterns in a FASTA file")
     parser.add_argument("input_file", help="Path to the input FASTA file")
     parser.add_argument("--output", help="Name of the output file")
-    parser.add_argument("--log-interval", type=int, default=1000, 
-                        help="Interval for logging progress")
+    parser.add_argument("--log-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="Seconds between progress messages")
+    parser.add_argument("--reader", default="bytes", choices=READERS,
+                        help="FASTA reader to use for parsing the input")
+    parser.add_argument("--engine", default="re", choices=ENGINES,
+                        help="Pattern matching engine")
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of records matched per regex call over a joined buffer")
+    parser.add_argument("--max-mismatches", type=int, default=0,
+                        help="Also report LRRs differing from the pattern at up to this many conserved positions, "
+                             "with a Mismatches column; implies --engine shift-add")
+    parser.add_argument("--timing", action="store_true",
+                        help="Time the stages of the scan and write a breakdown next to the output")
     
     args = parser.parse_args()
     
+    if args.max_mismatches < 0:
+        parser.error("--max-mismatches must not be negative")
+    if args.max_mismatches:
+        if args.engine == "numpy":
+            parser.error("--max-mismatches requires --engine shift-add")
+        args.engine = "shift-add"
+    
+    setup_logging(LOG_FILE)
+    
     try:
-        # Find TpLRR patterns
-        lrr_data = find_lrr_patterns(args.input_file, args.log_interval)
+        # Find TpLRR patterns and stream the results to the output file
+        timer = StageTimer() if args.timing else None
+        hits = scan_lrr_hits(args.input_file, args.log_interval, args.reader, engine=args.engine,
+                             batch_size=args.batch_size, timer=timer, max_mismatches=args.max_mismatches)
+        with timer.stage("output") if timer else nullcontext():
+            output_file = write_results(hits, args.output, mismatches=args.max_mismatches > 0)
         
-        # Save results
-        save_results(lrr_data, args.output)
+        if timer:
+            summary_file = timing_file(output_file)
+            summary = timer.write_summary(summary_file, input=args.input_file, engine=args.engine)
+            logger.info(f"Stage timing ({summary_file}): {timer.format_summary(summary)}")
         
         logger.info("Process completed successfully.")
     
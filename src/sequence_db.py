@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Sequence Database
+
+This module converts FASTA files into a compact binary container that is
+built once and then scanned any number of times without decompressing or
+parsing text. A container holds all residues as one contiguous blob, a
+uint64 offsets array and a table of sequence IDs, and is read through a
+memory map, so parallel workers share its pages through the OS page cache.
+
+Usage:
+    python sequence_db.py uniref50.fasta.gz            # writes uniref50.lrrdb
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+
+from fasta_reader import FASTA_EXTENSIONS, read_fasta
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# First bytes of every sequence database file
+DB_MAGIC = b"LRRSEQDB"
+
+# Bump when the layout changes
+DB_FORMAT_VERSION = 1
+
+# Extension of sequence database files
+DB_SUFFIX = ".lrrdb"
+
+# Bytes reserved at the start of the file for the magic and the JSON header
+HEADER_SIZE = 4096
+
+# Byte written after each sequence, so the residue blob is itself a
+# separator-joined batch that no LRR pattern position matches
+SEPARATOR = b"\n"
+
+# Number of records whose offsets are converted to Python integers at a time
+READ_BATCH_SIZE = 65536
+
+def is_sequence_db(file_name):
+    """
+    Check whether a path is a sequence database file
+
+    Args:
+        file_name (str): Path to check
+
+    Returns:
+        bool: True if the file starts with the database magic
+    """
+    if not isinstance(file_name, (str, os.PathLike)) or not os.path.isfile(file_name):
+        return False
+    with open(file_name, 'rb') as f:
+        return f.read(len(DB_MAGIC)) == DB_MAGIC
+
+def default_db_path(fasta_file):
+    """
+    Name the database built from a FASTA file, e.g. uniref50.fasta.gz -> uniref50.lrrdb
+    """
+    root = fasta_file[:-3] if fasta_file.endswith(".gz") else fasta_file
+    base, ext = os.path.splitext(root)
+    if ext in FASTA_EXTENSIONS:
+        root = base
+    return f"{root}{DB_SUFFIX}"
+
+def _pad(f, alignment=8):
+    """
+    Pad a file with zero bytes up to the next multiple of alignment
+    """
+    f.write(b"\0" * (-f.tell() % alignment))
+
+def build_sequence_db(fasta_file, db_path=None):
+    """
+    Convert a FASTA file into a sequence database
+
+    The residues are streamed straight into the output file, and the IDs and
+    offsets into temporary side files that are appended at the end, so memory
+    use does not grow with the input. The database is written under a
+    temporary name and renamed once complete.
+
+    Args:
+        fasta_file (str): Path to the FASTA file (plain or gzipped)
+        db_path (str, optional): Path of the database. Defaults to the FASTA
+                                 file name with a .lrrdb extension.
+
+    Returns:
+        str: Path to the database
+    """
+    db_path = db_path or default_db_path(fasta_file)
+    partial_file = f"{db_path}.partial"
+    logger.info(f"Building sequence database {db_path} from {fasta_file}...")
+
+    side_files = {name: f"{partial_file}.{name}" for name in ("ids", "offsets", "id_offsets")}
+    n_sequences = 0
+
+    try:
+        with open(partial_file, 'wb') as f, open(side_files["ids"], 'wb') as ids_file, \
+                open(side_files["offsets"], 'wb') as offsets_file, \
+                open(side_files["id_offsets"], 'wb') as id_offsets_file:
+            f.write(b"\0" * HEADER_SIZE)
+            position = 0
+            id_position = 0
+            offsets = array('Q', [0])
+            id_offsets = array('Q', [0])
+            for record_id, sequence in read_fasta(fasta_file):
+                f.write(sequence)
+                f.write(SEPARATOR)
+                position += len(sequence) + len(SEPARATOR)
+                offsets.append(position)
+                record_id = record_id.encode()
+                ids_file.write(record_id)
+                id_position += len(record_id)
+                id_offsets.append(id_position)
+                n_sequences += 1
+
+                if len(offsets) >= READ_BATCH_SIZE:
+                    offsets.tofile(offsets_file)
+                    id_offsets.tofile(id_offsets_file)
+                    offsets = array('Q')
+                    id_offsets = array('Q')
+            offsets.tofile(offsets_file)
+            id_offsets.tofile(id_offsets_file)
+
+        # Sections after the residues, each aligned for memory mapping
+        sections = {"residues": [HEADER_SIZE, position]}
+        with open(partial_file, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            for name, side_file in side_files.items():
+                _pad(f)
+                sections[name] = [f.tell(), os.path.getsize(side_file)]
+                with open(side_file, 'rb') as src:
+                    shutil.copyfileobj(src, f)
+
+            header = json.dumps({
+                "format_version": DB_FORMAT_VERSION,
+                "sequences": n_sequences,
+                "source": os.path.basename(fasta_file),
+                "sections": sections
+            }).encode()
+            if len(DB_MAGIC) + 4 + len(header) > HEADER_SIZE:
+                raise ValueError("Sequence database header too large")
+            f.seek(0)
+            f.write(DB_MAGIC + struct.pack("<I", len(header)) + header)
+
+        os.replace(partial_file, db_path)
+    except Exception:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
+    finally:
+        for side_file in side_files.values():
+            if os.path.exists(side_file):
+                os.remove(side_file)
+
+    logger.info(f"Wrote {n_sequences} sequences ({position} bytes of residues) to {db_path}")
+    return db_path
+
+class SequenceDB:
+    """
+    Read-only, memory-mapped view of a sequence database
+
+    Args:
+        db_path (str): Path to the database
+    """
+
+    def __init__(self, db_path):
+        self.path = db_path
+        with open(db_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(DB_MAGIC)] != DB_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a sequence database: {db_path}")
+        header_start = len(DB_MAGIC) + 4
+        (header_length,) = struct.unpack("<I", self._mmap[len(DB_MAGIC):header_start])
+        self.header = json.loads(self._mmap[header_start:header_start + header_length])
+        if self.header["format_version"] != DB_FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"Unsupported sequence database version {self.header['format_version']}: {db_path}")
+
+        import numpy as np
+
+        sections = self.header["sections"]
+        n_sequences = self.header["sequences"]
+        # Views over the mapped file; nothing is copied
+        residues_start, residues_size = sections["residues"]
+        self.residues = memoryview(self._mmap)[residues_start:residues_start + residues_size]
+        self.offsets = np.frombuffer(self._mmap, dtype=np.uint64, count=n_sequences + 1,
+                                     offset=sections["offsets"][0])
+        self.id_offsets = np.frombuffer(self._mmap, dtype=np.uint64, count=n_sequences + 1,
+                                        offset=sections["id_offsets"][0])
+        self._ids_start = sections["ids"][0]
+        self._residues_start = residues_start
+
+    def __len__(self):
+        return self.header["sequences"]
+
+    def records(self, start=0, stop=None):
+        """
+        Stream (id, sequence) pairs for a range of records
+
+        Each sequence is a single copy out of the mapped residue blob, with no
+        decompression or line-break removal.
+
+        Args:
+            start (int): Index of the first record
+            stop (int, optional): Index one past the last record. Defaults to the end.
+
+        Yields:
+            tuple: (sequence ID, sequence bytes)
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        data = self._mmap
+        ids_start = self._ids_start
+        residues_start = self._residues_start
+        separator_length = len(SEPARATOR)
+
+        for batch_start in range(start, stop, READ_BATCH_SIZE):
+            batch_stop = min(batch_start + READ_BATCH_SIZE, stop)
+            offsets = self.offsets[batch_start:batch_stop + 1].tolist()
+            id_offsets = self.id_offsets[batch_start:batch_stop + 1].tolist()
+            for i in range(batch_stop - batch_start):
+                record_id = data[ids_start + id_offsets[i]:ids_start + id_offsets[i + 1]].decode()
+                sequence = data[residues_start + offsets[i]:residues_start + offsets[i + 1] - separator_length]
+                yield record_id, sequence
+
+    def record(self, index):
+        """
+        Read a single record
+
+        Args:
+            index (int): Index of the record
+
+        Returns:
+            tuple: (sequence ID, sequence bytes)
+        """
+        start, stop = self.offsets[index:index + 2].tolist()
+        id_start, id_stop = self.id_offsets[index:index + 2].tolist()
+        record_id = self._mmap[self._ids_start + id_start:self._ids_start + id_stop].decode()
+        sequence = self._mmap[self._residues_start + start:self._residues_start + stop - len(SEPARATOR)]
+        return record_id, sequence
+
+    def chunks(self, n_chunks):
+        """
+        Split the records into ranges holding similar numbers of residues
+
+        Args:
+            n_chunks (int): Desired number of chunks
+
+        Returns:
+            list: List of (start, stop) record indices
+        """
+        import numpy as np
+
+        targets = np.linspace(0, int(self.offsets[-1]), n_chunks + 1)[1:-1]
+        boundaries = np.searchsorted(self.offsets, targets).tolist()
+        boundaries = sorted(set([0] + boundaries + [len(self)]))
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def close(self):
+        """
+        Release the memory map
+        """
+        # Views must be dropped before the map can be closed
+        self.residues.release()
+        self.offsets = self.id_offsets = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_sequence_db(db_path, start=0, stop=None):
+    """
+    Stream (id, sequence) pairs from a sequence database
+
+    Args:
+        db_path (str): Path to the database
+        start (int): Index of the first record
+        stop (int, optional): Index one past the last record
+
+    Yields:
+        tuple: (sequence ID, sequence bytes)
+    """
+    with SequenceDB(db_path) as db:
+        yield from db.records(start, stop)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert FASTA files into memory-mapped sequence databases")
+    parser.add_argument("fasta_files", nargs="+", help="FASTA files (plain or gzipped) to convert")
+    parser.add_argument("--output", help="Path of the database (only with a single input file)")
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if args.output and len(args.fasta_files) > 1:
+        parser.error("--output can only be used with a single input file")
+
+    try:
+        for fasta_file in args.fasta_files:
+            build_sequence_db(fasta_file, args.output)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Sequence Store
+
+This module keeps the match results of every sequence that has been scanned
+in a persistent SQLite database, keyed by an MD5 digest of the residues and
+the pattern version. Successive database releases share most of their
+sequences, so a rescan only has to run the patterns on sequences that have
+not been seen before; the results for all other sequences are read back from
+the store.
+"""
+
+import hashlib
+import json
+import sqlite3
+import zlib
+from itertools import islice
+
+from lrr_scanner import match_starts, mismatch_counter, scan_sequences
+
+# Number of records looked up in the store at a time
+STORE_BATCH_SIZE = 4096
+
+# Maximum number of digests bound to a single query
+MAX_QUERY_DIGESTS = 500
+
+# Seconds to wait for another process holding the write lock
+DEFAULT_TIMEOUT = 300.0
+
+# Maximum number of sequences kept by an in-memory store (about 100 bytes each)
+DEFAULT_MEMORY_STORE_ENTRIES = 20000000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pattern_sets (
+    id INTEGER PRIMARY KEY,
+    signature TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS matches (
+    pattern_set_id INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    patterns TEXT NOT NULL,
+    PRIMARY KEY (pattern_set_id, digest)
+) WITHOUT ROWID;
+"""
+
+# Separates the matches of the patterns in a set; matched residues never contain it
+FIELD_SEPARATOR = "\t"
+
+def sequence_digest(sequence):
+    """
+    Compute the digest identifying a sequence in the store
+
+    Args:
+        sequence (bytes): Sequence residues
+
+    Returns:
+        bytes: MD5 digest of the residues
+    """
+    return hashlib.md5(sequence).digest()
+
+def memory_digest(sequence):
+    """
+    Compute a cheap 96-bit key identifying a sequence within one process
+
+    Combines Python's salted 64-bit bytes hash with a CRC-32, which together
+    cost less than half as much as MD5. The salt differs between processes,
+    so these keys must never be persisted.
+
+    Args:
+        sequence (bytes): Sequence residues
+
+    Returns:
+        int: Sequence key
+    """
+    return hash(sequence) << 32 | zlib.crc32(sequence)
+
+class SequenceStore:
+    """
+    Persistent map from (pattern set, sequence digest) to match results
+
+    A pattern set is the ordered list of pattern names, regexes and lengths
+    searched together, so editing a pattern starts a fresh set of results
+    while older versions stay available. One row holds the results of every
+    pattern in the set, which keeps lookups to a single row per sequence.
+
+    Args:
+        path (str): Path to the SQLite database, created if it does not exist
+        timeout (float): Seconds to wait for a lock held by another process
+    """
+
+    digest = staticmethod(sequence_digest)
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        # WAL lets parallel workers read while one of them writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def pattern_set_id(self, patterns):
+        """
+        Get the ID of a pattern set, registering it if it is new
+
+        Args:
+            patterns (list): List of (pattern_name, pattern_str, pattern_length) tuples
+
+        Returns:
+            int: Pattern set ID
+        """
+        signature = json.dumps([list(pattern) for pattern in patterns])
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO pattern_sets (signature) VALUES (?)", (signature,))
+        row = self.connection.execute("SELECT id FROM pattern_sets WHERE signature = ?", (signature,)).fetchone()
+        return row[0]
+
+    def lookup(self, pattern_set_id, digests):
+        """
+        Read the stored results for a set of sequences
+
+        Args:
+            pattern_set_id (int): Pattern set ID
+            digests (iterable): Sequence digests
+
+        Returns:
+            dict: Stored results by digest, for the digests in the store
+        """
+        results = {}
+        digests = list(digests)
+        for i in range(0, len(digests), MAX_QUERY_DIGESTS):
+            chunk = digests[i:i + MAX_QUERY_DIGESTS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT digest, patterns FROM matches WHERE pattern_set_id = ? AND digest IN ({placeholders})",
+                [pattern_set_id, *chunk]
+            )
+            results.update(rows)
+        return results
+
+    def add(self, pattern_set_id, results):
+        """
+        Store the results for a set of sequences
+
+        Args:
+            pattern_set_id (int): Pattern set ID
+            results (dict): Results by digest, as returned by lookup
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO matches (pattern_set_id, digest, patterns) VALUES (?, ?, ?)",
+                ((pattern_set_id, digest, patterns) for digest, patterns in results.items())
+            )
+
+    def close(self):
+        """
+        Close the database connection
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CachedSequenceStore(SequenceStore):
+    """
+    SequenceStore that also keeps the results it reads or writes in memory
+
+    Meant for a worker process that scans many files against a store shared
+    with other workers: a sequence repeated within the worker's own files is
+    answered without a query, while one first scanned by another worker is
+    still read from the store instead of being scanned again.
+
+    Args:
+        path (str): Path to the SQLite database, created if it does not exist
+        timeout (float): Seconds to wait for a lock held by another process
+        max_entries (int): Stop caching results once this many sequences
+                           are held in memory, to bound memory use
+    """
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT, max_entries=DEFAULT_MEMORY_STORE_ENTRIES):
+        super().__init__(path, timeout)
+        self.max_entries = max_entries
+        self._cached = {}
+        self._cached_count = 0
+
+    def lookup(self, pattern_set_id, digests):
+        """
+        Read the stored results for a set of sequences, querying only those not in memory
+        """
+        cached = self._cached.setdefault(pattern_set_id, {})
+        results = {}
+        missing = []
+        for digest in digests:
+            patterns = cached.get(digest)
+            if patterns is None:
+                missing.append(digest)
+            else:
+                results[digest] = patterns
+        if missing:
+            stored = super().lookup(pattern_set_id, missing)
+            self._remember(pattern_set_id, stored)
+            results.update(stored)
+        return results
+
+    def add(self, pattern_set_id, results):
+        """
+        Store the results for a set of sequences
+        """
+        super().add(pattern_set_id, results)
+        self._remember(pattern_set_id, results)
+
+    def _remember(self, pattern_set_id, results):
+        if self._cached_count < self.max_entries:
+            cached = self._cached.setdefault(pattern_set_id, {})
+            self._cached_count += len(results.keys() - cached.keys())
+            cached.update(results)
+
+class MemorySequenceStore:
+    """
+    In-memory counterpart of SequenceStore for deduplicating within one process
+
+    Lookups cost a dictionary access instead of a database query, which
+    makes deduplication worthwhile even for a single cheap pattern.
+
+    Args:
+        max_entries (int): Stop adding results once this many sequences
+                           are stored, to bound memory use
+    """
+
+    digest = staticmethod(memory_digest)
+
+    def __init__(self, max_entries=DEFAULT_MEMORY_STORE_ENTRIES):
+        self.max_entries = max_entries
+        self._pattern_sets = {}
+        self._results = []
+
+    def pattern_set_id(self, patterns):
+        """
+        Get the ID of a pattern set, registering it if it is new
+        """
+        signature = tuple(tuple(pattern) for pattern in patterns)
+        if signature not in self._pattern_sets:
+            self._pattern_sets[signature] = len(self._results)
+            self._results.append({})
+        return self._pattern_sets[signature]
+
+    def lookup(self, pattern_set_id, digests):
+        """
+        Read the stored results for a set of sequences
+        """
+        results = self._results[pattern_set_id]
+        return {digest: results[digest] for digest in digests if digest in results}
+
+    def add(self, pattern_set_id, results):
+        """
+        Store the results for a set of sequences, unless the store is full
+        """
+        stored = self._results[pattern_set_id]
+        if sum(len(pattern_results) for pattern_results in self._results) < self.max_entries:
+            stored.update(results)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _pattern_signature(pattern_name, pattern, pattern_length):
+    """
+    Describe a compiled pattern for SequenceStore.pattern_set_id
+
+    Approximate matchers find more than the same pattern matched exactly, so
+    their mismatch allowance is part of the signature; exact patterns keep
+    the signature of stores written before approximate matching existed.
+    """
+    signature = (pattern_name, pattern.pattern.decode(), pattern_length)
+    max_mismatches = getattr(pattern, "max_mismatches", 0)
+    return signature + (max_mismatches,) if max_mismatches else signature
+
+def scan_sequences_incremental(records, patterns, store, include_empty=False, positions=False, **scan_options):
+    """
+    Match every pattern against each sequence, reusing results from a store
+
+    Only sequences missing from the store are scanned, and their results are
+    added to it. Hits are yielded in the same order and form as scan_sequences.
+
+    Args:
+        records (iterable): Iterable of (sequence ID, sequence bytes) tuples
+        patterns (list): List of (pattern_name, compiled_pattern, pattern_length) tuples
+        store (SequenceStore or MemorySequenceStore): Store of earlier results
+        include_empty (bool): Also yield entries for sequences without matches
+        positions (bool): Also record the offset of each match under 'starts'
+        **scan_options: Options passed on to scan_sequences for new sequences
+
+    Yields:
+        tuple: (pattern_name, sequence ID, LRR data)
+    """
+    pattern_set_id = store.pattern_set_id([_pattern_signature(*pattern) for pattern in patterns])
+    mismatch_counters = [mismatch_counter(pattern) for _, pattern, _ in patterns]
+    pattern_index = {pattern_name: i for i, (pattern_name, _, _) in enumerate(patterns)}
+    # Most sequences match no pattern, so they are stored as an empty string
+    no_matches = [""] * len(patterns)
+    compute_digest = store.digest
+
+    records = iter(records)
+    while True:
+        batch = list(islice(records, STORE_BATCH_SIZE))
+        if not batch:
+            break
+        digests = [compute_digest(sequence) for _, sequence in batch]
+        known = store.lookup(pattern_set_id, set(digests))
+
+        # Scan each new sequence once, even if it occurs several times in the batch
+        new_sequences = {}
+        for (_, sequence), digest in zip(batch, digests):
+            if digest not in known and digest not in new_sequences:
+                new_sequences[digest] = sequence
+
+        if new_sequences:
+            scanned = {}
+            for pattern_name, digest, data in scan_sequences(new_sequences.items(), patterns, **scan_options):
+                scanned.setdefault(digest, [""] * len(patterns))[pattern_index[pattern_name]] = data['patterns']
+            new_results = {
+                digest: FIELD_SEPARATOR.join(scanned[digest]) if digest in scanned else ""
+                for digest in new_sequences
+            }
+            store.add(pattern_set_id, new_results)
+            known.update(new_results)
+
+        for (record_id, sequence), digest in zip(batch, digests):
+            results = known[digest]
+            if not results and not include_empty:
+                continue
+            fields = results.split(FIELD_SEPARATOR) if results else no_matches
+            for (pattern_name, _, pattern_length), count_mismatches, matches in zip(
+                patterns, mismatch_counters, fields
+            ):
+                # Matched residues never contain spaces
+                count = len(matches.split(" ")) if matches else 0
+                if count or include_empty:
+                    entry = {
+                        'count': count,
+                        'total_lrr_length': count * pattern_length,
+                        'total_length': len(sequence),
+                        'patterns': matches
+                    }
+                    if positions:
+                        entry['starts'] = match_starts(sequence, matches.encode().split(b" ") if count else [])
+                    if count_mismatches is not None:
+                        entry['mismatches'] = [
+                            count_mismatches(match) for match in (matches.encode().split(b" ") if count else [])
+                        ]
+                    yield pattern_name, record_id, entry
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Shift-Add Matcher
+
+This module provides an approximate matching engine for the fixed-length,
+position-specific LRR patterns, based on the Shift-Add algorithm of
+Baeza-Yates and Gonnet. It finds every window that differs from a pattern at
+no more than k of its conserved positions, in time linear in the length of
+the input whatever k is.
+
+Shift-Add keeps one small mismatch counter per pattern position packed into
+a machine word, and advances all of them with one shift and one add per
+residue. Here the roles are transposed so that the loop runs over the
+pattern instead of the residues: the batch of sequences is the word, with one
+8-bit counter per window start, and each conserved position adds its
+mismatch indicators, shifted by its offset, to every counter at once. Python
+integers of arbitrary size make each step a single operation run in C, and k
+only enters in the final test of the counters.
+"""
+
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+from lrr_patterns import parse_pattern
+
+# Byte placed between sequences in a batch
+SEPARATOR = b"\n"
+
+# Largest mismatch count an 8-bit counter holds without carrying into the next
+MAX_COUNTER = 255
+
+class ShiftAddPattern:
+    """
+    Approximate matcher for a fixed-length LRR pattern
+
+    Wildcard positions never mismatch. With max_mismatches=0 it produces
+    the same non-overlapping, leftmost-first matches as re.findall; with
+    more, a window is matched if it differs from the pattern at no more
+    than max_mismatches positions, and matches are still selected leftmost
+    first without overlaps.
+
+    Args:
+        pattern_str (str or bytes): Regex pattern string in the fixed-length
+                                    subset understood by parse_pattern
+        max_mismatches (int): Largest number of mismatching positions allowed
+    """
+
+    def __init__(self, pattern_str, max_mismatches=0):
+        if isinstance(pattern_str, str):
+            pattern_str = pattern_str.encode()
+        if max_mismatches < 0:
+            raise ValueError(f"max_mismatches must not be negative: {max_mismatches}")
+        self.pattern = pattern_str
+        self.max_mismatches = max_mismatches
+        self.positions = parse_pattern(pattern_str)
+        self.length = len(self.positions)
+
+        # One translation table per conserved position, mapping each byte to
+        # 1 if it mismatches the position and 0 if it fits
+        self.mismatch_tables = []
+        for offset, residues in enumerate(self.positions):
+            if residues is None:
+                continue
+            table = bytearray([1]) * 256
+            for residue in residues:
+                table[ord(residue)] = 0
+            self.mismatch_tables.append((offset, bytes(table)))
+        if len(self.mismatch_tables) > MAX_COUNTER:
+            raise ValueError(f"Pattern has more than {MAX_COUNTER} conserved positions: {pattern_str}")
+
+        # Counters holding at most max_mismatches
+        self._accepted = re.compile(b"[\\x00-" + re.escape(bytes([min(max_mismatches, MAX_COUNTER)])) + b"]")
+
+    def _window_mismatches(self, buffer):
+        """
+        Count the mismatches of the window starting at every offset of a buffer
+
+        Windows running past the end of the buffer only count the positions
+        inside it.
+
+        Args:
+            buffer (bytes): Sequence residues
+
+        Returns:
+            bytes: Mismatch count of each window, one byte per offset
+        """
+        counters = 0
+        for offset, table in self.mismatch_tables:
+            # Dropping the first offset bytes shifts each indicator onto the
+            # counter of the window it belongs to
+            counters += int.from_bytes(buffer[offset:].translate(table), "little")
+        return counters.to_bytes(len(buffer), "little")
+
+    def findall(self, sequence):
+        """
+        Find all non-overlapping approximate matches in one sequence
+
+        Args:
+            sequence (bytes): Sequence residues
+
+        Returns:
+            list: List of matched byte strings
+        """
+        return self.findall_indexed([sequence]).get(0, [])
+
+    def findall_indexed(self, sequences):
+        """
+        Find all non-overlapping approximate matches in a batch of sequences, keyed by position
+
+        Args:
+            sequences (list): List of sequences as bytes
+
+        Returns:
+            dict: Lists of matched byte strings by index of the sequence in
+                  the batch; sequences without matches are left out
+        """
+        results = {}
+        if not sequences:
+            return results
+
+        buffer = SEPARATOR.join(sequences)
+        # Offset of each sequence in the joined buffer, and one past its end
+        starts = [0]
+        starts.extend(accumulate(len(sequence) + 1 for sequence in sequences))
+
+        length = self.length
+        next_sequence_start = 0
+        for match in self._accepted.finditer(self._window_mismatches(buffer)):
+            window_start = match.start()
+            if window_start >= next_sequence_start:
+                index = bisect_right(starts, window_start) - 1
+                sequence = sequences[index]
+                next_sequence_start = starts[index + 1]
+                next_free = 0
+            offset = window_start - starts[index]
+            # Drop windows running past the end of their sequence, and those
+            # overlapping an earlier match
+            if offset < next_free or offset + length > len(sequence):
+                continue
+            results.setdefault(index, []).append(sequence[offset:offset + length])
+            next_free = offset + length
+
+        return results
+
+    def count_mismatches(self, match):
+        """
+        Count the positions at which a matched window differs from the pattern
+
+        Args:
+            match (bytes): Matched residues
+
+        Returns:
+            int: Number of mismatching positions
+        """
+        return sum(
+            1 for residue, residues in zip(match.decode(), self.positions)
+            if residues is not None and residue not in residues
+        )
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Stage Timer
+
+This module measures where the time of a run goes: reading and
+decompressing the input, parsing FASTA records, regex matching, building
+result entries and writing output. Timing is opt-in; when it is off none of
+the wrappers below are installed, so the scan runs exactly as before.
+
+The stages are nested (a hit is only produced after its record has been
+read and matched), so each wrapper times one layer inclusively and the
+exclusive time of every stage is derived by subtraction. A timed call costs
+two wall-clock and two thread CPU-clock reads, so per-record matching calls
+are only timed on a sample, while batch calls are always timed. The cost of
+the wrappers themselves is measured once per process and reported as
+instrumentation overhead, instead of inflating the stage around them.
+"""
+
+import io
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from fasta_reader import open_fasta
+from sequence_db import is_sequence_db
+
+# Exclusive stages reported in the summary, in pipeline order
+STAGES = ("decompress", "parse", "match", "build", "write")
+
+# One in this many per-record matching calls of a pattern is timed, and its
+# time counted for the whole interval; the others are only counted
+MATCH_SAMPLE_INTERVAL = 16
+
+# Number of calls timed to measure the cost of each wrapper
+CALIBRATION_CALLS = 5000
+
+# Per-call wall and CPU cost of each wrapper, measured once per process
+_wrapper_costs = None
+
+def _clock():
+    """
+    Read the wall clock and the CPU time of the calling thread
+    """
+    return time.perf_counter(), time.thread_time()
+
+def _noop(*args):
+    return ()
+
+def wrapper_costs():
+    """
+    Measure what each timing wrapper adds to the call it wraps
+
+    Returns:
+        dict: (wall seconds, CPU seconds) per call for "item" (an item
+              passed through iterate), "sampled" (a per-record matching call
+              that is not timed) and "timed" (a timed matching call)
+    """
+    global _wrapper_costs
+    if _wrapper_costs is not None:
+        return _wrapper_costs
+
+    class NoopPattern:
+        findall = staticmethod(_noop)
+
+    probe = StageTimer(track_overhead=False)
+    untimed = TimedPattern(NoopPattern(), probe, sample_interval=CALIBRATION_CALLS + 1).findall
+    timed = TimedPattern(NoopPattern(), probe, sample_interval=1).findall
+
+    def cost(function):
+        start_wall, start_cpu = _clock()
+        for _ in range(CALIBRATION_CALLS):
+            function(None)
+        end_wall, end_cpu = _clock()
+        return end_wall - start_wall, end_cpu - start_cpu
+
+    def item_cost(iterable):
+        start_wall, start_cpu = _clock()
+        for _ in iterable:
+            pass
+        end_wall, end_cpu = _clock()
+        return end_wall - start_wall, end_cpu - start_cpu
+
+    def per_call(measured, baseline):
+        return tuple(max(0.0, (m - b) / CALIBRATION_CALLS) for m, b in zip(measured, baseline))
+
+    baseline = cost(_noop)
+    _wrapper_costs = {
+        "item": per_call(item_cost(probe.iterate(range(CALIBRATION_CALLS), "input")),
+                         item_cost(range(CALIBRATION_CALLS))),
+        "sampled": per_call(cost(untimed), baseline),
+        "timed": per_call(cost(timed), baseline)
+    }
+    return _wrapper_costs
+
+class StageTimer:
+    """
+    Accumulates wall and CPU time per pipeline stage
+
+    Measurements are taken at the layers of the pipeline:
+
+    - decompress: reads from the input file, including decompression
+    - input: pulling records from the FASTA reader (decompress + parse)
+    - match: calls into the matching engine
+    - scan: pulling hits from the scanner (input + match + build)
+    - staging: decompressing the input for parallel workers
+    - wait: waiting for hits from parallel workers
+    - output: writing the results, including pulling the hits
+    - instrumentation: the estimated cost of the wrappers themselves,
+      which would otherwise be counted as build time
+
+    Timers of worker processes can be merged into the timer of the main
+    process with merge; the caller sets workers to the size of the pool.
+
+    Args:
+        track_overhead (bool): Account for the cost of the wrappers; only
+                               the timer used to measure that cost turns it off
+    """
+
+    def __init__(self, track_overhead=True):
+        self.track_overhead = track_overhead
+        if track_overhead:
+            # Measured before the clock starts, so no stage includes it
+            wrapper_costs()
+        self.wall = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.workers = 0
+        self._start_wall = time.perf_counter()
+        self._start_times = os.times()
+
+    def add(self, stage, wall, cpu, count=1):
+        """
+        Add a measurement to a stage
+
+        Args:
+            stage (str): Name of the stage
+            wall (float): Wall time in seconds
+            cpu (float): CPU time in seconds
+            count (int): Number of items or bytes processed
+        """
+        self.wall[stage] += wall
+        self.cpu[stage] += cpu
+        self.counts[stage] += count
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a block of code as a stage
+        """
+        wall, cpu = _clock()
+        try:
+            yield
+        finally:
+            end_wall, end_cpu = _clock()
+            self.add(name, end_wall - wall, end_cpu - cpu)
+
+    def add_overhead(self, kind, calls):
+        """
+        Account for the cost of a number of wrapper calls
+
+        Args:
+            kind (str): Kind of wrapper call, a key of wrapper_costs
+            calls (int): Number of calls
+        """
+        if not self.track_overhead:
+            return
+        wall, cpu = wrapper_costs()[kind]
+        self.add("instrumentation", wall * calls, cpu * calls, calls)
+
+    def iterate(self, iterable, stage):
+        """
+        Pass items through while timing how long each takes to produce
+
+        Time spent by the caller between items is not counted. The return
+        value of a wrapped generator is passed on.
+
+        Args:
+            iterable (iterable): Items to pass through
+            stage (str): Name of the stage
+
+        Yields:
+            The items of iterable
+        """
+        iterator = iter(iterable)
+        wall = cpu = 0.0
+        count = 0
+        try:
+            while True:
+                start_wall, start_cpu = _clock()
+                try:
+                    item = next(iterator)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    end_wall, end_cpu = _clock()
+                    wall += end_wall - start_wall
+                    cpu += end_cpu - start_cpu
+                count += 1
+                yield item
+        finally:
+            self.add(stage, wall, cpu, count)
+            self.add_overhead("item", count)
+
+    def open_input(self, source):
+        """
+        Open an input so that its reads are timed as the decompress stage
+
+        Sequence databases need no decompression and are returned unchanged.
+
+        Args:
+            source (str or file): Path to a FASTA file or sequence database, or a binary stream
+
+        Returns:
+            str or TimedReader: Input to pass to iter_sequences; a TimedReader
+                                should be closed after use, which leaves a
+                                caller's stream open
+        """
+        if isinstance(source, (str, os.PathLike)):
+            if is_sequence_db(source):
+                return source
+            return TimedReader(open_fasta(source), self)
+        return TimedReader(source, self, close_handle=False)
+
+    def instrument(self, records, patterns):
+        """
+        Time a scan's record reading and pattern matching
+
+        Args:
+            records (iterable): Iterable of (sequence ID, sequence bytes) tuples
+            patterns (list): List of (pattern_name, compiled_pattern, pattern_length) tuples
+
+        Returns:
+            tuple: (timed records, timed patterns) to pass to the scanner
+        """
+        return self.iterate(records, "input"), self.wrap_patterns(patterns)
+
+    def wrap_patterns(self, patterns):
+        """
+        Time the matching engine calls of compiled patterns
+
+        Args:
+            patterns (list): List of (pattern_name, compiled_pattern, pattern_length) tuples
+
+        Returns:
+            list: The same list with each compiled pattern wrapped in a TimedPattern
+        """
+        return [(name, TimedPattern(pattern, self), length) for name, pattern, length in patterns]
+
+    def raw(self):
+        """
+        Get the measurements as plain dictionaries, e.g. to return them from a worker
+        """
+        return {"wall": dict(self.wall), "cpu": dict(self.cpu), "counts": dict(self.counts)}
+
+    def merge(self, raw):
+        """
+        Add the measurements of a worker process
+
+        Args:
+            raw (dict): Measurements from StageTimer.raw
+        """
+        for stage, wall in raw["wall"].items():
+            self.add(stage, wall, raw["cpu"][stage], raw["counts"][stage])
+
+    def summary(self, **info):
+        """
+        Build the per-stage breakdown of the run so far
+
+        With merged worker timers, the decompress, parse, match and build
+        stages are summed over the workers and may exceed the elapsed time.
+
+        Args:
+            **info: Extra fields to include, e.g. input and output file names
+
+        Returns:
+            dict: Summary with total wall and CPU time, per-stage wall and CPU
+                  time, and throughput
+        """
+        total_wall = time.perf_counter() - self._start_wall
+        end_times = os.times()
+        # Includes other threads and reaped worker processes
+        total_cpu = sum(end - start for end, start in zip(end_times[:4], self._start_times[:4]))
+
+        def exclusive(clock):
+            # Time the main process spent producing hits rather than writing them
+            local_scan = clock["staging"] + clock["wait"] if self.workers else clock["scan"]
+            return {
+                "decompress": clock["decompress"],
+                "parse": clock["input"] - clock["decompress"],
+                "match": clock["match"],
+                "build": max(0.0, clock["scan"] - clock["input"] - clock["match"] - clock["instrumentation"]),
+                "write": clock["output"] - local_scan
+            }
+
+        wall = exclusive(self.wall)
+        cpu = exclusive(self.cpu)
+        sequences = self.counts["input"]
+        text_bytes = self.counts["decompress"]
+
+        summary = dict(info)
+        summary.update({
+            "total_wall_seconds": total_wall,
+            "total_cpu_seconds": total_cpu,
+            "workers": self.workers,
+            "sequences": sequences,
+            "hits": self.counts["scan"],
+            "sequences_per_sec": sequences / total_wall if total_wall else None,
+            "input_mb_per_sec": text_bytes / 1e6 / total_wall if total_wall and text_bytes else None,
+            "stages": {
+                stage: {
+                    "wall_seconds": wall[stage],
+                    "cpu_seconds": cpu[stage],
+                    "fraction_of_wall": wall[stage] / total_wall if total_wall else None,
+                    # Well below 1 means the stage mostly waits, e.g. on disk or network
+                    "cpu_utilization": cpu[stage] / wall[stage] if wall[stage] > 0 else None
+                }
+                for stage in STAGES
+            }
+        })
+        summary["instrumentation_wall_seconds"] = self.wall["instrumentation"]
+        summary["instrumentation_cpu_seconds"] = self.cpu["instrumentation"]
+        if self.wall.get("staging"):
+            summary["staging_wall_seconds"] = self.wall["staging"]
+        if not self.workers:
+            summary["other_wall_seconds"] = total_wall - sum(wall.values()) - self.wall["instrumentation"]
+        return summary
+
+    def write_summary(self, output_file, **info):
+        """
+        Write the summary as JSON
+
+        Args:
+            output_file (str): Path to the JSON file
+            **info: Extra fields to include
+
+        Returns:
+            dict: The summary
+        """
+        summary = self.summary(**info)
+        with open(output_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def format_summary(self, summary):
+        """
+        Format a summary as a one-line breakdown for the log
+        """
+        stages = ", ".join(
+            f"{stage} {values['wall_seconds']:.2f}s" for stage, values in summary["stages"].items()
+        )
+        return (
+            f"{summary['total_wall_seconds']:.2f}s total: {stages} "
+            f"(timing overhead {summary['instrumentation_wall_seconds']:.2f}s)"
+        )
+
+class TimedPattern:
+    """
+    Compiled pattern whose matching calls are timed as the match stage
+
+    The batch methods finditer and findall_indexed are timed on every call.
+    The per-record findall is timed on one call in sample_interval, and that
+    call's time is counted for the whole interval. All other attributes are
+    passed through, so the scanner treats it like the pattern it wraps.
+
+    Args:
+        pattern (object): Compiled pattern
+        timer (StageTimer): Timer to add measurements to
+        sample_interval (int): Time one in this many findall calls
+    """
+
+    def __init__(self, pattern, timer, sample_interval=MATCH_SAMPLE_INTERVAL):
+        self._pattern = pattern
+        self._timer = timer
+        # Bound once, so that a call costs no attribute lookup or closure
+        if hasattr(pattern, "findall"):
+            self.findall = self._sampled(pattern.findall, sample_interval)
+        if hasattr(pattern, "finditer"):
+            self.finditer = self._timed(pattern.finditer, consume=True)
+        if hasattr(pattern, "findall_indexed"):
+            self.findall_indexed = self._timed(pattern.findall_indexed)
+
+    def __getattr__(self, name):
+        return getattr(self._pattern, name)
+
+    def _timed(self, method, consume=False):
+        """
+        Wrap a batch matching method so that every call is timed
+        """
+        timer = self._timer
+
+        def timed(*args, **kwargs):
+            start_wall, start_cpu = _clock()
+            result = method(*args, **kwargs)
+            if consume:
+                # Matching happens while the iterator is consumed
+                result = iter(list(result))
+            end_wall, end_cpu = _clock()
+            timer.add("match", end_wall - start_wall, end_cpu - start_cpu)
+            timer.add_overhead("timed", 1)
+            return result
+
+        return timed
+
+    def _sampled(self, method, sample_interval):
+        """
+        Wrap a per-record matching method so that one call in sample_interval is timed
+        """
+        timer = self._timer
+        countdown = sample_interval
+
+        def sampled(sequence):
+            nonlocal countdown
+            countdown -= 1
+            if countdown:
+                return method(sequence)
+            countdown = sample_interval
+            start_wall, start_cpu = _clock()
+            result = method(sequence)
+            end_wall, end_cpu = _clock()
+            timer.add(
+                "match", (end_wall - start_wall) * sample_interval, (end_cpu - start_cpu) * sample_interval,
+                sample_interval
+            )
+            if sample_interval > 1:
+                timer.add_overhead("sampled", sample_interval - 1)
+            timer.add_overhead("timed", 1)
+            return result
+
+        return sampled
+
+class TimedReader(io.RawIOBase):
+    """
+    Binary file wrapper whose reads are timed as the decompress stage
+
+    Args:
+        handle (file): Binary file object, e.g. from open_fasta
+        timer (StageTimer): Timer to add measurements to
+        close_handle (bool): Close the wrapped file when this one is closed
+    """
+
+    def __init__(self, handle, timer, close_handle=True):
+        super().__init__()
+        self.handle = handle
+        self.timer = timer
+        self.close_handle = close_handle
+        self.name = getattr(handle, "name", "input stream")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        start_wall, start_cpu = _clock()
+        size = self.handle.readinto(b)
+        end_wall, end_cpu = _clock()
+        self.timer.add("decompress", end_wall - start_wall, end_cpu - start_cpu, size)
+        return size
+
+    def close(self):
+        if not self.closed and self.close_handle:
+            self.handle.close()
+        super().close()
+
+def timing_file(output_file):
+    """
+    Name the timing summary written next to an output file, e.g. TpLRR.txt -> TpLRR.timing.json
+    """
+    return f"{os.path.splitext(output_file)[0]}.timing.json"
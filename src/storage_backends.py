@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Storage Backends
+
+This module gives the pipeline one interface for fetching inputs and
+publishing results, whether they live in a Google Cloud Storage bucket or in
+a local directory. Backends reuse a single storage client, and move many
+files at once on a thread pool, so that publishing thousands of per-genome
+result files is one parallel operation instead of thousands of sequential
+uploads. The local backend lets the whole pipeline run offline.
+"""
+
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from fasta_reader import open_fasta
+from gcs_io import (
+    COMPOSITE_UPLOAD_THRESHOLD, blob_fingerprint, default_client, download_blob_cached, open_blob_stream,
+    upload_composite
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of concurrent transfers in download_many and upload_many
+DEFAULT_TRANSFER_WORKERS = 16
+
+# Prefix of storage locations that refer to a local directory
+LOCAL_SCHEME = "file://"
+
+# Prefix of storage locations that refer to a GCS bucket
+GCS_SCHEME = "gs://"
+
+class StorageBackend:
+    """
+    Base class for places that hold pipeline inputs and results
+
+    Subclasses implement download, upload, open_stream and fingerprint for
+    single objects; the batch operations run those on a thread pool.
+
+    Args:
+        max_workers (int): Number of concurrent transfers in batch operations
+    """
+
+    def __init__(self, max_workers=DEFAULT_TRANSFER_WORKERS):
+        self.max_workers = max_workers
+
+    def _map(self, function, items):
+        """
+        Apply a function to every item on the thread pool and return the results in order
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_workers <= 1:
+            return [function(*item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(lambda item: function(*item), items))
+
+    def download_many(self, files):
+        """
+        Download several objects concurrently
+
+        Args:
+            files (iterable): (object name, local path) tuples; a local path
+                              of None means the object name
+
+        Returns:
+            list: Paths to the local copies, in the order given
+        """
+        return self._map(self.download, files)
+
+    def upload_many(self, files):
+        """
+        Upload several local files concurrently
+
+        Args:
+            files (iterable): Local paths, or (local path, object name) tuples
+
+        Returns:
+            list: Names of the uploaded objects, in the order given
+        """
+        return self._map(self.upload, ((f,) if isinstance(f, str) else f for f in files))
+
+class BackgroundUploader:
+    """
+    Upload files on a thread pool while the caller carries on working
+
+    Lets a pipeline publish each result as soon as it is written, so uploads
+    overlap with the scanning of later inputs instead of following it.
+
+    Args:
+        backend (StorageBackend): Backend to upload to
+        prefix (str): Prefix added to the base name of each file to form its object name
+        max_workers (int): Number of concurrent uploads
+    """
+
+    def __init__(self, backend, prefix="", max_workers=DEFAULT_TRANSFER_WORKERS):
+        self.backend = backend
+        self.prefix = prefix
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+
+    def submit(self, local_path):
+        """
+        Start uploading a file
+
+        Args:
+            local_path (str): Path to the local file
+        """
+        name = f"{self.prefix}{os.path.basename(local_path)}"
+        self._futures.append(self._executor.submit(self.backend.upload, local_path, name))
+
+    def wait(self):
+        """
+        Wait for every submitted upload to finish
+
+        Returns:
+            list: Names of the uploaded objects
+
+        Raises:
+            Exception: The first error raised by an upload, after all have finished
+        """
+        self._executor.shutdown(wait=True)
+        return [future.result() for future in self._futures]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
+
+class LocalBackend(StorageBackend):
+    """
+    Storage backend over a local directory
+
+    Args:
+        root (str): Directory holding the objects
+        max_workers (int): Number of concurrent transfers in batch operations
+    """
+
+    def __init__(self, root, max_workers=DEFAULT_TRANSFER_WORKERS):
+        super().__init__(max_workers)
+        self.root = root
+
+    def __str__(self):
+        return f"{LOCAL_SCHEME}{os.path.abspath(self.root)}"
+
+    def path(self, name):
+        """
+        Get the local path of an object
+        """
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def download(self, name, local_path=None):
+        """
+        Copy an object to a local path, skipping the copy if it is already there
+
+        Args:
+            name (str): Name of the object
+            local_path (str, optional): Local path of the copy. Defaults to name.
+
+        Returns:
+            str: Path to the local copy
+        """
+        local_path = local_path or name
+        source = self.path(name)
+        if not os.path.isfile(source):
+            raise FileNotFoundError(f"Object not found: {source}")
+        if os.path.exists(local_path) and os.path.samefile(source, local_path):
+            return local_path
+
+        local_dir = os.path.dirname(local_path)
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+        shutil.copy2(source, local_path)
+        return local_path
+
+    def upload(self, local_path, name=None):
+        """
+        Copy a local file into the directory
+
+        Args:
+            local_path (str): Path to the local file
+            name (str, optional): Name of the object. Defaults to local_path.
+
+        Returns:
+            str: Name of the object
+        """
+        name = name or local_path
+        target = self.path(name)
+        if os.path.exists(target) and os.path.samefile(local_path, target):
+            return name
+
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        shutil.copyfile(local_path, target)
+        return name
+
+    def open_stream(self, name):
+        """
+        Open an object for reading, decompressing it if it is gzipped
+
+        Returns:
+            file: Binary file object positioned at the start of the FASTA text
+        """
+        return open_fasta(self.path(name))
+
+    def fingerprint(self, name):
+        """
+        Identify the contents of an object by its path, size and modification time
+        """
+        stat = os.stat(self.path(name))
+        return f"stat:{os.path.realpath(self.path(name))}:{stat.st_size}:{stat.st_mtime_ns}"
+
+class GCSBackend(StorageBackend):
+    """
+    Storage backend over a Google Cloud Storage bucket
+
+    One client is shared by every operation on the backend. Buckets are
+    referenced with client.bucket, which unlike get_bucket needs no request.
+
+    Args:
+        bucket_name (str): Name of the bucket
+        client (google.cloud.storage.Client, optional): Storage client to use
+        max_workers (int): Number of concurrent transfers in batch operations
+    """
+
+    def __init__(self, bucket_name, client=None, max_workers=DEFAULT_TRANSFER_WORKERS):
+        super().__init__(max_workers)
+        self.bucket_name = bucket_name
+        self._client = client
+
+    def __str__(self):
+        return f"{GCS_SCHEME}{self.bucket_name}"
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = default_client()
+        return self._client
+
+    @property
+    def bucket(self):
+        return self.client.bucket(self.bucket_name)
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def download(self, name, local_path=None):
+        """
+        Download an object, reusing a local copy with a matching checksum
+
+        Args:
+            name (str): Name of the object
+            local_path (str, optional): Local path of the copy. Defaults to name.
+
+        Returns:
+            str: Path to the local copy
+        """
+        return download_blob_cached(self.bucket_name, name, local_path, client=self.client)
+
+    def upload(self, local_path, name=None):
+        """
+        Upload a local file to the bucket
+
+        Files of at least COMPOSITE_UPLOAD_THRESHOLD bytes are sent as
+        parallel parts composed in GCS instead of as one stream.
+
+        Args:
+            local_path (str): Path to the local file
+            name (str, optional): Name of the object. Defaults to local_path.
+
+        Returns:
+            str: Name of the object
+        """
+        name = name or local_path
+        if os.path.getsize(local_path) >= COMPOSITE_UPLOAD_THRESHOLD:
+            upload_composite(self.bucket_name, local_path, name, client=self.client)
+        else:
+            self.bucket.blob(name).upload_from_filename(local_path)
+        return name
+
+    def open_stream(self, name):
+        """
+        Stream an object with parallel ranged reads, decompressing it if it is gzipped
+
+        Returns:
+            file: Binary file object positioned at the start of the FASTA text
+        """
+        return open_blob_stream(self.bucket_name, name, client=self.client)
+
+    def fingerprint(self, name):
+        """
+        Identify the contents of an object from its metadata
+        """
+        return blob_fingerprint(self.bucket_name, name, client=self.client)
+
+@lru_cache(maxsize=None)
+def get_backend(location):
+    """
+    Get the storage backend for a location, reusing one per location
+
+    Args:
+        location (str): file:///path for a LocalBackend; gs://bucket or a
+                        bare bucket name for a GCSBackend. A bare name is
+                        always a bucket, even if a local directory of that
+                        name exists.
+
+    Returns:
+        StorageBackend: Backend for the location
+    """
+    if location.startswith(LOCAL_SCHEME):
+        return LocalBackend(location[len(LOCAL_SCHEME):])
+    if location.startswith(GCS_SCHEME):
+        return GCSBackend(location[len(GCS_SCHEME):].rstrip("/"))
+    return GCSBackend(location)
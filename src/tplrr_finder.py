@@ -8,38 +8,47 @@ Find TpLRR patterns in the UniRef50 database and analyze their distribution.
 import os
 import sys
 import re
-import gzip
 import argparse
 import logging
 from pathlib import Path
 from datetime import datetime
-from tqdm import tqdm
-
-from Bio import SeqIO
-from google.cloud import storage
+from collections import deque
+from contextlib import nullcontext
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
 # Import from parent directory
 current_dir = Path(__file__).parent.absolute()
 sys.path.append(str(current_dir))
-from lrr_patterns import get_compiled_pattern
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("tplrr_finder.log"),
-        logging.StreamHandler()
-    ]
+from checkpoint import DEFAULT_CHECKPOINT_INTERVAL, ScanCheckpoint, default_checkpoint_file
+from fasta_reader import (
+    READERS, find_record_chunks, iter_sequences, read_fasta_range, skip_records, stage_uncompressed
 )
+from logging_setup import setup_logging, worker_pool_options
+from lrr_patterns import ENGINES, get_compiled_pattern, get_pattern_info, resolve_pattern_names
+from lrr_scanner import RecordCounter, scan_sequences
+from pattern_lattice import subsume_patterns
+from result_cache import DEFAULT_MAX_CACHE_SIZE, ResultCache
+from result_writer import OUTPUT_EXTENSIONS, OUTPUT_FORMATS, open_result_writer
+from sequence_db import SequenceDB, is_sequence_db, read_sequence_db
+from sequence_store import SequenceStore, scan_sequences_incremental
+from stage_timer import StageTimer, timing_file
+from storage_backends import LocalBackend, get_backend
+
 logger = logging.getLogger(__name__)
 
+# Log file written by main; workers log through the main process, see logging_setup
+LOG_FILE = "tplrr_finder.log"
+
 def download_file(bucket_name, file_name, local_path=None):
     """
-    Download a file from Google Cloud Storage
+    Download a file from Google Cloud Storage or a local storage directory
+    
+    A local copy whose checksum matches the object is reused, and an
+    interrupted download is resumed.
     
     Args:
-        bucket_name (str): Name of the bucket
+        bucket_name (str): Name of the bucket, or a storage location accepted by get_backend
         file_name (str): Name of the file to download
         local_path (str, optional): Local path to save the file. 
                                    Defaults to file_name.
@@ -52,68 +61,485 @@ def download_file(bucket_name, file_name, local_path=None):
     
     logger.info(f"Downloading {file_name} from {bucket_name}...")
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(bucket_name)
-        blob = bucket.blob(file_name)
-        blob.download_to_filename(local_path)
+        get_backend(bucket_name).download(file_name, local_path)
         logger.info(f"Downloaded {file_name} to {local_path}")
         return local_path
     except Exception as e:
         logger.error(f"Error downloading file: {e}")
         raise
 
-def find_lrr_patterns(file_name, pattern_name="TpLRR", max_sequences=None):
+# Target size of the byte ranges scanned by each parallel task
+CHUNK_SIZE = 64 * 1024 * 1024
+
+def compile_patterns(pattern_names, engine="re", max_mismatches=0):
     """
-    Find LRR patterns in the specified file
+    Compile the selected LRR patterns for matching byte sequences
+    
+    Regex patterns contained in another selected pattern, such as the TpLRR
+    variants, are matched within one shared scan of the most general one.
     
     Args:
-        file_name (str): Path to the input file (gzipped FASTA)
-        pattern_name (str): Name of the pattern to search for
-        max_sequences (int, optional): Maximum number of sequences to process
+        pattern_names (list): List of pattern names
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+                              (shift-add engine only)
+        
+    Returns:
+        list: List of (pattern_name, compiled_pattern, pattern_length) tuples
+    """
+    patterns = [
+        (name,) + get_compiled_pattern(name, engine=engine, max_mismatches=max_mismatches) for name in pattern_names
+    ]
+    return subsume_patterns(patterns)
+
+def scan_records(records, pattern_names, engine="re", batch_size=None, sequence_store=None, positions=False,
+                 timer=None, max_mismatches=0):
+    """
+    Match the named patterns against a stream of records
+    
+    Args:
+        records (iterable): Iterable of (sequence ID, sequence bytes) tuples
+        pattern_names (list): List of pattern names
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        reused across runs
+        positions (bool): Also record the offset of each match
+        timer (StageTimer, optional): Timer for the record reading, matching
+                                      and entry building stages
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Yields:
+        tuple: (pattern_name, sequence ID, LRR data)
+    """
+    patterns = compile_patterns(pattern_names, engine, max_mismatches)
+    if timer is not None:
+        records, patterns = timer.instrument(records, patterns)
+    
+    if sequence_store is None:
+        hits = scan_sequences(records, patterns, batch_size=batch_size, positions=positions)
+        yield from hits if timer is None else timer.iterate(hits, "scan")
+        return
+    
+    with SequenceStore(sequence_store) as store:
+        hits = scan_sequences_incremental(records, patterns, store, batch_size=batch_size, positions=positions)
+        yield from hits if timer is None else timer.iterate(hits, "scan")
+
+def scan_chunk(file_name, start, end, pattern_names, engine="re", batch_size=None, sequence_store=None,
+               positions=False, timing=False, max_mismatches=0):
+    """
+    Find LRR patterns in one record-aligned byte range of an uncompressed FASTA file,
+    or in a range of records of a sequence database
+    
+    Args:
+        file_name (str): Path to the uncompressed FASTA file or sequence database
+        start (int): Offset of the first byte of the range, or index of the first record
+        end (int): Offset one past the last byte of the range, or index one past the last record
+        pattern_names (list): List of pattern names
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        reused across runs
+        positions (bool): Also record the offset of each match
+        timing (bool): Time the stages of the scan
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Returns:
+        tuple: (list of (pattern_name, sequence ID, LRR data) hits,
+                number of sequences processed, StageTimer measurements or None)
+    """
+    timer = StageTimer() if timing else None
+    if is_sequence_db(file_name):
+        records = RecordCounter(read_sequence_db(file_name, start, end))
+    else:
+        records = RecordCounter(read_fasta_range(file_name, start, end))
+    hits = list(scan_records(
+        records, pattern_names, engine, batch_size, sequence_store, positions, timer, max_mismatches
+    ))
+    return hits, records.count, timer and timer.raw()
+
+def scan_lrr_hits_parallel(file_name, pattern_names, workers, staging_dir=None, engine="re",
+                           batch_size=None, sequence_store=None, positions=False, timer=None, checkpoint=None,
+                           max_mismatches=0):
+    """
+    Find LRR patterns in one FASTA file using several worker processes
+    
+    Gzipped input is decompressed once to a staging file, which is then split
+    into byte ranges aligned to record boundaries. A sequence database needs
+    no staging and is split into ranges of records. Each range is scanned in
+    a separate process and the hits are yielded back in file order.
+    
+    Args:
+        file_name (str): Path to the input file (plain or gzipped FASTA, or a sequence database)
+        pattern_names (list): List of pattern names
+        workers (int): Number of worker processes
+        staging_dir (str, optional): Directory for the decompressed copy of the input
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        reused across runs
+        positions (bool): Also record the offset of each match
+        timer (StageTimer, optional): Timer that receives the staging time,
+                                      the time spent waiting for workers and
+                                      the workers' own stage times
+        checkpoint (ScanCheckpoint, optional): Checkpoint to resume from and
+                                               to save progress to between chunks
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Yields:
+        tuple: (pattern_name, sequence ID, LRR data)
         
     Returns:
-        dict: Dictionary of LRR data by sequence ID
+        int: Number of sequences processed, excluding those skipped on resuming
     """
-    pattern, pattern_length = get_compiled_pattern(pattern_name)
-    lrr_data = {}
+    skip = checkpoint.records if checkpoint else 0
+    
+    # Several chunks per worker keep all cores busy when chunks differ in cost,
+    # and a bounded chunk size keeps the hits held per chunk small
+    if is_sequence_db(file_name):
+        staged_file = file_name
+        with SequenceDB(file_name) as db:
+            chunks = db.chunks(max(workers * 4, int(db.offsets[-1]) // CHUNK_SIZE))
+        chunks = [(max(start, skip), stop) for start, stop in chunks if stop > skip]
+    else:
+        logger.info(f"Staging {file_name} for parallel scanning...")
+        with timer.stage("staging") if timer else nullcontext():
+            staged_file = stage_uncompressed(file_name, staging_dir)
+        n_chunks = max(workers * 4, os.path.getsize(staged_file) // CHUNK_SIZE)
+        start = 0
+        if skip:
+            with open(staged_file, 'rb') as f:
+                _, start = skip_records(f, skip)
+            if start is None:
+                start = os.path.getsize(staged_file)
+        chunks = find_record_chunks(staged_file, n_chunks, start)
+    logger.info(f"Scanning {staged_file} in {len(chunks)} chunks with {workers} workers")
+    
     processed_count = 0
+    if timer:
+        timer.workers = workers
     
-    logger.info(f"Searching for {pattern_name} patterns in {file_name}...")
+    scan_options = (pattern_names, engine, batch_size, sequence_store, positions, timer is not None, max_mismatches)
+    with ProcessPoolExecutor(max_workers=workers, **worker_pool_options()) as executor:
+        chunk_iter = iter(chunks)
+        # Only keep a few chunks per worker in flight so finished results do not pile up
+        pending = deque(
+            executor.submit(scan_chunk, staged_file, start, end, *scan_options)
+            for start, end in islice(chunk_iter, workers * 2)
+        )
+        
+        from tqdm import tqdm
+        with tqdm(total=len(chunks), desc="Processing chunks", unit="chunk") as progress:
+            # Consume in submission order so the output matches a sequential scan
+            while pending:
+                with timer.stage("wait") if timer else nullcontext():
+                    chunk_hits, chunk_count, chunk_timing = pending.popleft().result()
+                if chunk_timing:
+                    timer.merge(chunk_timing)
+                for start, end in islice(chunk_iter, 1):
+                    pending.append(executor.submit(scan_chunk, staged_file, start, end, *scan_options))
+                
+                processed_count += chunk_count
+                progress.update(1)
+                yield from chunk_hits
+                
+                # Chunks finish in file order, so every record before this point is written
+                if checkpoint and checkpoint.due():
+                    checkpoint.save(skip + processed_count)
+    
+    return processed_count
+
+def scan_lrr_hits(file_name, pattern_names="TpLRR", max_sequences=None, reader="bytes",
+                  workers=1, staging_dir=None, engine="re", batch_size=None,
+                  sequence_store=None, positions=False, timer=None, checkpoint=None, max_mismatches=0):
+    """
+    Find LRR patterns in the specified file, yielding hits as they are found
+    
+    All requested patterns are tested against each record, so the input is
+    decompressed and parsed only once regardless of how many classes are searched.
+    
+    Args:
+        file_name (str or file): Path to the input file (gzipped FASTA), or a
+                                 binary stream such as one from open_blob_stream
+        pattern_names (str or list): Pattern name, comma-separated names,
+                                     list of names, or "all"
+        max_sequences (int, optional): Maximum number of sequences to process
+        reader (str): FASTA reader to use, "bytes" or "biopython"; any
+                      reader but "bytes" scans sequentially
+        workers (int): Number of worker processes for scanning the file
+        staging_dir (str, optional): Directory for the decompressed copy of
+                                     gzipped input when workers > 1
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        reused across runs
+        positions (bool): Also record the offset of each match under 'starts'
+        timer (StageTimer, optional): Timer for the stages of the scan
+        checkpoint (ScanCheckpoint, optional): Checkpoint to resume from and to
+                                               save progress to; the hits must be
+                                               written to the files it tracks
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Yields:
+        tuple: (pattern_name, sequence ID, LRR data)
+    """
+    pattern_names = resolve_pattern_names(pattern_names)
+    found_counts = checkpoint.found if checkpoint else dict.fromkeys(pattern_names, 0)
+    skip = checkpoint.records if checkpoint else 0
+    
+    is_path = isinstance(file_name, (str, os.PathLike))
+    source_name = file_name if is_path else getattr(file_name, "name", "input stream")
+    logger.info(f"Searching for {', '.join(pattern_names)} patterns in {source_name}...")
     
     # Check if file exists and is readable
-    if not os.path.isfile(file_name):
+    if is_path and not os.path.isfile(file_name):
         raise FileNotFoundError(f"File not found: {file_name}")
     
+    if workers > 1 and max_sequences:
+        logger.warning("--max-sequences requires a sequential scan; ignoring --workers")
+        workers = 1
+    
+    if workers > 1 and not is_path:
+        logger.warning("Streamed input can only be scanned sequentially; ignoring --workers")
+        workers = 1
+    
+    # Workers split the file into byte ranges, which only the byte reader can parse
+    if workers > 1 and reader != "bytes":
+        logger.warning(f"The {reader} reader requires a sequential scan; ignoring --workers")
+        workers = 1
+    
+    def log_progress(processed_count):
+        found = ", ".join(f"{name}: {count}" for name, count in found_counts.items())
+        logger.info(f"Processed {skip + processed_count} sequences, found with patterns ({found})")
+    
+    if skip:
+        logger.info(f"Resuming from checkpoint {checkpoint.path}, skipping {skip} sequences already processed")
+    
     try:
-        with gzip.open(file_name, 'rt') as f:
-            for record in tqdm(SeqIO.parse(f, 'fasta'), desc="Processing sequences", unit="seq"):
-                sequence = str(record.seq)
-                pattern_matches = pattern.findall(sequence)
-                
-                if pattern_matches:
-                    lrr_data[record.id] = {
-                        'count': len(pattern_matches),
-                        'total_lrr_length': len(pattern_matches) * pattern_length,
-                        'total_length': len(sequence),
-                        'patterns': " ".join(pattern_matches)
-                    }
-                
-                processed_count += 1
-                if processed_count % 10000 == 0:
-                    logger.info(f"Processed {processed_count} sequences, found {len(lrr_data)} with patterns")
-                
-                if max_sequences and processed_count >= max_sequences:
-                    logger.info(f"Reached maximum sequence count ({max_sequences})")
-                    break
+        if workers > 1:
+            hits = scan_lrr_hits_parallel(
+                file_name, pattern_names, workers, staging_dir, engine, batch_size, sequence_store, positions,
+                timer, checkpoint, max_mismatches
+            )
+            processed_count = skip + (yield from _count_hits(hits, found_counts))
+        elif max_sequences is not None and skip >= max_sequences:
+            # The interrupted scan had already processed every sequence allowed
+            processed_count = skip
+            logger.info(f"Reached maximum sequence count ({max_sequences})")
+        else:
+            from tqdm import tqdm
+            source = timer.open_input(file_name) if timer else file_name
+            try:
+                records = RecordCounter(
+                    tqdm(iter_sequences(source, reader, skip), desc="Processing sequences", unit="seq"),
+                    progress_callback=log_progress,
+                    max_records=None if max_sequences is None else max_sequences - skip
+                )
+                if checkpoint is None:
+                    hits = scan_records(
+                        records, pattern_names, engine, batch_size, sequence_store, positions, timer, max_mismatches
+                    )
+                    yield from _count_hits(hits, found_counts)
+                else:
+                    # Scan in segments between checkpoints; a segment's hits are
+                    # all written before its checkpoint is saved
+                    record_iter = iter(records)
+                    while True:
+                        segment = RecordCounter(checkpoint.segment(record_iter))
+                        hits = scan_records(
+                            segment, pattern_names, engine, batch_size, sequence_store, positions, timer,
+                            max_mismatches
+                        )
+                        yield from _count_hits(hits, found_counts)
+                        if not segment.count:
+                            break
+                        checkpoint.save(skip + records.count)
+            finally:
+                if source is not file_name:
+                    source.close()
+            processed_count = skip + records.count
+            
+            if max_sequences and processed_count >= max_sequences:
+                logger.info(f"Reached maximum sequence count ({max_sequences})")
     
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         raise
     
     logger.info(f"Completed search. Processed {processed_count} sequences.")
-    logger.info(f"Found {len(lrr_data)} sequences with {pattern_name} patterns.")
+    for pattern_name, count in found_counts.items():
+        logger.info(f"Found {count} sequences with {pattern_name} patterns.")
+
+def _count_hits(hits, found_counts):
+    """
+    Pass hits through while counting them per pattern
     
-    return lrr_data
+    Args:
+        hits (iterator): Iterator of (pattern_name, sequence ID, LRR data) tuples
+        found_counts (dict): Hit counts by pattern name, updated in place
+        
+    Returns:
+        The return value of the wrapped generator, if any
+    """
+    while True:
+        try:
+            hit = next(hits)
+        except StopIteration as stop:
+            return stop.value
+        found_counts[hit[0]] += 1
+        yield hit
+
+def find_lrr_patterns(file_name, pattern_names="TpLRR", max_sequences=None, reader="bytes",
+                      workers=1, staging_dir=None, engine="re", batch_size=None,
+                      sequence_store=None, max_mismatches=0):
+    """
+    Find LRR patterns in the specified file
+    
+    Args:
+        file_name (str or file): Path to the input file (gzipped FASTA), or a
+                                 binary stream such as one from open_blob_stream
+        pattern_names (str or list): Pattern name, comma-separated names,
+                                     list of names, or "all"
+        max_sequences (int, optional): Maximum number of sequences to process
+        reader (str): FASTA reader to use, "bytes" or "biopython"; any
+                      reader but "bytes" scans sequentially
+        workers (int): Number of worker processes for scanning the file
+        staging_dir (str, optional): Directory for the decompressed copy of
+                                     gzipped input when workers > 1
+        engine (str): Matching engine, "re", "numpy" or "shift-add"
+        batch_size (int, optional): Number of records matched per regex call
+        sequence_store (str, optional): Path to a store of per-sequence results
+                                        reused across runs
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Returns:
+        dict: Dictionary of LRR data by sequence ID for a single pattern name,
+              or a dictionary mapping pattern name to LRR data by sequence ID
+              for a list, comma-separated names, or "all"
+    """
+    single_pattern = (
+        isinstance(pattern_names, str) and "," not in pattern_names
+        and pattern_names.strip().lower() != "all"
+    )
+    pattern_names = resolve_pattern_names(pattern_names)
+    results = {name: {} for name in pattern_names}
+    
+    for pattern_name, record_id, data in scan_lrr_hits(
+        file_name, pattern_names, max_sequences, reader, workers, staging_dir, engine, batch_size,
+        sequence_store, max_mismatches=max_mismatches
+    ):
+        results[pattern_name][record_id] = data
+    
+    if single_pattern:
+        return results[pattern_names[0]]
+    return results
+
+def default_output_file(pattern_name, output_format="tsv"):
+    """
+    Build the default timestamped output file name for a pattern
+    
+    Args:
+        pattern_name (str): Name of the pattern, or "LRR" for combined output
+        output_format (str): Output format, which sets the file extension
+        
+    Returns:
+        str: Output file name
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{pattern_name}_data_{timestamp}{OUTPUT_EXTENSIONS[output_format]}"
+
+def resolve_output_files(pattern_names, output_file=None, combined=False, output_format="tsv"):
+    """
+    Decide which output file each pattern is written to
+    
+    Args:
+        pattern_names (list): List of pattern names being searched
+        output_file (str, optional): Output file name. With several patterns and
+                                     no --combined, the pattern name is inserted
+                                     before the extension.
+        combined (bool): Write all patterns to a single file with a Class column
+        output_format (str): Output format, which sets the default file extension
+        
+    Returns:
+        dict: Dictionary mapping pattern name to output file path
+    """
+    if combined:
+        return dict.fromkeys(pattern_names, output_file or default_output_file("LRR", output_format))
+    if len(pattern_names) == 1:
+        return {pattern_names[0]: output_file or default_output_file(pattern_names[0], output_format)}
+    return {
+        pattern_name: (
+            pattern_output_file(output_file, pattern_name) if output_file
+            else default_output_file(pattern_name, output_format)
+        )
+        for pattern_name in pattern_names
+    }
+
+def write_results(hits, pattern_names, output_file=None, combined=False, output_paths=None, output_format="tsv",
+                  checkpoint=None, mismatches=False):
+    """
+    Stream LRR pattern hits to output files as they are produced
+    
+    Args:
+        hits (iterable): Iterable of (pattern_name, sequence ID, LRR data) tuples
+        pattern_names (list): List of pattern names being searched
+        output_file (str, optional): Output file name. With several patterns and
+                                     no --combined, the pattern name is inserted
+                                     before the extension.
+        combined (bool): Write all patterns to a single file with a Class column
+        output_paths (dict, optional): Dictionary mapping pattern name to output
+                                       file path, overriding output_file
+        output_format (str): "tsv", or "parquet" for one row per match, which
+                             needs hits scanned with positions=True
+        checkpoint (ScanCheckpoint, optional): Checkpoint of the scan producing
+                                               the hits; the output files are
+                                               flushed at its checkpoints, and
+                                               appended to if it was resumed
+        mismatches (bool): Also write the mismatch count of each match, from
+                           hits of a scan with max_mismatches
+        
+    Returns:
+        list: Paths to the output files
+    """
+    writers = {}
+    append = checkpoint is not None and checkpoint.resumed
+    if output_paths is None:
+        output_paths = resolve_output_files(pattern_names, output_file, combined, output_format)
+    
+    try:
+        if combined:
+            writer = open_result_writer(
+                output_paths[pattern_names[0]], class_column=True, output_format=output_format, append=append,
+                mismatches=mismatches
+            )
+            writers = dict.fromkeys(pattern_names, writer)
+        else:
+            for pattern_name in pattern_names:
+                writers[pattern_name] = open_result_writer(
+                    output_paths[pattern_name], pattern_name, output_format=output_format, append=append,
+                    mismatches=mismatches
+                )
+        if checkpoint is not None:
+            checkpoint.track(writers.values())
+        
+        for writer in set(writers.values()):
+            logger.info(f"Writing results to {writer.output_file}...")
+        
+        for pattern_name, record_id, data in hits:
+            writers[pattern_name].write(record_id, data, pattern_name)
+    
+    except Exception as e:
+        logger.error(f"Error saving results: {e}")
+        raise
+    
+    finally:
+        for writer in writers.values():
+            writer.close()
+    
+    output_files = list(dict.fromkeys(writer.output_file for writer in writers.values()))
+    for output_file in output_files:
+        logger.info(f"Results saved to {output_file}")
+    return output_files
 
 def save_results(lrr_data, pattern_name, output_file=None):
     """
@@ -125,41 +551,100 @@ def save_results(lrr_data, pattern_name, output_file=None):
         output_file (str, optional): Path to the output file.
                                      Defaults to "{pattern_name}_data.txt".
     """
-    if output_file is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"{pattern_name}_data_{timestamp}.txt"
+    hits = ((pattern_name, name, data) for name, data in lrr_data.items())
+    return write_results(hits, [pattern_name], output_file)[0]
+
+def save_combined_results(results, output_file=None):
+    """
+    Save LRR pattern results for several patterns to a single file
     
-    logger.info(f"Saving results to {output_file}...")
+    Args:
+        results (dict): Dictionary mapping pattern name to LRR data by sequence ID
+        output_file (str, optional): Path to the output file.
+                                     Defaults to "LRR_data_{timestamp}.txt".
+                                     
+    Returns:
+        str: Path to the output file
+    """
+    hits = (
+        (pattern_name, name, data)
+        for pattern_name, lrr_data in results.items()
+        for name, data in lrr_data.items()
+    )
+    return write_results(hits, list(results), output_file, combined=True)[0]
+
+def pattern_output_file(output_file, pattern_name):
+    """
+    Derive a per-pattern output file name from a user-supplied output name
     
-    try:
-        with open(output_file, 'w') as f:
-            f.write(f"Name\tCount\tTotal {pattern_name} Length\tTotal Sequence Length\tPatterns\n")
-            for name, data in lrr_data.items():
-                f.write(f"{name}\t{data['count']}\t{data['total_lrr_length']}\t{data['total_length']}\t{data['patterns']}\n")
+    Args:
+        output_file (str): Output file name given on the command line
+        pattern_name (str): Name of the pattern
         
-        logger.info(f"Results saved to {output_file}")
-        return output_file
+    Returns:
+        str: Output file name with the pattern name inserted before the extension
+    """
+    root, ext = os.path.splitext(output_file)
+    return f"{root}_{pattern_name}{ext}"
+
+def fetch_cached_results(cache, input_fingerprint, pattern_names, output_paths, combined=False,
+                         max_sequences=None, output_format="tsv", max_mismatches=0):
+    """
+    Copy cached results of earlier runs to their output files
     
-    except Exception as e:
-        logger.error(f"Error saving results: {e}")
-        raise
+    Args:
+        cache (ResultCache): Result cache
+        input_fingerprint (str): Fingerprint of the input, from
+                                 ResultCache.input_fingerprint or StorageBackend.fingerprint
+        pattern_names (list): List of pattern names being searched
+        output_paths (dict): Dictionary mapping pattern name to output file path
+        combined (bool): Whether all patterns are written to a single file
+        max_sequences (int, optional): Maximum number of sequences processed
+        output_format (str): Output format of the result files
+        max_mismatches (int): Number of conserved positions allowed to mismatch
+        
+    Returns:
+        tuple: (list of pattern names that still have to be searched,
+                dictionary mapping their output files to cache keys)
+    """
+    output_patterns = {}
+    for pattern_name in pattern_names:
+        output_patterns.setdefault(output_paths[pattern_name], []).append(pattern_name)
+    
+    # Exact scans keep the keys of results cached before mismatches were supported
+    options = {"combined": combined, "max_sequences": max_sequences, "output_format": output_format}
+    if max_mismatches:
+        options["max_mismatches"] = max_mismatches
+    
+    missing = []
+    cache_keys = {}
+    for output_file, names in output_patterns.items():
+        pattern_info = {name: get_pattern_info(name) for name in names}
+        patterns = [(name, info["pattern"], info["length"]) for name, info in pattern_info.items()]
+        key = cache.fingerprint_key(input_fingerprint, patterns, **options)
+        if not cache.fetch(key, output_file):
+            missing.extend(names)
+            cache_keys[output_file] = key
+    
+    return missing, cache_keys
 
-def upload_to_bucket(bucket_name, file_name):
+def upload_to_bucket(bucket_name, file_names):
     """
-    Upload a file to Google Cloud Storage
+    Upload files to Google Cloud Storage or a local storage directory
+    
+    The files are uploaded concurrently over a single storage client.
     
     Args:
-        bucket_name (str): Name of the bucket
-        file_name (str): Name of the file to upload
+        bucket_name (str): Name of the bucket, or a storage location accepted by get_backend
+        file_names (str or list): Name of the file to upload, or a list of them
     """
-    logger.info(f"Uploading {file_name} to {bucket_name}...")
+    if isinstance(file_names, str):
+        file_names = [file_names]
+    logger.info(f"Uploading {len(file_names)} file(s) to {bucket_name}...")
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(bucket_name)
-        blob = bucket.blob(file_name)
-        blob.upload_from_filename(file_name)
-        logger.info(f"Uploaded {file_name} to {bucket_name}")
+        get_backend(bucket_name).upload_many(file_names)
+        logger.info(f"Uploaded {len(file_names)} file(s) to {bucket_name}")
     
     except Exception as e:
         logger.error(f"Error uploading file: {e}")
@@ -167,34 +652,185 @@ def upload_to_bucket(bucket_name, file_name):
 
 def main():
     parser = argparse.ArgumentParser(description="Find TpLRR patterns in UniRef50 database")
-    parser.add_argument("bucket_name", help="Name of the Google Cloud Storage bucket")
+    parser.add_argument("bucket_name",
+                        help="Name of the Google Cloud Storage bucket, or file:///path for a local directory")
     parser.add_argument("file_name", help="Name of the file in the bucket")
-    parser.add_argument("--pattern", default="TpLRR", help="Pattern to search for")
+    parser.add_argument("--pattern", default="TpLRR",
+                        help="Pattern to search for, a comma-separated list of patterns, or 'all'")
+    parser.add_argument("--combined", action="store_true",
+                        help="Write all patterns to a single output file instead of one file per pattern")
     parser.add_argument("--max-sequences", type=int, help="Maximum number of sequences to process")
     parser.add_argument("--local", action="store_true", help="Use local file instead of downloading from bucket")
     parser.add_argument("--output", help="Name of the output file")
+    parser.add_argument("--format", default="tsv", choices=OUTPUT_FORMATS,
+                        help="Output format; parquet writes one row per match with its coordinates")
     parser.add_argument("--no-upload", action="store_true", help="Do not upload result to bucket")
+    parser.add_argument("--download-dir",
+                        help="Directory for downloaded input, reused by later runs (default: current directory)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Scan the file while streaming it from the bucket instead of downloading it first")
+    parser.add_argument("--reader", default="bytes", choices=READERS,
+                        help="FASTA reader to use for parsing the input; only the bytes reader works with --workers")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes for scanning the input file")
+    parser.add_argument("--staging-dir",
+                        help="Directory for the decompressed copy of gzipped input when using --workers")
+    parser.add_argument("--engine", default="re", choices=ENGINES,
+                        help="Pattern matching engine")
+    parser.add_argument("--batch-size", type=int,
+                        help="Number of records matched per regex call over a joined buffer")
+    parser.add_argument("--max-mismatches", type=int, default=0,
+                        help="Also report LRRs differing from the pattern at up to this many conserved positions, "
+                             "with a Mismatches column; implies --engine shift-add")
+    parser.add_argument("--sequence-store",
+                        help="SQLite file of per-sequence results; only sequences not in it are scanned")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always scan the input instead of reusing cached results")
+    parser.add_argument("--cache-dir", help="Directory for cached results")
+    parser.add_argument("--cache-max-size", type=float, default=DEFAULT_MAX_CACHE_SIZE / 1024 ** 3,
+                        help="Maximum total size of cached results in GB")
+    parser.add_argument("--cache-checksum", action="store_true",
+                        help="Identify local input files by checksum instead of size and modification time")
+    parser.add_argument("--timing", action="store_true",
+                        help="Time the stages of the scan and write a breakdown next to the output")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted scan from its last checkpoint")
+    parser.add_argument("--checkpoint",
+                        help="Path of the checkpoint file (default: <file_name>.<hash of the scan options>"
+                             ".checkpoint.json in the current directory)")
+    parser.add_argument("--checkpoint-interval", type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help="Seconds between checkpoints of a TSV scan; 0 disables checkpoints")
     
     args = parser.parse_args()
     
+    setup_logging(LOG_FILE)
+    
+    # Parquet files cannot be appended to, so only TSV scans are checkpointed
+    checkpointing = args.format == "tsv" and args.checkpoint_interval > 0
+    if args.resume and not checkpointing:
+        parser.error("--resume requires --format tsv and a positive --checkpoint-interval")
+    if args.max_mismatches < 0:
+        parser.error("--max-mismatches must not be negative")
+    if args.max_mismatches:
+        if args.engine == "numpy":
+            parser.error("--max-mismatches requires --engine shift-add")
+        args.engine = "shift-add"
+    
     try:
-        # Get input file
-        if not args.local:
-            fasta_file = download_file(args.bucket_name, args.file_name)
-        else:
+        storage_backend = get_backend(args.bucket_name)
+        
+        # Check the local input; remote input is only fetched once it is needed
+        if args.local:
             fasta_file = args.file_name
             if not os.path.isfile(fasta_file):
                 raise FileNotFoundError(f"Local file not found: {fasta_file}")
         
-        # Find LRR patterns
-        lrr_data = find_lrr_patterns(fasta_file, args.pattern, args.max_sequences)
+        pattern_names = resolve_pattern_names(args.pattern)
+        output_paths = resolve_output_files(pattern_names, args.output, args.combined, args.format)
+        
+        # An interrupted scan is only resumed for the same input and options
+        checkpoint = None
+        if checkpointing:
+            if args.local:
+                checkpoint_input = LocalBackend(os.curdir).fingerprint(fasta_file)
+            else:
+                checkpoint_input = storage_backend.fingerprint(args.file_name)
+            run_info = {
+                "input": checkpoint_input,
+                "patterns": pattern_names,
+                "combined": args.combined,
+                "max_sequences": args.max_sequences,
+                "max_mismatches": args.max_mismatches,
+                "output": args.output,
+                "format": args.format
+            }
+            checkpoint_path = args.checkpoint or default_checkpoint_file(args.file_name, run_info)
+            if args.resume:
+                checkpoint = ScanCheckpoint.load(checkpoint_path, run_info, args.checkpoint_interval)
+                if checkpoint is None:
+                    logger.info(f"No checkpoint found at {checkpoint_path}; starting a new scan")
+                else:
+                    # Default output names are timestamped, so take them from the interrupted run
+                    output_paths.update(checkpoint.output_paths)
+        output_files = list(dict.fromkeys(output_paths.values()))
+        
+        # Reuse results of earlier runs with the same input and patterns.
+        # Remote input is identified by its object metadata, so a cache hit
+        # needs no download at all.
+        missing = pattern_names
+        if not args.no_cache:
+            cache = ResultCache(args.cache_dir, int(args.cache_max_size * 1024 ** 3), args.cache_checksum)
+            if args.local:
+                input_fingerprint = cache.input_fingerprint(fasta_file)
+            else:
+                input_fingerprint = storage_backend.fingerprint(args.file_name)
+            missing, cache_keys = fetch_cached_results(
+                cache, input_fingerprint, pattern_names, output_paths, args.combined, args.max_sequences,
+                args.format, args.max_mismatches
+            )
+        
+        if checkpoint is not None and set(missing) != set(checkpoint.output_paths):
+            logger.info("Cached results now cover part of the interrupted scan; starting a new scan")
+            checkpoint = None
+        if checkpointing and missing:
+            if checkpoint is None:
+                checkpoint = ScanCheckpoint(
+                    checkpoint_path, run_info, {name: output_paths[name] for name in missing},
+                    args.checkpoint_interval
+                )
+                # Drop the checkpoint of an earlier run of this scan so it is
+                # never resumed into these outputs; one of another scan is kept
+                if checkpoint.stored_run() not in (None, run_info):
+                    raise ValueError(
+                        f"Checkpoint {checkpoint_path} belongs to a different scan; choose another --checkpoint"
+                    )
+                checkpoint.remove()
+            else:
+                checkpoint.restore_outputs()
         
-        # Save results
-        output_file = save_results(lrr_data, args.pattern, args.output)
+        # Find LRR patterns and stream the hits to the output files
+        if missing:
+            stream = None
+            if args.stream and not args.local:
+                fasta_file = stream = storage_backend.open_stream(args.file_name)
+            elif not args.local:
+                local_path = os.path.join(args.download_dir, args.file_name) if args.download_dir else None
+                fasta_file = download_file(args.bucket_name, args.file_name, local_path)
+            
+            timer = StageTimer() if args.timing else None
+            try:
+                hits = scan_lrr_hits(
+                    fasta_file, missing, args.max_sequences, args.reader,
+                    args.workers, args.staging_dir, args.engine, args.batch_size, args.sequence_store,
+                    positions=args.format == "parquet", timer=timer, checkpoint=checkpoint,
+                    max_mismatches=args.max_mismatches
+                )
+                with timer.stage("output") if timer else nullcontext():
+                    written_files = write_results(
+                        hits, missing, combined=args.combined, output_paths=output_paths, output_format=args.format,
+                        checkpoint=checkpoint, mismatches=args.max_mismatches > 0
+                    )
+            finally:
+                if stream is not None:
+                    stream.close()
+            
+            if checkpoint is not None:
+                checkpoint.remove()
+            
+            if timer:
+                summary_file = timing_file(written_files[0])
+                summary = timer.write_summary(
+                    summary_file, input=args.file_name, patterns=missing, engine=args.engine
+                )
+                logger.info(f"Stage timing ({summary_file}): {timer.format_summary(summary)}")
+            
+            if not args.no_cache:
+                for output_file in written_files:
+                    cache.store(cache_keys[output_file], output_file)
         
         # Upload results to bucket
         if not args.no_upload:
-            upload_to_bucket(args.bucket_name, output_file)
+            upload_to_bucket(args.bucket_name, output_files)
         
         logger.info("Process completed successfully.")
     